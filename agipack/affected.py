@@ -0,0 +1,160 @@
+import logging
+import os
+import tempfile
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+from agipack.config import AGIPackConfig
+from agipack.docker import Runner, run_command
+from agipack.manifest import referenced_files
+
+logger = logging.getLogger(__name__)
+
+AGIPACK_GLOBAL_SECTIONS = ("mirrors", "bootstrap")
+"""Config-level sections that are rendered into every target (a change to them affects all the targets)."""
+
+
+def _normalize(path: Union[str, Path]) -> str:
+    """Normalize a path (relative to the build context / current directory) for matching."""
+    path = os.path.normpath(path)
+    if os.path.isabs(path):
+        path = os.path.relpath(path)
+    return PurePosixPath(Path(path).as_posix()).as_posix()
+
+
+class AffectedIndex:
+    """Reverse index from the files referenced by a configuration to the targets that use them.
+
+    The index maps every `requirements` file and `add` source (files or directories)
+    to the targets that reference them, so that a set of changed files can be
+    mapped to the affected targets without re-scanning the configuration.
+
+    Usage Example:
+        ```python
+        index = AffectedIndex(config, config_filename="agibuild.yaml")
+        index.affected(["requirements/requirements.txt"])
+        ```
+
+    Args:
+        config (AGIPackConfig): AGIPack configuration.
+        config_filename (str): Path to the YAML configuration file (changes to it affect the changed targets).
+        previous (AGIPackConfig): Previous configuration, to find the targets affected by a config change.
+            If not set, a change to the configuration file affects all the targets.
+        locked (bool): Index the lockfiles as well (for images installed from the lockfiles).
+    """
+
+    def __init__(
+        self,
+        config: AGIPackConfig,
+        config_filename: Optional[Union[str, Path]] = None,
+        previous: Optional[AGIPackConfig] = None,
+        locked: bool = False,
+    ):
+        self.config = config
+        self.config_filename = _normalize(config_filename) if config_filename is not None else None
+        self.previous = previous
+        self.index: Dict[str, Set[str]] = {}
+        for target in config.images:
+            for path in referenced_files(config, target, locked=locked):
+                self.index.setdefault(_normalize(path), set()).add(target)
+
+    def changed_targets(self) -> Set[str]:
+        """Return the targets whose configuration changed with respect to the previous configuration."""
+        if self.previous is None:
+            return set(self.config.images.keys())
+        changed = [key for key in AGIPACK_GLOBAL_SECTIONS if getattr(self.previous, key) != getattr(self.config, key)]
+        if changed:
+            logger.debug(f"Config sections changed, all the targets are affected [sections={changed}]")
+            return set(self.config.images.keys())
+        return {
+            target
+            for target, image_config in self.config.images.items()
+            if target not in self.previous.images or self.previous.images[target].dict() != image_config.dict()
+        }
+
+    def direct(self, changed_files: Iterable[Union[str, Path]]) -> Set[str]:
+        """Return the targets that directly reference the changed files (or whose config changed)."""
+        targets: Set[str] = set()
+        for filename in changed_files:
+            filename = _normalize(filename)
+            if filename == self.config_filename:
+                targets |= self.changed_targets()
+                continue
+            # Look up the file and all its parent directories (`.` being the whole build context)
+            parts = filename.split("/")
+            for prefix in [".", *("/".join(parts[: idx + 1]) for idx in range(len(parts)))]:
+                targets |= self.index.get(prefix, set())
+        return targets
+
+    def affected(self, changed_files: Iterable[Union[str, Path]]) -> List[str]:
+        """Return the targets transitively affected by the changed files.
+
+        Args:
+            changed_files (Iterable[Union[str, Path]]): Changed files (relative to the build context).
+        Returns:
+            List[str]: Affected targets and all their descendants, in the order of the configuration.
+        """
+        targets = self.direct(changed_files)
+        for target in list(targets):
+            targets.update(self.config.descendants(target))
+        logger.debug(f"Affected targets [targets={targets}]")
+        return [target for target in self.config.images if target in targets]
+
+
+def git_changed_files(base: str, runner: Runner = run_command) -> List[str]:
+    """Return the files (relative to the current directory) changed since the `base` git revision.
+
+    Includes committed, staged and unstaged changes in the working tree; files outside
+    of the current directory (i.e. the build context) are ignored.
+    """
+    process = runner(["git", "diff", "--name-only", "--relative", base])
+    if process.returncode != 0:
+        raise ValueError(f"Failed to list the changed files since `{base}` (e={process.stderr.strip()})")
+    return [line for line in process.stdout.splitlines() if line]
+
+
+def git_config(base: str, config_filename: Union[str, Path], runner: Runner = run_command) -> Optional[AGIPackConfig]:
+    """Load the configuration file as of the `base` git revision (or None if it cannot be loaded)."""
+    process = runner(["git", "show", f"{base}:./{_normalize(config_filename)}"])
+    if process.returncode != 0:
+        logger.debug(f"Configuration not found at revision [base={base}, e={process.stderr.strip()}]")
+        return None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = Path(tmp_dir) / Path(config_filename).name
+        filename.write_text(process.stdout)
+        try:
+            return AGIPackConfig.load_yaml(filename)
+        except Exception as e:
+            logger.debug(f"Failed to load configuration at revision [base={base}, e={e}]")
+            return None
+
+
+def affected_targets(
+    config_filename: Union[str, Path],
+    changed_files: Optional[List[Union[str, Path]]] = None,
+    since: Optional[str] = None,
+    locked: bool = False,
+    runner: Runner = run_command,
+) -> List[str]:
+    """Return the targets affected by the changed files, or by the changes since a git revision.
+
+    Args:
+        config_filename (Union[str, Path]): Path to the YAML configuration file.
+        changed_files (List[Union[str, Path]]): Changed files (relative to the build context).
+        since (str): Git revision to diff against (e.g. `origin/main`) if `changed_files` is not set, and
+            to compare the configuration against (otherwise a config change affects all the targets).
+        locked (bool): Whether the images are installed from the lockfiles (changes to them affect the targets).
+        runner (Runner): Function that runs a git command and returns the completed process.
+    Returns:
+        List[str]: Affected targets and all their descendants, in the order of the configuration.
+    """
+    if changed_files is None and since is None:
+        raise ValueError("Either `changed_files` or `since` must be specified")
+    config = AGIPackConfig.load_yaml(config_filename)
+    previous = None
+    if since is not None:
+        previous = git_config(since, config_filename, runner=runner)
+        if changed_files is None:
+            changed_files = git_changed_files(since, runner=runner)
+    index = AffectedIndex(config, config_filename=config_filename, previous=previous, locked=locked)
+    return index.affected(changed_files)
@@ -0,0 +1,108 @@
+import asyncio
+import functools
+import threading
+import weakref
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, TypeVar
+
+from agipack.constants import AGIPACK_MAX_CONCURRENT_BUILDS, AGIPACK_MAX_CONCURRENT_PUSHES
+
+T = TypeVar("T")
+
+LIMITS = {"build": AGIPACK_MAX_CONCURRENT_BUILDS, "push": AGIPACK_MAX_CONCURRENT_PUSHES}
+"""Default concurrency limits (per event loop) for each kind of operation."""
+
+_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+_limiters_lock = threading.Lock()
+
+
+def limiter(kind: str) -> asyncio.Semaphore:
+    """Return the semaphore limiting the concurrent operations of this kind (`build` or `push`).
+
+    The semaphores are shared by all the AGIPack instances running on the same event loop,
+    so that a single process driving many image pipelines is bounded as a whole.
+    """
+    if kind not in LIMITS:
+        raise ValueError(f"Limiter must be one of {list(LIMITS.keys())} (found {kind})")
+    loop = asyncio.get_running_loop()
+    with _limiters_lock:
+        limiters = _limiters.setdefault(loop, {})
+        if kind not in limiters:
+            limiters[kind] = asyncio.Semaphore(LIMITS[kind])
+        return limiters[kind]
+
+
+def set_concurrency(builds: Optional[int] = None, pushes: Optional[int] = None) -> None:
+    """Set the concurrency limits for the running event loop (operations already waiting keep the old limits).
+
+    Args:
+        builds (int): Maximum number of concurrent builds.
+        pushes (int): Maximum number of concurrent pushes.
+    """
+    loop = asyncio.get_running_loop()
+    with _limiters_lock:
+        limiters = _limiters.setdefault(loop, {})
+        for kind, limit in [("build", builds), ("push", pushes)]:
+            if limit is not None:
+                if limit < 1:
+                    raise ValueError(f"Concurrency limit must be >= 1 (found {limit})")
+                limiters[kind] = asyncio.Semaphore(limit)
+
+
+async def run_in_thread(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking function in the default executor, without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+
+_DONE = object()
+
+
+async def iterate_in_thread(factory: Callable[[], Iterator[T]]) -> AsyncIterator[T]:
+    """Consume a blocking iterator in a thread, yielding its items on the event loop as they are produced.
+
+    If the consumer stops early (or is cancelled), the iterator is closed from its thread
+    as soon as it produces its next item, so that generators can release their resources
+    (e.g. kill a running process).
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stopped = threading.Event()
+
+    def put(item: Any, error: Optional[BaseException] = None) -> bool:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+        except RuntimeError:
+            # The event loop was closed
+            return False
+        return True
+
+    def produce() -> None:
+        iterator = factory()
+        try:
+            for item in iterator:
+                if stopped.is_set() or not put(item):
+                    break
+        except BaseException as e:
+            put(_DONE, e)
+            return
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+        put(_DONE)
+
+    future = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                break
+            yield item
+    finally:
+        stopped.set()
+        if not future.done():
+            # Let the producer wind down in the background (it stops at its next item)
+            future.add_done_callback(lambda f: f.exception())
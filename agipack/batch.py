@@ -0,0 +1,141 @@
+import glob
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic.dataclasses import dataclass
+
+from agipack.constants import AGIPACK_DOCKERFILE_TEMPLATE
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GenerateResult:
+    """Result of generating the Dockerfiles for a single configuration file."""
+
+    config_filename: str
+    """Path to the YAML configuration file."""
+
+    status: str = field(default="pending")
+    """Status of the generation (one of `success` or `failed`)."""
+
+    dockerfiles: Dict[str, str] = field(default_factory=dict)
+    """Dictionary of targets and their generated Dockerfile paths."""
+
+    duration: float = field(default=0.0)
+    """Wall time (in seconds) spent loading the config and rendering the Dockerfiles."""
+
+    error: Optional[str] = field(default=None)
+    """Error message if the generation failed."""
+
+    def ok(self) -> bool:
+        """Check if the Dockerfiles were generated successfully."""
+        return self.status == "success"
+
+
+def expand_config_filenames(patterns: List[Union[str, Path]]) -> List[str]:
+    """Expand the (recursive) glob patterns / paths into a de-duplicated list of config filenames.
+
+    Paths without glob characters are kept as-is (even if they do not exist), so that
+    they are reported as failures instead of being silently ignored.
+    """
+    filenames: List[str] = []
+    for pattern in patterns:
+        pattern = str(pattern)
+        if glob.has_magic(pattern):
+            filenames.extend(sorted(glob.glob(pattern, recursive=True)))
+        else:
+            filenames.append(pattern)
+    return list(dict.fromkeys(filenames))
+
+
+def _warm_template_cache() -> None:
+    """Compile the Dockerfile template once per process (inherited by forked workers)."""
+    from agipack.builder import get_template_env
+
+    get_template_env().get_template(AGIPACK_DOCKERFILE_TEMPLATE)
+
+
+def generate_one(config_filename: str, **kwargs: Any) -> GenerateResult:
+    """Load a configuration file and render its Dockerfiles.
+
+    The configuration is loaded and rendered from within its directory (as with
+    `agi-pack generate -c agibuild.yaml` run from there), so relative `add` paths and
+    the `filename`, `output_dir` and `cache_filename` options are relative to it.
+
+    Note:
+        The working directory is process-global: this changes (and restores) the working
+        directory of the calling process, so it is meant to run in a worker process
+        (see `generate_all`), not concurrently with other threads.
+
+    Args:
+        config_filename (str): Path to the YAML configuration file.
+        kwargs: Optional arguments for the render process, see AGIPackRenderOptions for details.
+    Returns:
+        GenerateResult: Result of the generation (failures are captured, not raised).
+    """
+    from agipack.builder import AGIPack
+    from agipack.config import AGIPackConfig
+
+    result = GenerateResult(config_filename=config_filename)
+    config_dir = Path(config_filename).parent
+    cwd = os.getcwd()
+    start = time.perf_counter()
+    try:
+        os.chdir(config_dir)
+        config = AGIPackConfig.load_yaml(Path(config_filename).name)
+        dockerfiles = AGIPack(config).render(**kwargs)
+        result.dockerfiles = {target: os.path.normpath(config_dir / path) for target, path in dockerfiles.items()}
+        result.status = "success"
+    except Exception as e:
+        result.status, result.error = "failed", str(e)
+        logger.error(f"Failed to generate Dockerfiles [config={config_filename}, e={e}]")
+    finally:
+        os.chdir(cwd)
+    result.duration = time.perf_counter() - start
+    return result
+
+
+def generate_all(
+    patterns: List[Union[str, Path]], jobs: Optional[int] = None, **kwargs: Any
+) -> Dict[str, GenerateResult]:
+    """Generate the Dockerfiles for many configuration files in one process (pool).
+
+    The configuration files are rendered concurrently in a pool of `jobs` worker
+    processes (each rendered from within its directory, see `generate_one`), so the
+    working directory of the calling process is left untouched. The template is compiled once in the parent process and shared with
+    forked workers (other start methods use the on-disk `AGIPACK_TEMPLATE_CACHE_DIR`
+    bytecode cache, if set).
+
+    Usage Example:
+        ```python
+        results = generate_all(["services/**/agibuild.yaml"], jobs=8, env="prod")
+        failed = [filename for filename, result in results.items() if not result.ok()]
+        ```
+
+    Args:
+        patterns (List[Union[str, Path]]): Paths or (recursive) glob patterns of the YAML configuration files.
+        jobs (int): Number of worker processes (defaults to the number of CPUs).
+        kwargs: Optional arguments for the render process, see AGIPackRenderOptions for details.
+    Returns:
+        Dict[str, GenerateResult]: Results for each configuration file, in the order of the expanded patterns.
+    """
+    filenames = expand_config_filenames(patterns)
+    if not filenames:
+        raise ValueError(f"No configuration files found for {[str(pattern) for pattern in patterns]}")
+    jobs = min(jobs or os.cpu_count() or 1, len(filenames))
+    logger.info(f"📦 Generating Dockerfiles for {len(filenames)} configs [jobs={jobs}]")
+
+    _warm_template_cache()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_warm_template_cache) as executor:
+        futures = [executor.submit(generate_one, filename, **kwargs) for filename in filenames]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+    logger.info(f"📦 Generated Dockerfiles for {len(filenames)} configs in {elapsed:.2f}s")
+    return {result.config_filename: result for result in results}
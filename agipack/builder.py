@@ -1,22 +1,74 @@
+import hashlib
 import logging
-import os
-import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
 from dataclasses import field
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Union
+from typing import AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
 
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from pydantic.dataclasses import dataclass
 
-from agipack.config import AGIPackConfig, ImageConfig
-from agipack.constants import AGIPACK_DOCKERFILE_TEMPLATE, AGIPACK_ENV, AGIPACK_TEMPLATE_DIR
+from agipack.aio import limiter, run_in_thread
+from agipack.config import (
+    BOOTSTRAP_ARCHS,
+    MIRROR_MOUNT_DIR,
+    AGIPackConfig,
+    BootstrapConfig,
+    ImageConfig,
+    MirrorConfig,
+)
+from agipack.constants import (
+    AGIPACK_CONTEXT_PREFIX,
+    AGIPACK_DOCKERFILE_TEMPLATE,
+    AGIPACK_ENV,
+    AGIPACK_RENDER_CACHE_FILENAME,
+    AGIPACK_TEMPLATE_CACHE_DIR,
+    AGIPACK_TEMPLATE_DIR,
+)
+from agipack.context import context_paths, missing_excludes, render_dockerignore, stage_context
+from agipack.docker import DockerBackend, DockerError, get_backend, split_tag
+from agipack.lock import LOCK_MANAGERS, lockfile_entries, lockfiles
+from agipack.manifest import BuildManifest, RenderCache, compute_fingerprints
+from agipack.pusher import AGIPackPusher, PushResult
+from agipack.report import BuildEvent, BuildProgressParser, BuildReport
 from agipack.version import __version__
 
-logging_level = os.environ.get("AGIPACK_LOGGING_LEVEL", "ERROR")
-logging.basicConfig(level=logging.getLevelName(logging_level))
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=None)
+def get_template_env(bytecode_cache_dir: Optional[str] = AGIPACK_TEMPLATE_CACHE_DIR) -> Environment:
+    """Returns the process-wide Jinja2 environment for the Dockerfile templates.
+
+    The environment (and the templates it compiles) is shared across all AGIPack
+    instances, so that templates are only parsed and compiled once per process.
+
+    Args:
+        bytecode_cache_dir (str): Directory for Jinja2's on-disk bytecode cache
+            (defaults to `AGIPACK_TEMPLATE_CACHE_DIR`, disabled if not set).
+    """
+    bytecode_cache = None
+    if bytecode_cache_dir:
+        Path(bytecode_cache_dir).mkdir(parents=True, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(directory=str(bytecode_cache_dir))
+    return Environment(
+        loader=FileSystemLoader(searchpath=AGIPACK_TEMPLATE_DIR), bytecode_cache=bytecode_cache, auto_reload=False
+    )
+
+
+@lru_cache(maxsize=None)
+def _template_fingerprint(template_name: str) -> str:
+    """Fingerprint of the template source and the agi-pack version."""
+    env = get_template_env()
+    source, _, _ = env.loader.get_source(env, template_name)
+    return hashlib.sha256(f"{__version__}:{source}".encode()).hexdigest()
+
+
 @dataclass
 class AGIPackRenderOptions:
     """Render options for the AGIPack builder."""
@@ -30,6 +82,33 @@ class AGIPackRenderOptions:
     skip_base_builds: bool = field(default=False)
     """Skip building the base images."""
 
+    output_dir: Optional[Union[str, Path]] = field(default=None)
+    """Output directory for per-target Dockerfiles (`<output_dir>/<target>/Dockerfile`).
+    If set, each target is written to its own Dockerfile (and `.dockerignore`) instead of `filename`.
+    """
+
+    tag: str = field(default="{name}:{target}")
+    """Image tag f-string, used to reference parent images in per-target Dockerfiles."""
+
+    incremental: bool = field(default=False)
+    """Only re-render the stages whose inputs changed since the previous render."""
+
+    cache_filename: Union[str, Path] = field(default=AGIPACK_RENDER_CACHE_FILENAME)
+    """Path to the stage cache used for incremental renders."""
+
+    locked: bool = field(default=False)
+    """Install the `conda` / `pip` packages from the target's lockfiles (see `agi-pack lock`), if available."""
+
+    minimal_context: bool = field(default=False)
+    """Write a `<filename>.dockerignore` that restricts the build context to the files referenced by the targets
+    (always written for per-target Dockerfiles in `output_dir`).
+    """
+
+    slim: bool = field(default=False)
+    """Build each production target in a `<target>-build` stage, followed by a slim runtime stage
+    (on the `runtime` base image) with only the conda environment and the project files (see `AGIPack.render`).
+    """
+
     def is_prod(self) -> bool:
         """Check if the build is for production."""
         return self.env == "prod"
@@ -71,32 +150,44 @@ class AGIPack:
 
     Args:
         config (AGIPackConfig): AGIPack configuration.
-        output_directory (str): Output directory for the generated Dockerfiles.
+        backend (DockerBackend): Docker backend used to build, lint and push the images
+            (defaults to the `AGIPACK_DOCKER_BACKEND` backend, i.e. the `docker` CLI).
 
     TL;DR - Yet another DSL for building machine-learning Dockerfiles.
     """
 
-    def __init__(self, config: AGIPackConfig):
+    def __init__(self, config: AGIPackConfig, backend: Optional[DockerBackend] = None):
         """Initialize the AGIPack instance."""
         self.config = config
-        self.template_env = Environment(loader=FileSystemLoader(searchpath=AGIPACK_TEMPLATE_DIR))
-
-    def _render_one(self, target: str, image_config: ImageConfig, options: AGIPackRenderOptions) -> str:
-        """Renders / generates a Dockerfile for the given target image.
-        The Dockerfile is incrementally generated by appending to the output file.
-
-        TODO (spillai): Support writing out to a directory with multiple target
-        Dockerfiles instead of a single file.
+        self.backend = backend or get_backend()
+        self.template_env = get_template_env()
+        self.template = self.template_env.get_template(AGIPACK_DOCKERFILE_TEMPLATE)
+        self.stages: Dict[str, str] = {}
+        """Rendered Dockerfile stages for each target (populated by `render`)."""
+        self.reports: Dict[str, BuildReport] = {}
+        """Build timing reports for each target (populated by `build`)."""
+        self.contexts: Dict[str, List[Path]] = {}
+        """Build context paths needed by each target (populated by `render`)."""
+        self.build_stages: Dict[str, str] = {}
+        """Build stage of each target with a slim runtime stage (populated by `render`)."""
+        self._fingerprints: Optional[Dict[str, str]] = None
+        self._locked = False
+        self._fingerprints_lock = threading.Lock()
+
+    @property
+    def template_fingerprint(self) -> str:
+        """Fingerprint of the Dockerfile template source and the agi-pack version."""
+        return _template_fingerprint(AGIPACK_DOCKERFILE_TEMPLATE)
+
+    def _stage_context(self, target: str, image_config: ImageConfig, options: AGIPackRenderOptions) -> Dict:
+        """Returns the Jinja2 template context for the given target image.
 
         Args:
             target (str): Target image name.
             image_config (ImageConfig): Image configuration.
             options (AGIPackRenderOptions): Render options.
         """
-        template = self.template_env.get_template(AGIPACK_DOCKERFILE_TEMPLATE)
         image_dict = image_config.dict()
-
-        # Render the Dockerfile template
         image_dict["target"] = target
         if options.skip_base_builds:
             image_dict["is_base_image"] = False
@@ -104,58 +195,293 @@ class AGIPack:
             image_dict["is_base_image"] = self.config.is_root(target)
         image_dict["is_prod"] = options.is_prod()
         image_dict["agipack_version"] = __version__
-        content = template.render(image_dict)
 
-        # Write the Dockerfile to the specified output filename
-        output_filename = f"{options.filename}"
-        if not Path(output_filename).parent.exists():
-            Path(output_filename).parent.mkdir(parents=True)
+        # Download the packages from the mirrors / proxy caches (if any)
+        mirrors = self.config.mirrors or MirrorConfig()
+        image_dict["mirrors"] = {
+            "apt": mirrors.apt_options(),
+            "pip": mirrors.pip_options(),
+            "conda": mirrors.conda_options(),
+            "wheels_mount": mirrors.wheels_mount(),
+            "installer_mount": mirrors.installer_mount(),
+            "installer_path": f"{MIRROR_MOUNT_DIR}/installer" if mirrors.installer_mount() else None,
+        }
+
+        # Install conda from the (cached and checksum-verified) installer for each architecture
+        bootstrap = self.config.bootstrap or BootstrapConfig()
+        installer_url = mirrors.installer if mirrors.installer and mirrors.is_url(mirrors.installer) else None
+        image_dict["bootstrap"] = {
+            "installer": bootstrap.installer,
+            "archs": [
+                {
+                    "arch": arch,
+                    "url": installer_url or bootstrap.url(arch),
+                    "sha256": bootstrap.sha256.get(arch, ""),
+                    "filename": bootstrap.filename(arch),
+                }
+                for arch in BOOTSTRAP_ARCHS
+            ],
+        }
+
+        # Install from the lockfiles (if any) instead of resolving the packages during the build
+        locks = lockfiles(target) if options.locked else {}
+        for manager in LOCK_MANAGERS:
+            path = locks.get(manager)
+            image_dict[f"{manager}_locked"] = path is not None
+            image_dict[f"{manager}_lock"] = path.as_posix() if path and lockfile_entries(path) else None
+
+        # Per-target Dockerfiles build from the parent image instead of the parent stage
+        if options.output_dir is not None and image_config.base in self.config.images:
+            parent_config = self.config.images[image_config.base]
+            image_dict["base"] = options.tag.format(name=parent_config.name, target=image_config.base)
+        elif image_config.base in self.build_stages:
+            image_dict["base"] = self.build_stages[image_config.base]
+
+        # Slim production images are built in a separate stage, and only the runtime files are copied over
+        image_dict["stage"] = target
+        image_dict["runtime"] = None
+        if self._is_slim(target, options):
+            image_dict["stage"] = self.build_stages[target] = f"{target}-build"
+            image_dict["runtime"] = self._runtime_context(target)
+        else:
+            self.build_stages.pop(target, None)
+        return image_dict
+
+    def _is_slim(self, target: str, options: AGIPackRenderOptions) -> bool:
+        """Check if the target gets a slim runtime stage.
+
+        In per-target Dockerfiles, targets with children are kept whole, since their
+        children are built from their image (and need the conda / mamba installation).
+        """
+        if not (options.slim and options.is_prod()):
+            return False
+        return options.output_dir is None or not self.config.children(target)
+
+    def _runtime_context(self, target: str) -> Dict:
+        """Returns the Jinja2 template context for the slim runtime stage of the target.
+
+        The runtime stage re-installs the system packages, and sets the environment variables,
+        entrypoint and command of the target and all its ancestors (which are not inherited).
+        """
+        lineage = [*reversed(self.config.ancestors(target)), target]
+        root = self.config.images[lineage[0]]
+        pyenv = f"{root.name}-py{''.join(root.python.split('.')[:2])}"
+        system, env, entrypoint, command, workdirs, paths = [], {}, [], [], [], []
+        for name in lineage:
+            image_config = self.config.images[name]
+            system.extend(image_config.system)
+            env.update(image_config.env)
+            entrypoint = image_config.entrypoint or entrypoint
+            command = image_config.command or command
+            workdirs.append(image_config.workdir or f"/app/{pyenv}")
+            paths.extend(item.split(":")[1] for item in image_config.add)
+        workdirs = list(dict.fromkeys(workdirs))
+        paths = [path for path in paths if not any(path.startswith(f"{workdir}/") for workdir in workdirs)]
+        return {
+            "base": self.config.images[target].runtime or root.base,
+            "project": root.name,
+            "pyenv": pyenv,
+            "system": list(dict.fromkeys(system)),
+            "env": env,
+            "entrypoint": entrypoint,
+            "command": command,
+            "workdir": workdirs[-1],
+            "paths": list(dict.fromkeys([*workdirs, *paths])),
+        }
+
+    def _render_stage(
+        self,
+        target: str,
+        image_config: ImageConfig,
+        options: AGIPackRenderOptions,
+        cache: Optional[RenderCache] = None,
+    ) -> str:
+        """Renders the Dockerfile stage for the given target image.
+
+        Args:
+            target (str): Target image name.
+            image_config (ImageConfig): Image configuration.
+            options (AGIPackRenderOptions): Render options.
+            cache (RenderCache): Stage cache, re-used if the stage inputs are unchanged.
+        Returns:
+            str: Rendered Dockerfile stage.
+        """
+        image_dict = self._stage_context(target, image_config, options)
+        if cache is not None:
+            key = f"{Path(self._output_filename(target, options)).absolute()}:{target}"
+            fingerprint = cache.fingerprint(image_dict, self.template_fingerprint)
+            content = cache.get(key, fingerprint)
+            if content is not None:
+                logger.debug(f"Re-using unchanged Dockerfile stage [{target}]")
+                return content
+
+        # Render the Dockerfile template
+        content = self.template.render(image_dict)
+        if cache is not None:
+            cache.put(key, fingerprint, content)
+        return content
+
+    def _output_filename(self, target: str, options: AGIPackRenderOptions) -> str:
+        """Returns the output Dockerfile path for the given target image."""
+        if options.output_dir is not None:
+            return str(Path(options.output_dir) / target / "Dockerfile")
+        return f"{options.filename}"
+
+    def _write(self, filename: str, content: str) -> bool:
+        """Writes the content to the file, leaving it untouched if it is byte-identical.
+
+        Args:
+            filename (str): Output filename.
+            content (str): Content to write.
+        Returns:
+            bool: True if the file was written, False if it was unchanged.
+        """
+        path = Path(filename)
+        if not path.parent.exists():
+            path.parent.mkdir(parents=True)
         try:
-            mode = "w" if self.config.is_root(target) else "a"
-            with open(str(Path(output_filename).absolute()), mode) as f:
+            if path.exists() and path.read_text() == content:
+                logger.debug(f"Skipping unchanged file [filename={filename}]")
+                return False
+            with open(str(path.absolute()), "w") as f:
                 f.write(content)
         except Exception as e:
-            logger.error(f"Error writing Dockerfile to {output_filename}: {e}")
-            raise Exception(f"Error writing Dockerfile to {output_filename}: {e}")
-        logger.info(f"📦 Generated Dockerfile [target={target}, filename={output_filename}]")
-        return output_filename
+            logger.error(f"Error writing Dockerfile to {filename}: {e}")
+            raise Exception(f"Error writing Dockerfile to {filename}: {e}")
+        return True
 
     def render(self, **kwargs) -> Dict[str, str]:
         """Renders / generates Dockerfiles for all the images defined in the YAML configuration.
 
+        All the stages are rendered in dependency order (parents first), and each output file
+        is only written if its content changed. With `incremental=True`, stages whose inputs are
+        unchanged since the previous render are re-used instead of being re-rendered.
+
         Args:
             kwargs: Optional arguments for the render process, see AGIPackRenderOptions for details.
 
         Returns:
             Dict[str, str]: Dictionary of target image names and their corresponding Dockerfile paths.
         """
-        root = self.config.root()
-        dockerfiles, pending = {}, {root}
+        options: AGIPackRenderOptions = AGIPackRenderOptions(**kwargs)
+        cache = RenderCache(options.cache_filename) if options.incremental else None
+        self._fingerprints, self._locked = None, options.locked
+        bootstrap = self.config.bootstrap
+        if bootstrap is not None and not bootstrap.is_pinned():
+            logger.warning(f"Conda installer is not pinned to a version / checksum [installer={bootstrap.installer}]")
+        dockerfiles: Dict[str, str] = {}
+        contents: Dict[str, List[str]] = {}
+        ignores: Dict[str, List[Path]] = {}
+        pending = list(self.config.roots())
 
         logger.info(f"📦 Generating Dockerfiles for {len(self.config.images)} images")
         while pending:
-            # Pop the next target from the pending set
-            target = pending.pop()
+            # Pop the next target from the pending queue
+            target = pending.pop(0)
             logger.info(f"📦 Generating Dockerfile [{target}]")
 
             # Skip if already rendered
             if target in dockerfiles:
                 continue
 
-            # Render the Dockerfile for the current target
+            # Render the Dockerfile stage for the current target, appending it to the
+            # other stages written to the same output file
             image_config = self.config.images[target]
-            options: AGIPackRenderOptions = AGIPackRenderOptions(**kwargs)
-            filename = self._render_one(target, image_config, options)
+            content = self._render_stage(target, image_config, options, cache=cache)
+            self.stages[target] = content
+            filename = self._output_filename(target, options)
+            contents.setdefault(filename, []).append(content)
             dockerfiles[target] = filename
 
-            # Add children to pending
-            children = self.config.children(target)
-            if len(children):
-                pending.update(children)
+            # Collect the build context paths of the target (and of its ancestors' stages, if in the same file),
+            # re-using the (already rendered) parent's paths instead of walking all the ancestors again
+            paths = context_paths(self.config, target, ancestors=False, locked=options.locked)
+            ignores.setdefault(filename, []).extend(paths)
+            if options.output_dir is None and image_config.base in self.contexts:
+                paths = list(dict.fromkeys([*self.contexts[image_config.base], *paths]))
+            self.contexts[target] = paths
 
+            # Add children to pending
+            pending.extend(self.config.children(target))
+
+        # Write the Dockerfiles to the specified output filenames
+        excludes = self._context_excludes()
+        for filename, stages in contents.items():
+            written = self._write(filename, "".join(stages))
+            logger.info(f"📦 Generated Dockerfile [filename={filename}, changed={written}]")
+
+            # Write a `.dockerignore` that restricts the build context to the files referenced by the targets
+            if options.output_dir is not None or options.minimal_context:
+                self._write(f"{filename}.dockerignore", render_dockerignore(ignores[filename], excludes))
+        missing = missing_excludes(excludes) if options.output_dir is None and not options.minimal_context else []
+        if missing:
+            logger.warning(f"Build context includes the local build cache {missing}, exclude it in the .dockerignore")
+        if cache is not None:
+            cache.save()
         return dockerfiles
 
-    def build(self, filename: str, target: str, tags: List[str] = None, push: bool = False) -> None:
+    async def arender(self, **kwargs) -> Dict[str, str]:
+        """Async counterpart of `render`, rendering the Dockerfiles in a thread (without blocking the event loop).
+
+        Args:
+            kwargs: Optional arguments for the render process, see AGIPackRenderOptions for details.
+
+        Returns:
+            Dict[str, str]: Dictionary of target image names and their corresponding Dockerfile paths.
+        """
+        return await run_in_thread(self.render, **kwargs)
+
+    @classmethod
+    def render_many(cls, configs: Dict[Union[str, Path], AGIPackConfig], **kwargs) -> Dict[str, Dict[str, str]]:
+        """Renders / generates Dockerfiles for a batch of configurations.
+
+        All the configurations share the process-wide compiled template, so the
+        template is only parsed and compiled once for the whole batch.
+
+        Usage Example:
+            ```python
+            AGIPack.render_many({"docker/Dockerfile.cpu": cpu_config, "docker/Dockerfile.gpu": gpu_config})
+            ```
+
+        Args:
+            configs (Dict[Union[str, Path], AGIPackConfig]): Dictionary of output filenames and their configurations.
+            kwargs: Optional arguments for the render process, see AGIPackRenderOptions for details.
+        Returns:
+            Dict[str, Dict[str, str]]: Dictionary of output filenames and their rendered Dockerfiles (per target).
+        """
+        if "filename" in kwargs:
+            raise ValueError("`filename` cannot be specified for render_many, use the keys of `configs` instead")
+        return {str(filename): cls(config).render(filename=filename, **kwargs) for filename, config in configs.items()}
+
+    def fingerprints(self) -> Dict[str, str]:
+        """Content-hash fingerprints for all the targets rendered by `render`.
+
+        The fingerprints are computed once (on first use) and cached until the next `render`.
+        """
+        with self._fingerprints_lock:
+            if self._fingerprints is None:
+                self._fingerprints = compute_fingerprints(self.config, self.stages, locked=self._locked)
+            return self._fingerprints
+
+    def image_exists(self, tag: str) -> bool:
+        """Check if the Docker image tag is present locally.
+
+        Args:
+            tag (str): Tag for the Docker image.
+        """
+        return self.backend.exists(tag)
+
+    def build(
+        self,
+        filename: str,
+        target: str,
+        tags: List[str] = None,
+        push: bool = False,
+        manifest: Optional[BuildManifest] = None,
+        report_dir: Optional[Union[str, Path]] = None,
+        staged_context: bool = False,
+        on_event: Optional[Callable[[BuildEvent], None]] = None,
+    ) -> bool:
         """Builds a Docker image using the generated Dockerfile.
 
         Args:
@@ -163,37 +489,356 @@ class AGIPack:
             target (str): Target image name.
             tag (List[str[]): Tag for the Docker image.
             push (bool): Push the Docker image to the container repository.
+            manifest (BuildManifest): Build manifest used to skip unchanged targets.
+            report_dir (str): Output directory for the per-step timing report
+                (`<report_dir>/<target>.json` and `<report_dir>/<target>.md`).
+            staged_context (bool): Build from a staged (hard-linked) context with only the files the target needs,
+                instead of the current directory.
+            on_event (Callable[[BuildEvent], None]): Function called with every build event
+                (defaults to echoing the build output to stderr).
+        Returns:
+            bool: True if the image was built, False if it was skipped as unchanged.
         """
-        logger.info(f"🚀 Building Docker image for target [{target}]")
-        image_config = self.config.images[target]
-        if tags is not None:
-            if isinstance(tags, str):
-                tags = [tags]
-            assert isinstance(tags, list), "tags must be a list of strings"
-            image_tags = list(tags)
-        else:
-            image_tags = [f"{image_config.name}:{target}"]
-        logger.debug(f"Image tags: {image_tags}")
+        built = True
+        events = self.build_events(
+            filename,
+            target,
+            tags=tags,
+            push=push,
+            manifest=manifest,
+            report_dir=report_dir,
+            staged_context=staged_context,
+        )
+        for event in events:
+            if on_event is not None:
+                on_event(event)
+            elif event.message is not None and event.type != "error":
+                sys.stderr.write(f"{event.message}\n")
+            if event.type == "build_skipped":
+                built = False
+            elif event.type == "error":
+                err_msg = f"Failed to build image [target={target}, e={event.message}]"
+                logger.error(err_msg)
+                raise Exception(err_msg)
+        return built
+
+    def _image_tags(self, target: str, tags: Optional[List[str]]) -> List[str]:
+        """Return the image tags to build for the target (defaults to `<name>:<target>`)."""
+        if tags is None:
+            return [f"{self.config.images[target].name}:{target}"]
+        if isinstance(tags, str):
+            tags = [tags]
+        assert isinstance(tags, list), "tags must be a list of strings"
+        return list(tags)
+
+    def _cache_options(self, target: str, image_tags: List[str]) -> Tuple[List[str], List[str]]:
+        """Return the BuildKit cache sources and destinations for the target (see `CacheConfig`)."""
+        cache = self.config.cache
+        if cache is None:
+            return [], []
+        lineage = {target: image_tags}
+        for ancestor in self.config.ancestors(target):
+            lineage[ancestor] = [f"{self.config.images[ancestor].name}:{ancestor}"]
+        cache_from, cache_to = cache.cache_from(lineage), cache.cache_to(target)
+        logger.debug(f"Build cache [target={target}, cache_from={cache_from}, cache_to={cache_to}]")
+        return cache_from, cache_to
+
+    def _context_excludes(self) -> List[str]:
+        """Return the paths to exclude from the build context (i.e. a local build cache inside it)."""
+        cache = self.config.cache
+        return cache.context_excludes() if cache is not None else []
+
+    def _fingerprint(self, target: str) -> str:
+        """Return the fingerprint of a rendered target, for the build manifest."""
+        if target not in self.stages:
+            raise ValueError(f"Target [{target}] must be rendered before it can be built with a manifest")
+        return self.fingerprints()[target]
+
+    def _staged_context_dir(self, target: str) -> tempfile.TemporaryDirectory:
+        """Stage a minimal build context next to the current directory (so that files can be hard-linked)."""
+        if target not in self.contexts:
+            raise ValueError(f"Target [{target}] must be rendered before it can be built with a staged context")
+        context_dir = tempfile.TemporaryDirectory(dir=".", prefix=AGIPACK_CONTEXT_PREFIX)
+        size = stage_context(self.contexts[target], context_dir.name, excludes=self._context_excludes())
+        logger.info(f"📦 Staged build context [target={target}, size={size.human()}]")
+        return context_dir
+
+    def _progress_parser(self) -> BuildProgressParser:
+        """Returns a build progress parser for the targets (and their build stages, for slim images)."""
+        stages = {stage: self.config.images[target] for target, stage in self.build_stages.items()}
+        return BuildProgressParser({**self.config.images, **stages})
+
+    def _build_targets(self, target: str, image_tags: List[str]) -> List[Tuple[str, List[str]]]:
+        """Returns the Dockerfile targets to build for the target, and their tags.
+
+        Slim images first build their build stage (tagged `<tag>-build`), and then the runtime stage
+        from the build cache, so that the size of both images can be measured without a second build.
+        """
+        stage = self.build_stages.get(target)
+        if stage is None:
+            return [(target, image_tags)]
+        repository, tag = split_tag(image_tags[0])
+        return [(stage, [f"{repository}:{tag}-build"]), (target, image_tags)]
 
-        # Build the Docker image (using buildkit)
-        cmd = f"docker build -f {filename} --target {target}"
-        for tag in image_tags:
-            cmd += f" -t {tag}"
-        cmd += " ."
+    def _image_sizes(self, target: str, image_tags: List[str]) -> Tuple[int, int]:
+        """Returns the size of the built image, and of its build stage for slim images (or 0 if unknown).
 
-        logger.debug(f"Running command: {cmd}")
-        env = os.environ.copy()
-        env.update({"DOCKER_BUILDKIT": "1"})
-        process = subprocess.run(cmd, env=env, shell=True)
+        Failing to inspect the images only logs a warning, since the build itself succeeded.
+        """
+        sizes = []
+        for _, tags in self._build_targets(target, image_tags):
+            try:
+                _, size = self.backend.inspect(tags[0])
+            except DockerError as e:
+                logger.warning(f"Failed to measure the image size [tag={tags[0]}, e={e}]")
+                size = 0
+            sizes.append(size)
+        if len(sizes) == 1:
+            return sizes[0], 0
+        stage_size, image_size = sizes
+        report = BuildReport(target=target, image_size=image_size, build_stage_size=stage_size)
+        logger.info(f"📉 Built slim runtime image [target={target}, size={report.size_summary()}]")
+        return image_size, stage_size
+
+    def _report(
+        self,
+        target: str,
+        parser: BuildProgressParser,
+        duration: float,
+        report_dir: Optional[Union[str, Path]],
+        sizes: Tuple[int, int] = (0, 0),
+    ) -> BuildReport:
+        """Store the build report for the target, and write it to `report_dir` (if provided)."""
+        report = BuildReport.from_steps(target, parser.steps.values(), wall_time=duration)
+        report.image_size, report.build_stage_size = sizes
+        self.reports[target] = report
+        if report_dir is not None:
+            Path(report_dir).mkdir(parents=True, exist_ok=True)
+            (Path(report_dir) / f"{target}.json").write_text(report.to_json())
+            (Path(report_dir) / f"{target}.md").write_text(report.to_markdown())
+            logger.info(f"📊 Wrote build report [target={target}, report_dir={report_dir}]")
+        return report
+
+    def build_events(
+        self,
+        filename: str,
+        target: str,
+        tags: List[str] = None,
+        push: bool = False,
+        manifest: Optional[BuildManifest] = None,
+        report_dir: Optional[Union[str, Path]] = None,
+        staged_context: bool = False,
+    ) -> Iterator[BuildEvent]:
+        """Builds a Docker image, streaming structured events as the build progresses.
+
+        BuildKit's plain progress output is parsed as it is streamed, into events for every
+        step that is started, cached, transferring data, finished or failed (see `BuildEvent`).
+        Only the last lines of output are kept in memory, for the `error` event.
+
+        Usage Example:
+            ```python
+            for event in builder.build_events("Dockerfile", "base-cpu"):
+                if event.type == "step_finished":
+                    print(event.step.name, event.duration)
+            ```
 
-        if process.returncode != 0:
-            err_msg = f"Failed to build image [target={target}, e={process.stderr}]"
-            logger.error(err_msg)
-            raise Exception(err_msg)
+        Args:
+            See `build` for details.
+        Returns:
+            Iterator[BuildEvent]: Build events, starting with `build_started` and ending with either
+                `build_finished`, `build_skipped` (unchanged target) or `error` (failed build).
+        """
+        logger.info(f"🚀 Building Docker image for target [{target}]")
+        image_tags = self._image_tags(target, tags)
+        logger.debug(f"Image tags: {image_tags}")
+        yield BuildEvent(type="build_started", target=target)
+
+        # Skip the build if the target is unchanged since it was last built
+        fingerprint = None
+        if manifest is not None:
+            fingerprint = self._fingerprint(target)
+            if manifest.is_fresh(fingerprint, image_tags, exists=self.image_exists):
+                logger.info(f"✅ Skipping unchanged target [{target}, fingerprint={fingerprint[:12]}]")
+                if push:
+                    self.push(image_tags)
+                yield BuildEvent(type="build_skipped", target=target)
+                return
+
+        # Build the Docker image (using buildkit), parsing the build output into events as it is streamed
+        context_dir = self._staged_context_dir(target) if staged_context else None
+        context = context_dir.name if context_dir is not None else "."
+        cache_from, cache_to = self._cache_options(target, image_tags)
+        options = {"context": context, "plain": True, "cache_from": cache_from, "cache_to": cache_to}
+        parser = self._progress_parser()
+        tail: Deque[str] = deque(maxlen=20)
+        error = None
+        start = time.perf_counter()
+        try:
+            for build_target, build_tags in self._build_targets(target, image_tags):
+                parser.restart()
+                lines = self.backend.build(filename, build_target, build_tags, **options)
+                for line in lines:
+                    tail.append(line)
+                    yield parser.event(line, target)
+        except DockerError as e:
+            error = str(e)
+        finally:
+            if context_dir is not None:
+                context_dir.cleanup()
+        duration = time.perf_counter() - start
+        sizes = self._image_sizes(target, image_tags) if error is None else (0, 0)
+
+        self._report(target, parser, duration, report_dir, sizes=sizes)
+        if error is not None:
+            yield BuildEvent(type="error", target=target, duration=duration, message=error, tail=list(tail))
+            return
+        if manifest is not None:
+            manifest.update(target, fingerprint, image_tags)
 
         # Push the Docker image
         if push:
             self.push(image_tags)
+        yield BuildEvent(type="build_finished", target=target, duration=duration)
+
+    async def abuild_events(
+        self,
+        filename: str,
+        target: str,
+        tags: List[str] = None,
+        push: bool = False,
+        manifest: Optional[BuildManifest] = None,
+        report_dir: Optional[Union[str, Path]] = None,
+        staged_context: bool = False,
+    ) -> AsyncIterator[BuildEvent]:
+        """Async counterpart of `build_events`, streaming the build events on the running event loop.
+
+        The build itself runs on the backend's async API (an asyncio subprocess for the `docker` CLI),
+        and the blocking steps (manifest checks, context staging, reports) run in threads. Cancelling
+        the consumer (or closing the iterator) stops the in-flight build.
+
+        Note that builds are not bounded by the concurrency limits here, see `abuild`.
+
+        Usage Example:
+            ```python
+            async for event in builder.abuild_events("Dockerfile", "base-cpu"):
+                if event.type == "step_finished":
+                    print(event.step.name, event.duration)
+            ```
+
+        Args:
+            See `build` for details.
+        Returns:
+            AsyncIterator[BuildEvent]: Build events (see `build_events`).
+        """
+        logger.info(f"🚀 Building Docker image for target [{target}]")
+        image_tags = self._image_tags(target, tags)
+        logger.debug(f"Image tags: {image_tags}")
+        yield BuildEvent(type="build_started", target=target)
+
+        # Skip the build if the target is unchanged since it was last built
+        fingerprint = None
+        if manifest is not None:
+            fingerprint = await run_in_thread(self._fingerprint, target)
+            if await run_in_thread(manifest.is_fresh, fingerprint, image_tags, exists=self.image_exists):
+                logger.info(f"✅ Skipping unchanged target [{target}, fingerprint={fingerprint[:12]}]")
+                if push:
+                    await self.apush(image_tags)
+                yield BuildEvent(type="build_skipped", target=target)
+                return
+
+        # Build the Docker image, parsing the build output into events as it is streamed
+        context_dir = await run_in_thread(self._staged_context_dir, target) if staged_context else None
+        context = context_dir.name if context_dir is not None else "."
+        cache_from, cache_to = self._cache_options(target, image_tags)
+        options = {"context": context, "plain": True, "cache_from": cache_from, "cache_to": cache_to}
+        parser = self._progress_parser()
+        tail: Deque[str] = deque(maxlen=20)
+        error = None
+        start = time.perf_counter()
+        try:
+            for build_target, build_tags in self._build_targets(target, image_tags):
+                parser.restart()
+                lines = self.backend.abuild(filename, build_target, build_tags, **options)
+                try:
+                    async for line in lines:
+                        tail.append(line)
+                        yield parser.event(line, target)
+                finally:
+                    # Stop the in-flight build if the consumer stopped early (or was cancelled)
+                    await lines.aclose()
+        except DockerError as e:
+            error = str(e)
+        finally:
+            if context_dir is not None:
+                await run_in_thread(context_dir.cleanup)
+        duration = time.perf_counter() - start
+        sizes = await run_in_thread(self._image_sizes, target, image_tags) if error is None else (0, 0)
+
+        await run_in_thread(self._report, target, parser, duration, report_dir, sizes=sizes)
+        if error is not None:
+            yield BuildEvent(type="error", target=target, duration=duration, message=error, tail=list(tail))
+            return
+        if manifest is not None:
+            await run_in_thread(manifest.update, target, fingerprint, image_tags)
+
+        # Push the Docker image
+        if push:
+            await self.apush(image_tags)
+        yield BuildEvent(type="build_finished", target=target, duration=duration)
+
+    async def abuild(
+        self,
+        filename: str,
+        target: str,
+        tags: List[str] = None,
+        push: bool = False,
+        manifest: Optional[BuildManifest] = None,
+        report_dir: Optional[Union[str, Path]] = None,
+        staged_context: bool = False,
+        on_event: Optional[Callable[[BuildEvent], None]] = None,
+    ) -> bool:
+        """Async counterpart of `build`.
+
+        Concurrent builds are bounded by the `build` limiter shared by all the AGIPack instances
+        on the event loop (see `agipack.aio.set_concurrency`), so that many pipelines can be
+        driven from a single process. Cancelling `abuild` stops the in-flight build.
+
+        Usage Example:
+            ```python
+            builders = [AGIPack(config) for config in configs]
+            await asyncio.gather(*(builder.abuild("Dockerfile", "base-cpu") for builder in builders))
+            ```
+
+        Args:
+            See `build` for details.
+        Returns:
+            bool: True if the image was built, False if it was skipped as unchanged.
+        """
+        built = True
+        # Only the build holds the build limiter, the image is pushed (bounded by the push limiter) after it
+        async with limiter("build"):
+            events = self.abuild_events(
+                filename,
+                target,
+                tags=tags,
+                manifest=manifest,
+                report_dir=report_dir,
+                staged_context=staged_context,
+            )
+            async for event in events:
+                if on_event is not None:
+                    on_event(event)
+                elif event.message is not None and event.type != "error":
+                    sys.stderr.write(f"{event.message}\n")
+                if event.type == "build_skipped":
+                    built = False
+                elif event.type == "error":
+                    err_msg = f"Failed to build image [target={target}, e={event.message}]"
+                    logger.error(err_msg)
+                    raise Exception(err_msg)
+        if push:
+            await self.apush(self._image_tags(target, tags))
+        return built
 
     def lint(self, filename: str) -> bool:
         """Lint the generated Dockerfile using hadolint.
@@ -201,24 +846,43 @@ class AGIPack:
         Args:
             filename (str): Path to the generated Dockerfile.
         """
-        cmd = "docker pull hadolint/hadolint && "
-        cmd += f"docker run --pull=always --rm -i hadolint/hadolint < {filename}"
         logger.info("Linting with hadolint")
-        process = subprocess.run(cmd, shell=True)
-        return process.returncode == 0
+        try:
+            return self.backend.lint(filename)
+        except DockerError as e:
+            logger.error(f"Failed to lint Dockerfile [filename={filename}, e={e}]")
+            return False
 
-    def push(self, tags: List[str]) -> None:
+    def push(self, tags: List[str], jobs: int = 4, retries: int = 3) -> Dict[str, PushResult]:
         """Pushes Docker image tags to the container repository.
 
         Args:
             tags (List[str]): Tags for the Docker image.
+            jobs (int): Maximum number of concurrent pushes.
+            retries (int): Maximum number of retries for transient push failures.
+        Returns:
+            Dict[str, PushResult]: Push results for each tag.
         """
         logger.info(f"🚀 Pushing Docker images [{tags}]")
 
-        # Push the Docker image
-        for tag in tags:
-            cmd = f"docker push {tag}"
-            logger.debug(f"Running command: {cmd}")
-            process = subprocess.run(cmd, shell=True)
-            if process.returncode != 0:
-                raise Exception(f"Failed to push image [tag={tag}]")
+        # Push the Docker images concurrently
+        results = AGIPackPusher(jobs=jobs, retries=retries, backend=self.backend).push(tags)
+        failed = [tag for tag, result in results.items() if not result.ok()]
+        if failed:
+            raise Exception(f"Failed to push image [tags={failed}]")
+        return results
+
+    async def apush(self, tags: List[str], jobs: int = 4, retries: int = 3) -> Dict[str, PushResult]:
+        """Async counterpart of `push` (see `AGIPackPusher.apush`).
+
+        Args:
+            See `push` for details.
+        Returns:
+            Dict[str, PushResult]: Push results for each tag.
+        """
+        logger.info(f"🚀 Pushing Docker images [{tags}]")
+        results = await AGIPackPusher(jobs=jobs, retries=retries, backend=self.backend).apush(tags)
+        failed = [tag for tag, result in results.items() if not result.ok()]
+        if failed:
+            raise Exception(f"Failed to push image [tags={failed}]")
+        return results
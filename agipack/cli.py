@@ -1,19 +1,34 @@
+import logging
+import os
 from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List
 
 import typer
 from rich import print
-from rich.tree import Tree
 
-from agipack.builder import AGIPack, AGIPackConfig
-from agipack.constants import AGIPACK_BASENAME, AGIPACK_SAMPLE_FILENAME
+from agipack.constants import (
+    AGIPACK_BASENAME,
+    AGIPACK_DOCKER_BACKEND,
+    AGIPACK_MANIFEST_FILENAME,
+    AGIPACK_MIRROR_DIR,
+    AGIPACK_SAMPLE_FILENAME,
+)
 from agipack.version import __version__
 
+# Note: The heavier dependencies (jinja2, pydantic, yaml, rich tables/trees) are
+# imported lazily within the commands that need them, to keep the CLI startup fast.
+if TYPE_CHECKING:
+    from agipack.config import AGIPackConfig
+    from agipack.pusher import PushResult
+
 app = typer.Typer(invoke_without_command=True)
 
 
 @app.callback()
 def main(ctx: typer.Context):
     """Dockerfile generator for AGI -- nothing more, nothing less."""
+    logging_level = os.environ.get("AGIPACK_LOGGING_LEVEL", "ERROR")
+    logging.basicConfig(level=logging.getLevelName(logging_level))
     if ctx.invoked_subcommand is None:
         print(ctx.get_help())
 
@@ -27,6 +42,8 @@ def version():
 @app.command()
 def init():
     """Generate a sample agibuild.yaml file."""
+    from agipack.config import AGIPackConfig
+
     config = AGIPackConfig.load_yaml(str(AGIPACK_SAMPLE_FILENAME))
     config.save_yaml(AGIPACK_BASENAME)
     print(f"🎉 Sample `{AGIPACK_BASENAME}` file generated.")
@@ -40,6 +57,113 @@ def init():
 DEFAULT_TARGET_NAME = Path.cwd().name.strip("/")
 
 
+def _load_config(
+    config_filename: str,
+    python: str = None,
+    base_image: str = None,
+    cache: str = None,
+    cache_export: bool = True,
+    config_cache: bool = False,
+    mirrors: str = None,
+) -> "AGIPackConfig":
+    """Load the YAML configuration, overriding the python version, root base image(s), build cache and mirrors."""
+    from dataclasses import replace
+
+    from agipack.config import AGIPackConfig, CacheConfig, MirrorConfig
+
+    config = AGIPackConfig.load_yaml(config_filename, cache=config_cache)
+    for root in config.roots():
+        # Overrides would collapse the corresponding axis of the build matrix
+        origin = config.origin(root)
+        for axis, value in [("python", python), ("base", base_image)]:
+            if value and axis in config.matrix.get(origin, {}):
+                raise ValueError(f"Cannot override `{axis}` of matrix target `{origin}` with a `{axis}` axis")
+    for root in config.roots():
+        if python:
+            config.images[root].python = python
+        if base_image:
+            config.images[root].base = base_image
+    if cache:
+        config.cache = CacheConfig.parse(cache)
+    if config.cache is not None and not cache_export:
+        config.cache = replace(config.cache, export=False)
+    if mirrors:
+        config.mirrors = MirrorConfig.parse(mirrors)
+    return config
+
+
+def _watch(
+    config_filename: str,
+    python: str = None,
+    base_image: str = None,
+    rebuild: bool = False,
+    jobs: int = 1,
+    manifest_filename: str = None,
+    backend: str = AGIPACK_DOCKER_BACKEND,
+    cache: str = None,
+    cache_export: bool = True,
+    config_cache: bool = False,
+    mirrors: str = None,
+    **render_kwargs,
+) -> None:
+    """Watch the configuration and its files, re-rendering (and optionally rebuilding) the affected targets."""
+    from agipack.docker import get_backend
+    from agipack.manifest import BuildManifest
+    from agipack.scheduler import AGIPackScheduler
+    from agipack.watch import AGIPackWatcher
+
+    manifest = BuildManifest(manifest_filename) if manifest_filename else None
+    docker_backend = get_backend(backend)
+
+    def on_change(event) -> None:
+        if event.error:
+            print(f"[bold red]✗[/bold red] Failed to re-render Dockerfiles (e={event.error}).")
+            return
+        print(
+            f"[bold green]✓[/bold green] Re-rendered {len(event.affected)} affected targets {event.affected} "
+            f"(latency=[bold white]{event.latency * 1e3:.0f}ms[/bold white])."
+        )
+        if not rebuild or not event.affected:
+            return
+        # Build with the rendering builder, whose stages are needed to fingerprint the targets
+        builder = watcher.builder
+
+        def build_target(docker_target: str) -> bool:
+            image_config = watcher.config.images[docker_target]
+            tag_name = render_kwargs["tag"].format(name=image_config.name, target=docker_target)
+            print(f"🚀 Building Docker image for target [{docker_target}]")
+            return builder.build(
+                filename=event.dockerfiles[docker_target], target=docker_target, tags=[tag_name], manifest=manifest
+            )
+
+        results = AGIPackScheduler(watcher.config, jobs=jobs, fail_fast=False).run(
+            build_target, targets=event.affected
+        )
+        for docker_target, result in results.items():
+            status = "[bold green]✓[/bold green]" if result.ok() else "[bold red]✗[/bold red]"
+            print(f"{status} Rebuilt image (target=[bold white]{docker_target}[/bold white], status={result.status}).")
+
+    watcher = AGIPackWatcher(
+        config_filename,
+        loader=lambda filename: _load_config(
+            filename,
+            python=python,
+            base_image=base_image,
+            cache=cache,
+            cache_export=cache_export,
+            config_cache=config_cache,
+            mirrors=mirrors,
+        ),
+        backend=docker_backend,
+        **render_kwargs,
+    )
+    print(f"👀 Watching [bold white]{config_filename}[/bold white] for changes (press Ctrl+C to stop).")
+    try:
+        watcher.run(on_change)
+    except KeyboardInterrupt:
+        print("👋 Stopped watching.")
+
+
 @app.command()
 def generate(
     config_filename: str = typer.Option(
@@ -48,6 +172,12 @@ def generate(
     filename: str = typer.Option(
         "Dockerfile", "--output-filename", "-o", help="Output filename for the generated Dockerfile."
     ),
+    output_dir: str = typer.Option(
+        None,
+        "--output-dir",
+        help="Output directory for per-target Dockerfiles (overrides --output-filename).",
+        show_default=False,
+    ),
     python: str = typer.Option(
         None, "--python", "-p", help="Python version to use for the base image.", show_default=False
     ),
@@ -57,38 +187,167 @@ def generate(
     tag: str = typer.Option("{name}:{target}", "--tag", "-t", help="Image tag f-string.", show_default=True),
     target: str = typer.Option(None, "--target", help="Build specific target.", show_default=False),
     prod: bool = typer.Option(False, "--prod", help="Generate a production Dockerfile.", show_default=False),
+    slim: bool = typer.Option(
+        False,
+        "--slim",
+        help="Copy the environment into a slim runtime stage (implies --prod).",
+        show_default=False,
+    ),
+    incremental: bool = typer.Option(
+        False, "--incremental", help="Only re-render the Dockerfile stages that changed.", show_default=False
+    ),
+    locked: bool = typer.Option(
+        False, "--locked", help="Install packages from the lockfiles (see `agi-pack lock`).", show_default=False
+    ),
+    minimal_context: bool = typer.Option(
+        False,
+        "--minimal-context",
+        help="Restrict the build context to the referenced files (with a .dockerignore).",
+        show_default=False,
+    ),
+    staged_context: bool = typer.Option(
+        False,
+        "--staged-context",
+        help="Build from a staged (hard-linked) context with only the referenced files.",
+        show_default=False,
+    ),
     lint: bool = typer.Option(False, "--lint", help="Lint the generated Dockerfile.", show_default=False),
     build: bool = typer.Option(False, "--build", help="Build the Docker image after generating the Dockerfile."),
     skip_base_builds: bool = typer.Option(
         False, "--skip-base", help="Skip building the base image.", show_default=False
     ),
     push: bool = typer.Option(False, "--push", help="Push image to container repository.", show_default=False),
+    push_retries: int = typer.Option(
+        3, "--push-retries", help="Number of retries for transient push failures.", show_default=True
+    ),
+    push_jobs: int = typer.Option(4, "--push-jobs", help="Number of concurrent pushes.", show_default=True),
+    jobs: int = typer.Option(1, "--jobs", "-j", help="Number of concurrent image builds.", show_default=True),
+    keep_going: bool = typer.Option(
+        False, "--keep-going", help="Keep building independent targets after a failure.", show_default=False
+    ),
+    manifest_filename: str = typer.Option(
+        AGIPACK_MANIFEST_FILENAME, "--manifest", help="Path to the build manifest used to skip unchanged targets."
+    ),
+    force: bool = typer.Option(False, "--force", help="Rebuild all targets, even if unchanged.", show_default=False),
+    report_dir: str = typer.Option(
+        None, "--report", help="Output directory for per-target build timing reports.", show_default=False
+    ),
+    backend: str = typer.Option(
+        AGIPACK_DOCKER_BACKEND, "--backend", help="Docker backend (`cli` or the Engine `api`).", show_default=True
+    ),
+    cache: str = typer.Option(
+        None,
+        "--cache",
+        help="BuildKit cache (e.g. `type=registry,ref=ghcr.io/org/cache` or `type=local,ref=.buildcache`).",
+        show_default=False,
+    ),
+    cache_export: bool = typer.Option(
+        True, "--cache-export/--no-cache-export", help="Export the build cache after building.", show_default=True
+    ),
+    config_cache: bool = typer.Option(
+        True,
+        "--config-cache/--no-config-cache",
+        help="Re-use the validated config from the config cache if unchanged.",
+        show_default=True,
+    ),
+    mirrors: str = typer.Option(
+        None,
+        "--mirrors",
+        help="Package mirrors (e.g. `apt=http://apt-cacher:3142,wheels=.agipack/mirror/wheels,offline=true`).",
+        show_default=False,
+    ),
+    progress: str = typer.Option(
+        "auto", "--progress", help="Build progress (`live`, `plain` or `auto`, i.e. live on a terminal)."
+    ),
+    watch: bool = typer.Option(
+        False, "--watch", help="Watch the config and its files, and re-render on changes.", show_default=False
+    ),
+    rebuild: bool = typer.Option(
+        False, "--rebuild", help="Rebuild the affected targets on changes (with --watch).", show_default=False
+    ),
 ):
     r"""Generate the Dockerfile with optional overrides.
 
     Usage:\n
         agi-pack generate -c agibuild.yaml\n
         agi-pack generate -c agibuild.yaml -o docker/Dockerfile\n
+        agi-pack generate -c agibuild.yaml --output-dir docker/\n
         agi-pack generate -c agibuild.yaml -p 3.8.10\n
         agi-pack generate -c agibuild.yaml -b python:3.8.10-slim\n
         agi-pack generate -c agibuild.yaml -t "my-image-name:{target}"\n
         agi-pack generate -c agibuild.yaml --prod --lint\n
+        agi-pack generate -c agibuild.yaml --slim\n
+        agi-pack generate -c agibuild.yaml --incremental\n
+        agi-pack generate -c agibuild.yaml --locked\n
+        agi-pack generate -c agibuild.yaml --minimal-context\n
         agi-pack generate -c agibuild.yaml --build --push\n
+        agi-pack generate -c agibuild.yaml --build --jobs 4\n
+        agi-pack generate -c agibuild.yaml --watch --rebuild\n
+        agi-pack generate -c agibuild.yaml --mirrors apt=http://apt-cacher:3142\n
     """
-    # Load the YAML configuration
-    config = AGIPackConfig.load_yaml(config_filename)
+    from rich.console import Console
+    from rich.live import Live
+    from rich.tree import Tree
+
+    from agipack.builder import AGIPack
+    from agipack.context import context_size
+    from agipack.docker import get_backend
+    from agipack.manifest import BuildManifest
+    from agipack.progress import BuildProgressDisplay
+    from agipack.pusher import AGIPackPusher
+    from agipack.scheduler import AGIPackScheduler
 
-    # Override the python version and base image for the root image
-    root = config.root()
-    if python:
-        config.images[root].python = python
-    if base_image:
-        config.images[root].base = base_image
+    prod = prod or slim
+    if watch:
+        _watch(
+            config_filename,
+            python=python,
+            base_image=base_image,
+            rebuild=rebuild,
+            jobs=jobs,
+            manifest_filename=None if force else manifest_filename,
+            backend=backend,
+            cache=cache,
+            cache_export=cache_export,
+            config_cache=config_cache,
+            mirrors=mirrors,
+            filename=filename,
+            env="prod" if prod else "dev",
+            slim=slim,
+            skip_base_builds=skip_base_builds,
+            output_dir=output_dir,
+            tag=tag or "{name}:{target}",
+            locked=locked,
+            minimal_context=minimal_context,
+        )
+        return
+
+    # Load the YAML configuration
+    config = _load_config(
+        config_filename,
+        python=python,
+        base_image=base_image,
+        cache=cache,
+        cache_export=cache_export,
+        config_cache=config_cache,
+        mirrors=mirrors,
+    )
 
     # Render the Dockerfiles with the new filename and configuration
-    trees = []
-    builder = AGIPack(config)
-    dockerfiles = builder.render(filename=filename, env="prod" if prod else "dev", skip_base_builds=skip_base_builds)
+    trees, tag_names = {}, {}
+    builder = AGIPack(config, backend=get_backend(backend))
+    dockerfiles = builder.render(
+        filename=filename,
+        env="prod" if prod else "dev",
+        slim=slim,
+        skip_base_builds=skip_base_builds,
+        output_dir=output_dir,
+        tag=tag or "{name}:{target}",
+        incremental=incremental,
+        locked=locked,
+        minimal_context=minimal_context,
+    )
+    full_context = context_size() if minimal_context or staged_context else None
     for docker_target, filename in dockerfiles.items():
         # Skip if the target is not the one we want to build
         if target is not None and docker_target != target:
@@ -101,6 +360,7 @@ def generate(
             if tag is None
             else tag.format(name=image_config.name, target=docker_target)
         )
+        tag_names[docker_target] = tag_name
         cmd = f"docker build -f {filename} --target {docker_target} -t {tag_name} ."
 
         # Print the command to build the Dockerfile
@@ -108,33 +368,417 @@ def generate(
         tree.add(
             f"[bold green]✓[/bold green] Successfully generated Dockerfile (target=[bold white]{docker_target}[/bold white], filename=[bold white]{filename}[/bold white])."
         ).add(f"[green]`{cmd}`[/green]")
+        if full_context is not None:
+            target_context = context_size(builder.contexts[docker_target])
+            tree.add(
+                f"[bold green]✓[/bold green] Minimal build context (size=[bold white]{target_context.human()}[/bold white], full=[bold white]{full_context.human()}[/bold white])."
+            )
         print(tree)
+        trees[docker_target] = tree
 
         # Lint the generated Dockerfile using hadolint
         if lint:
             print(f"🔍 Linting Dockerfile for target [{docker_target}]")
             builder.lint(filename=filename)
 
-        # Build the Docker image using subprocess and print all the output as it happens
-        if build:
+    if not build:
+        return
+
+    # Build the Docker images, parents first and independent siblings concurrently
+    manifest = None if force else BuildManifest(manifest_filename)
+
+    # Render a live progress display from the build events (on a terminal), or echo the build output
+    display = None
+    if progress == "live" or (progress == "auto" and Console(stderr=True).is_terminal):
+        display = BuildProgressDisplay(list(trees.keys()))
+
+    def build_target(docker_target: str) -> bool:
+        if display is None:
             print(f"🚀 Building Docker image for target [{docker_target}]")
-            builder.build(filename=filename, target=docker_target, tags=[tag_name], push=push)
+        return builder.build(
+            filename=dockerfiles[docker_target],
+            target=docker_target,
+            tags=[tag_names[docker_target]],
+            manifest=manifest,
+            report_dir=report_dir,
+            staged_context=staged_context,
+            on_event=display.update if display is not None else None,
+        )
+
+    scheduler = AGIPackScheduler(config, jobs=jobs, fail_fast=not keep_going)
+    if display is not None:
+        with Live(display, console=Console(stderr=True), refresh_per_second=4):
+            results = scheduler.run(build_target, targets=list(trees.keys()))
+    else:
+        results = scheduler.run(build_target, targets=list(trees.keys()))
 
+    # Push all the built images concurrently to the container repository
+    push_results = {}
+    if push:
+        pusher = AGIPackPusher(jobs=push_jobs, retries=push_retries, backend=builder.backend)
+        push_results = pusher.push([tag_names[t] for t, result in results.items() if result.ok()])
+
+    # Re-render the tree
+    for docker_target, result in results.items():
+        tree, tag_name = trees[docker_target], tag_names[docker_target]
+        if not result.ok():
+            tree.add(
+                f"[bold red]✗[/bold red] Failed to build image (target=[bold white]{docker_target}[/bold white], status=[bold white]{result.status}[/bold white], e={result.error})."
+            )
+            print(tree)
+            continue
+        if result.status == "cached":
             tree.add(
-                f"[bold green]✓[/bold green] Successfully built image (target=[bold white]{docker_target}[/bold white], image=[bold white]{tag_name}[/bold white])."
+                f"[bold green]✓[/bold green] Skipped unchanged image (target=[bold white]{docker_target}[/bold white], image=[bold white]{tag_name}[/bold white])."
             )
-            # Push the Docker image to the container repository
-            if push:
+        else:
+            tree.add(
+                f"[bold green]✓[/bold green] Successfully built image (target=[bold white]{docker_target}[/bold white], image=[bold white]{tag_name}[/bold white], time=[bold white]{result.duration:.1f}s[/bold white])."
+            )
+        # Summarize where the build time went
+        if docker_target in builder.reports:
+            summary = builder.reports[docker_target].summary()
+            breakdown = ", ".join(f"{name}={entry['percent']:.0f}%" for name, entry in list(summary.items())[:3])
+            tree.add(
+                f"[bold green]✓[/bold green] Wrote build report (target=[bold white]{docker_target}[/bold white], report=[bold white]{report_dir}[/bold white], {breakdown})."
+            )
+            if builder.reports[docker_target].build_stage_size:
                 tree.add(
-                    f"[bold green]✓[/bold green] Successfully pushed image (target=[bold white]{docker_target}[/bold white], image=[bold white]{tag_name}[/bold white])."
+                    f"[bold green]✓[/bold green] Slim runtime image (target=[bold white]{docker_target}[/bold white], size=[bold white]{builder.reports[docker_target].size_summary()}[/bold white])."
                 )
-            trees.append(tree)
+        # Push the Docker image to the container repository
+        if push and push_results[tag_name].ok():
+            tree.add(
+                f"[bold green]✓[/bold green] Successfully pushed image (target=[bold white]{docker_target}[/bold white], image=[bold white]{tag_name}[/bold white])."
+            )
+        elif push:
+            tree.add(
+                f"[bold red]✗[/bold red] Failed to push image (target=[bold white]{docker_target}[/bold white], image=[bold white]{tag_name}[/bold white], e={push_results[tag_name].error})."
+            )
+        print(tree)
+    if push_results:
+        _print_push_summary(push_results)
 
-    # Re-render the tree
-    for tree in trees:
+    failed = [result.target for result in results.values() if not result.ok()]
+    if failed:
+        print(f"[bold red]✗[/bold red] Failed to build {len(failed)}/{len(results)} targets {failed}.")
+        raise typer.Exit(code=1)
+    if not all(result.ok() for result in push_results.values()):
+        raise typer.Exit(code=1)
+
+
+@app.command("generate-all")
+def generate_all(
+    configs: List[str] = typer.Argument(
+        ..., help="Paths or (quoted) glob patterns of the YAML configuration files.", show_default=False
+    ),
+    filename: str = typer.Option(
+        "Dockerfile",
+        "--output-filename",
+        "-o",
+        help="Output filename for the generated Dockerfile (relative to each configuration file).",
+    ),
+    output_dir: str = typer.Option(
+        None,
+        "--output-dir",
+        help="Output directory for per-target Dockerfiles (relative to each configuration file).",
+        show_default=False,
+    ),
+    tag: str = typer.Option("{name}:{target}", "--tag", "-t", help="Image tag f-string.", show_default=True),
+    prod: bool = typer.Option(False, "--prod", help="Generate production Dockerfiles.", show_default=False),
+    incremental: bool = typer.Option(
+        False, "--incremental", help="Only re-render the Dockerfile stages that changed.", show_default=False
+    ),
+    jobs: int = typer.Option(
+        None, "--jobs", "-j", help="Number of worker processes (defaults to the number of CPUs).", show_default=False
+    ),
+):
+    r"""Generate the Dockerfiles for many configuration files in one process pool.
+
+    Usage:\n
+        agi-pack generate-all "services/**/agibuild.yaml"\n
+        agi-pack generate-all a/agibuild.yaml b/agibuild.yaml --prod -j 8\n
+    """
+    import time
+
+    from rich.table import Table
+
+    from agipack.batch import generate_all as _generate_all
+
+    start = time.perf_counter()
+    try:
+        results = _generate_all(
+            configs,
+            jobs=jobs,
+            filename=filename,
+            output_dir=output_dir,
+            env="prod" if prod else "dev",
+            tag=tag,
+            incremental=incremental,
+        )
+    except ValueError as e:
+        print(f"[bold red]✗[/bold red] {e}")
+        raise typer.Exit(code=1)
+    elapsed = time.perf_counter() - start
+
+    table = Table(title="📦 Generated Dockerfiles")
+    for column in ["Config", "Status", "Targets", "Time (s)"]:
+        table.add_column(column)
+    for config_filename, result in results.items():
+        status = "[bold green]✓[/bold green]" if result.ok() else f"[bold red]✗[/bold red] {result.error}"
+        table.add_row(config_filename, status, str(len(result.dockerfiles)), f"{result.duration:.2f}")
+    print(table)
+
+    failed = [result.config_filename for result in results.values() if not result.ok()]
+    print(
+        f"📦 Generated {len(results) - len(failed)}/{len(results)} configs in {elapsed:.2f}s "
+        f"({len(results) / elapsed:.1f} configs/s)."
+    )
+    if failed:
+        raise typer.Exit(code=1)
+
+
+def _print_push_summary(results: Dict[str, "PushResult"]) -> None:
+    """Print an aggregated summary of the pushed image tags (the total counts tags of the same image once)."""
+    from rich.table import Table
+
+    from agipack.pusher import push_wall_time
+
+    table = Table(title="🚀 Push summary")
+    for column in ["Tag", "Status", "Local size (MB)", "Attempts", "Time (s)"]:
+        table.add_column(column)
+    for tag, result in results.items():
+        status = "[bold green]✓[/bold green]" if result.ok() else f"[bold red]✗[/bold red] {result.error}"
+        table.add_row(tag, status, f"{result.size / 1e6:.1f}", str(result.attempts), f"{result.duration:.1f}")
+    total_size = sum({result.image_id or tag: result.size for tag, result in results.items()}.values())
+    total_time = push_wall_time(results.values())
+    table.add_row("[bold]Total[/bold]", "", f"{total_size / 1e6:.1f}", "", f"{total_time:.1f}")
+    print(table)
+
+
+@app.command()
+def layers(
+    config_filename: str = typer.Option(
+        AGIPACK_BASENAME, "--config", "-c", help="Path to the YAML configuration file."
+    ),
+    against: str = typer.Option(
+        None, "--against", help="Previous YAML configuration to compare against.", show_default=False
+    ),
+):
+    """Show the layers of each target, and the ones a config change would invalidate.
+
+    Usage:\n
+        agi-pack layers -c agibuild.yaml\n
+        agi-pack layers -c agibuild.yaml --against agibuild.old.yaml\n
+    """
+    from rich.tree import Tree
+
+    from agipack.config import AGIPackConfig
+    from agipack.layers import invalidated_layers, stage_layers
+
+    config = AGIPackConfig.load_yaml(config_filename)
+    previous = AGIPackConfig.load_yaml(against) if against else config
+    invalidated = invalidated_layers(previous, config)
+    for docker_target, image_config in config.images.items():
+        tree = Tree(f"📦 [bold white]{docker_target}[/bold white] (layering={image_config.layering})")
+        for label, _ in stage_layers(image_config):
+            if label in invalidated[docker_target]:
+                tree.add(f"[bold red]✗[/bold red] {label} [red](invalidated)[/red]")
+            else:
+                tree.add(f"[bold green]✓[/bold green] {label}")
         print(tree)
 
 
+@app.command()
+def lock(
+    config_filename: str = typer.Option(
+        AGIPACK_BASENAME, "--config", "-c", help="Path to the YAML configuration file."
+    ),
+    target: List[str] = typer.Option(
+        None, "--target", help="Targets to lock (defaults to all the targets).", show_default=False
+    ),
+    index_url: str = typer.Option(
+        None, "--index-url", help="Base URL of the Python package index.", show_default=False
+    ),
+    find_links: List[str] = typer.Option(
+        None, "--find-links", help="Local directories / URLs to look for distributions in.", show_default=False
+    ),
+    no_index: bool = typer.Option(False, "--no-index", help="Ignore the Python package index.", show_default=False),
+    platform: List[str] = typer.Option(
+        None, "--platform", help="Platform tags to resolve wheels for (e.g. manylinux2014_x86_64).", show_default=False
+    ),
+    host_python: bool = typer.Option(
+        False, "--host-python", help="Resolve for the host python instead of the image's.", show_default=False
+    ),
+):
+    r"""Resolve the conda / pip packages of each target into lockfiles (with pinned versions and hashes).
+
+    Usage:\n
+        agi-pack lock -c agibuild.yaml\n
+        agi-pack lock -c agibuild.yaml --target dev-cpu --platform manylinux2014_x86_64\n
+        agi-pack lock -c agibuild.yaml --no-index --find-links wheels/\n
+        agi-pack generate -c agibuild.yaml --locked\n
+    """
+    from rich.tree import Tree
+
+    from agipack.config import AGIPackConfig
+    from agipack.lock import AGIPackLocker
+
+    config = AGIPackConfig.load_yaml(config_filename)
+    locker = AGIPackLocker(
+        config,
+        index_url=index_url,
+        find_links=find_links,
+        no_index=no_index,
+        platforms=platform,
+        host_python=host_python,
+    )
+    try:
+        results = locker.lock(targets=target or None)
+    except ValueError as e:
+        print(f"[bold red]✗[/bold red] Failed to lock packages (e={e}).")
+        raise typer.Exit(code=1)
+    for docker_target, result in results.items():
+        tree = Tree(f"🔒 [bold white]{docker_target}[/bold white]")
+        for manager, filename in result.lockfiles.items():
+            count = len(getattr(result, manager))
+            tree.add(
+                f"[bold green]✓[/bold green] Locked {count} {manager} packages ([bold white]{filename}[/bold white])."
+            )
+        print(tree)
+
+
+@app.command()
+def mirror(
+    config_filename: str = typer.Option(
+        AGIPACK_BASENAME, "--config", "-c", help="Path to the YAML configuration file."
+    ),
+    target: List[str] = typer.Option(
+        None, "--target", help="Targets to mirror (defaults to all the targets).", show_default=False
+    ),
+    mirror_dir: str = typer.Option(
+        AGIPACK_MIRROR_DIR, "--mirror-dir", "-o", help="Directory for the local mirror (in the build context)."
+    ),
+    arch: str = typer.Option("x86_64", "--arch", help="Architecture of the images (`x86_64` or `aarch64`)."),
+    platform: List[str] = typer.Option(
+        None, "--platform", help="Wheel platform tags (e.g. manylinux_2_28_x86_64).", show_default=False
+    ),
+    installer_url: str = typer.Option(
+        None, "--installer-url", help="URL of the conda installer (Miniconda or micromamba).", show_default=False
+    ),
+    locked: bool = typer.Option(
+        False, "--locked", help="Download the pinned pip packages from the lockfiles.", show_default=False
+    ),
+):
+    r"""Prefetch the conda installer and pip wheels of each target into a local mirror.
+
+    Usage:
+
+        agi-pack mirror -c agibuild.yaml
+
+        agi-pack mirror -c agibuild.yaml --target dev-cpu --arch aarch64
+
+        agi-pack mirror -c agibuild.yaml --locked
+
+        agi-pack build -c agibuild.yaml --mirrors wheels=.agipack/mirror/wheels,offline=true
+
+    """
+    from dataclasses import asdict
+
+    import yaml
+    from rich.tree import Tree
+
+    from agipack.config import AGIPackConfig
+    from agipack.mirror import AGIPackMirror
+
+    config = AGIPackConfig.load_yaml(config_filename)
+    try:
+        mirror = AGIPackMirror(
+            config, mirror_dir=mirror_dir, arch=arch, platforms=platform, installer_url=installer_url, locked=locked
+        )
+        result = mirror.mirror(targets=target or None)
+    except ValueError as e:
+        print(f"[bold red]✗[/bold red] Failed to mirror packages (e={e}).")
+        raise typer.Exit(code=1)
+    tree = Tree(f"🪞 [bold white]{mirror_dir}[/bold white]")
+    tree.add(f"[bold green]✓[/bold green] Mirrored conda installer ([bold white]{result.installer}[/bold white]).")
+    tree.add(f"[bold green]✓[/bold green] Mirrored {len(result.wheels)} pip wheels.")
+    print(tree)
+    mirrors = {key: value for key, value in asdict(result.mirrors).items() if value is not None}
+    print(f"Add the mirrors to [bold white]{config_filename}[/bold white] to build from the local mirror:\n")
+    print(yaml.safe_dump({"mirrors": mirrors}, sort_keys=False))
+    print("apt and conda packages (and python) are not mirrored: set the `apt` / `conda` mirrors to build offline.")
+
+
+@app.command()
+def affected(
+    files: List[str] = typer.Argument(None, help="Changed files (relative to the build context).", show_default=False),
+    config_filename: str = typer.Option(
+        AGIPACK_BASENAME, "--config", "-c", help="Path to the YAML configuration file."
+    ),
+    since: str = typer.Option(
+        None,
+        "--since",
+        help="Git revision to compute the changed files against (e.g. origin/main).",
+        show_default=False,
+    ),
+    as_json: bool = typer.Option(
+        False, "--json", help="Print the affected targets as a JSON list.", show_default=False
+    ),
+    locked: bool = typer.Option(
+        False, "--locked", help="Images are installed from the lockfiles (see `agi-pack lock`).", show_default=False
+    ),
+):
+    r"""Print the targets (and their descendants) affected by the changed files.
+
+    Usage:\n
+        agi-pack affected -c agibuild.yaml requirements/requirements.txt\n
+        agi-pack affected -c agibuild.yaml --since origin/main\n
+        git diff --name-only origin/main | xargs agi-pack affected -c agibuild.yaml\n
+    """
+    import json
+
+    from agipack.affected import affected_targets
+
+    if not files and since is None:
+        print("[bold red]✗[/bold red] Either the changed files or `--since` must be specified.")
+        raise typer.Exit(code=1)
+    try:
+        targets = affected_targets(config_filename, changed_files=files or None, since=since, locked=locked)
+    except ValueError as e:
+        print(f"[bold red]✗[/bold red] {e}")
+        raise typer.Exit(code=1)
+    if as_json:
+        typer.echo(json.dumps(targets))
+    else:
+        for target in targets:
+            typer.echo(target)
+
+
+@app.command()
+def push(
+    tags: List[str] = typer.Argument(..., help="Image tags to push.", show_default=False),
+    jobs: int = typer.Option(4, "--jobs", "-j", help="Number of concurrent pushes.", show_default=True),
+    retries: int = typer.Option(3, "--retries", help="Number of retries for transient failures.", show_default=True),
+    backend: str = typer.Option(
+        AGIPACK_DOCKER_BACKEND, "--backend", help="Docker backend (`cli` or the Engine `api`).", show_default=True
+    ),
+):
+    """Push image tags concurrently to their container repositories.
+
+    Usage:\n
+        agi-pack push my-image:base-cpu my-image:dev-cpu\n
+        agi-pack push my-image:base-cpu registry.example.com/my-image:base-cpu --jobs 8\n
+    """
+    from agipack.docker import get_backend
+    from agipack.pusher import AGIPackPusher
+
+    results = AGIPackPusher(jobs=jobs, retries=retries, backend=get_backend(backend)).push(tags)
+    _print_push_summary(results)
+    if not all(result.ok() for result in results.values()):
+        raise typer.Exit(code=1)
+
+
 @app.command()
 def build(
     config_filename: str = typer.Option(
@@ -143,6 +787,12 @@ def build(
     filename: str = typer.Option(
         "Dockerfile", "--output-filename", "-o", help="Output filename for the generated Dockerfile."
     ),
+    output_dir: str = typer.Option(
+        None,
+        "--output-dir",
+        help="Output directory for per-target Dockerfiles (overrides --output-filename).",
+        show_default=False,
+    ),
     python: str = typer.Option(
         None, "--python", "-p", help="Python version to use for the base image.", show_default=False
     ),
@@ -152,11 +802,77 @@ def build(
     tag: str = typer.Option("{name}:{target}", "--tag", "-t", help="Image tag f-string.", show_default=True),
     target: str = typer.Option(None, "--target", help="Build specific target.", show_default=False),
     prod: bool = typer.Option(False, "--prod", help="Generate a production Dockerfile.", show_default=False),
+    slim: bool = typer.Option(
+        False,
+        "--slim",
+        help="Copy the environment into a slim runtime stage (implies --prod).",
+        show_default=False,
+    ),
+    incremental: bool = typer.Option(
+        False, "--incremental", help="Only re-render the Dockerfile stages that changed.", show_default=False
+    ),
+    locked: bool = typer.Option(
+        False, "--locked", help="Install packages from the lockfiles (see `agi-pack lock`).", show_default=False
+    ),
+    minimal_context: bool = typer.Option(
+        False,
+        "--minimal-context",
+        help="Restrict the build context to the referenced files (with a .dockerignore).",
+        show_default=False,
+    ),
+    staged_context: bool = typer.Option(
+        False,
+        "--staged-context",
+        help="Build from a staged (hard-linked) context with only the referenced files.",
+        show_default=False,
+    ),
     lint: bool = typer.Option(False, "--lint", help="Lint the generated Dockerfile.", show_default=False),
     skip_base_builds: bool = typer.Option(
         False, "--skip-base", help="Skip building the base image.", show_default=False
     ),
     push: bool = typer.Option(False, "--push", help="Push image to container repository.", show_default=False),
+    push_retries: int = typer.Option(
+        3, "--push-retries", help="Number of retries for transient push failures.", show_default=True
+    ),
+    push_jobs: int = typer.Option(4, "--push-jobs", help="Number of concurrent pushes.", show_default=True),
+    jobs: int = typer.Option(1, "--jobs", "-j", help="Number of concurrent image builds.", show_default=True),
+    keep_going: bool = typer.Option(
+        False, "--keep-going", help="Keep building independent targets after a failure.", show_default=False
+    ),
+    manifest_filename: str = typer.Option(
+        AGIPACK_MANIFEST_FILENAME, "--manifest", help="Path to the build manifest used to skip unchanged targets."
+    ),
+    force: bool = typer.Option(False, "--force", help="Rebuild all targets, even if unchanged.", show_default=False),
+    report_dir: str = typer.Option(
+        None, "--report", help="Output directory for per-target build timing reports.", show_default=False
+    ),
+    backend: str = typer.Option(
+        AGIPACK_DOCKER_BACKEND, "--backend", help="Docker backend (`cli` or the Engine `api`).", show_default=True
+    ),
+    cache: str = typer.Option(
+        None,
+        "--cache",
+        help="BuildKit cache (e.g. `type=registry,ref=ghcr.io/org/cache` or `type=local,ref=.buildcache`).",
+        show_default=False,
+    ),
+    cache_export: bool = typer.Option(
+        True, "--cache-export/--no-cache-export", help="Export the build cache after building.", show_default=True
+    ),
+    config_cache: bool = typer.Option(
+        True,
+        "--config-cache/--no-config-cache",
+        help="Re-use the validated config from the config cache if unchanged.",
+        show_default=True,
+    ),
+    mirrors: str = typer.Option(
+        None,
+        "--mirrors",
+        help="Package mirrors (e.g. `apt=http://apt-cacher:3142,wheels=.agipack/mirror/wheels,offline=true`).",
+        show_default=False,
+    ),
+    progress: str = typer.Option(
+        "auto", "--progress", help="Build progress (`live`, `plain` or `auto`, i.e. live on a terminal)."
+    ),
 ):
     """Generate the Dockerfile with optional overrides.
 
@@ -168,20 +884,49 @@ def build(
         agi-pack build -c agibuild.yaml -t "my-image-name:{target}"\n
         agi-pack build -c agibuild.yaml -t "my-image-name:my-target"\n
         agi-pack build -c agibuild.yaml --prod --lint\n
-        agi-pack build -c agibuild.yaml --push\n
+        agi-pack build -c agibuild.yaml --slim\n
+        agi-pack build -c agibuild.yaml --push --push-jobs 8\n
+        agi-pack build -c agibuild.yaml --jobs 4 --keep-going\n
+        agi-pack build -c agibuild.yaml --force\n
+        agi-pack build -c agibuild.yaml --report reports/\n
+        agi-pack build -c agibuild.yaml --staged-context\n
+        agi-pack build -c agibuild.yaml --backend api\n
+        agi-pack build -c agibuild.yaml --cache type=local,ref=.buildcache\n
+        agi-pack build -c agibuild.yaml --mirrors wheels=.agipack/mirror/wheels,offline=true\n
     """
     generate(
         config_filename,
         filename,
+        output_dir=output_dir,
         python=python,
         base_image=base_image,
         tag=tag,
         target=target,
         prod=prod,
+        slim=slim,
+        incremental=incremental,
+        locked=locked,
+        minimal_context=minimal_context,
+        staged_context=staged_context,
         lint=lint,
         build=True,
         skip_base_builds=skip_base_builds,
         push=push,
+        push_retries=push_retries,
+        push_jobs=push_jobs,
+        jobs=jobs,
+        keep_going=keep_going,
+        manifest_filename=manifest_filename,
+        force=force,
+        report_dir=report_dir,
+        backend=backend,
+        cache=cache,
+        cache_export=cache_export,
+        config_cache=config_cache,
+        mirrors=mirrors,
+        progress=progress,
+        watch=False,
+        rebuild=False,
     )
 
 
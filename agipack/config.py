@@ -1,15 +1,37 @@
+import hashlib
+import itertools
+import json
 import logging
-from dataclasses import asdict, field
+import os
+import re
+import sys
+import tempfile
+from dataclasses import asdict, field, replace
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import yaml
 from pydantic import ConfigDict, field_validator
 from pydantic.dataclasses import dataclass
 
+from agipack.constants import AGIPACK_CONFIG_CACHE_DIR
+from agipack.layers import LAYERING_STRATEGIES, split_layers
+from agipack.version import __version__
+
 logger = logging.getLogger(__name__)
 
 
+def _construct(cls, values: Dict[str, Any]) -> Any:
+    """Instantiate a dataclass from already validated field values (skipping validation and `__post_init__`)."""
+    instance = cls.__new__(cls)
+    instance.__dict__.update(values)
+    return instance
+
+
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+"""YAML loader for the configuration (the libyaml-based loader if PyYAML was built with it)."""
+
+
 @dataclass
 class _ImageNode:
     """Node in the dependency graph."""
@@ -45,8 +67,13 @@ class ImageConfig:
                 - <package>
             pip:
                 - <package>
+            layering: <single|heavy|groups>
+            layer_groups:
+                <group>:
+                    - <package>
             add:
                 - <file>
+            runtime: <runtime base image>
 
     """
 
@@ -84,12 +111,21 @@ class ImageConfig:
     requirements: Optional[List[str]] = field(default_factory=list)
     """List of Python requirements files to install (via `pip install -r`)."""
 
+    layering: Optional[str] = field(default="single")
+    """Strategy for splitting `conda` / `pip` packages into layers (one of `single`, `heavy` or `groups`)."""
+
+    layer_groups: Optional[Dict[str, List[str]]] = field(default_factory=dict)
+    """Explicit groups of package names installed in their own layers (for the `groups` layering strategy)."""
+
     add: Optional[List[str]] = field(default_factory=list)
     """List of files to add into the image (`./entrypoint.sh:/app/entrytpoint.sh`)."""
 
     workdir: Optional[str] = field(default=None)
     """Working directory for the image (defaults to /app/${AGIPACK_ENV} if not set)."""
 
+    runtime: Optional[str] = field(default=None)
+    """Base image of the slim runtime stage for production builds (defaults to the base image of the root target)."""
+
     run: Optional[List[str]] = field(default_factory=list)
     """List of commands to run in the image under the workdir."""
 
@@ -105,14 +141,26 @@ class ImageConfig:
         if self.image is None:
             self.image = f"{self.name}:{self.target}"
 
+    def conda_layers(self) -> List[List[str]]:
+        """Conda packages split into layers according to the layering strategy."""
+        return split_layers(self.conda, self.layering, self.layer_groups)
+
+    def pip_layers(self) -> List[List[str]]:
+        """Pip packages split into layers according to the layering strategy."""
+        return split_layers(self.pip, self.layering, self.layer_groups)
+
     def additional_kwargs(self):
         """Additional kwargs to pass to the Jinja2 Dockerfile template."""
         python_alias = f"py{''.join(self.python.split('.')[:2])}"
-        return {"python_alias": python_alias}
+        return {"python_alias": python_alias, "conda_layers": self.conda_layers(), "pip_layers": self.pip_layers()}
 
     def dict(self):
-        """Dictionary representation of the ImageConfig."""
-        return {**asdict(self), **self.additional_kwargs()}
+        """Dictionary representation of the ImageConfig.
+
+        The fields are not copied (unlike `asdict`), so the dictionary must not be mutated in place.
+        """
+        values = {name: getattr(self, name) for name in self.__dataclass_fields__}
+        return {**values, **self.additional_kwargs()}
 
     def __repr__(self):
         """String representation of the ImageConfig."""
@@ -131,6 +179,13 @@ class ImageConfig:
             raise ValueError(f"Python version must be >= 3.6 (found {python})")
         return python
 
+    @field_validator("layering", mode="before")
+    def validate_layering(cls, layering) -> str:
+        """Validate the layering strategy."""
+        if layering not in LAYERING_STRATEGIES:
+            raise ValueError(f"`layering` must be one of {LAYERING_STRATEGIES} (found {layering})")
+        return layering
+
     @field_validator("add", mode="before")
     def validate_add(cls, items) -> Tuple[str, str]:
         """Validate the add command."""
@@ -164,6 +219,283 @@ class ImageConfig:
         return env
 
 
+CACHE_TYPES = ("registry", "local", "inline")
+"""Supported BuildKit cache backends."""
+
+
+@dataclass(config=ConfigDict(extra="forbid"))
+class CacheConfig:
+    """BuildKit cache import / export configuration specified in `agibuild.yaml`
+
+    cache:
+        type: <registry|local|inline>
+        ref: <cache repository (registry) or directory (local)>
+        mode: <min|max>
+        export: <true|false>
+
+    Each target imports the caches of its own ref and of its ancestors' refs, and exports
+    its cache to its own ref (`<ref>:<target>` for `registry`, `<ref>/<target>` for `local`).
+    """
+
+    type: str = field(default="registry")
+    """Cache backend (one of `registry`, `local` or `inline`)."""
+
+    ref: Optional[str] = field(default=None)
+    """Cache repository (e.g. `ghcr.io/org/agi-cache`) for `registry` caches, or cache directory
+    for `local` caches. Unused for `inline` caches, which are embedded in the image tags themselves.
+    """
+
+    mode: str = field(default="max")
+    """Cache export mode: `min` only exports the layers of the final stage, `max` the layers of all the stages
+    (ignored for `inline` caches).
+    """
+
+    export: bool = field(default=True)
+    """Export the cache after building (disable for read-only caches, e.g. on pull requests)."""
+
+    def __post_init__(self):
+        if self.type in ("registry", "local") and not self.ref:
+            raise ValueError(f"`ref` must be specified for `{self.type}` caches")
+
+    @field_validator("type", mode="before")
+    def validate_type(cls, type) -> str:
+        """Validate the cache backend."""
+        if type not in CACHE_TYPES:
+            raise ValueError(f"Cache `type` must be one of {CACHE_TYPES} (found {type})")
+        return type
+
+    @field_validator("mode", mode="before")
+    def validate_mode(cls, mode) -> str:
+        """Validate the cache export mode."""
+        if mode not in ("min", "max"):
+            raise ValueError(f"Cache `mode` must be one of ('min', 'max') (found {mode})")
+        return mode
+
+    @classmethod
+    def parse(cls, spec: str) -> "CacheConfig":
+        """Parse a cache configuration from a `key=value` list (e.g. `type=local,ref=.buildcache,mode=min`)."""
+        try:
+            options = dict(option.split("=", 1) for option in spec.split(",") if option)
+        except ValueError:
+            raise ValueError(f"Cache must be a comma-separated list of `key=value` options (found {spec})")
+        if "export" in options:
+            options["export"] = options["export"].lower() in ("1", "true", "yes")
+        return cls(**options)
+
+    def target_ref(self, target: str) -> Optional[str]:
+        """Return the cache ref of the target (or None for `inline` caches)."""
+        if self.type == "registry":
+            return f"{self.ref}:{target}"
+        if self.type == "local":
+            return str(Path(self.ref) / target)
+        return None
+
+    def context_excludes(self) -> List[str]:
+        """Return the local cache directory (relative to the build context) if it is inside the build context,
+        for it to be excluded from the context (and from the images, e.g. with `add: .:/app`).
+        """
+        if self.type != "local":
+            return []
+        ref, cwd = Path(os.path.abspath(self.ref)), Path(os.path.abspath("."))
+        return [ref.relative_to(cwd).as_posix()] if cwd in ref.parents else []
+
+    def cache_from(self, lineage: Dict[str, List[str]]) -> List[str]:
+        """Return the `--cache-from` options to build a target.
+
+        Args:
+            lineage (Dict[str, List[str]]): Image tags of the target and of its ancestors (target first).
+        Returns:
+            List[str]: Cache sources (local caches that were not exported yet are skipped).
+        """
+        if self.type == "registry":
+            return [f"type=registry,ref={self.target_ref(target)}" for target in lineage]
+        if self.type == "local":
+            refs = [self.target_ref(target) for target in lineage]
+            return [f"type=local,src={ref}" for ref in refs if Path(ref).is_dir()]
+        return [f"type=registry,ref={tag}" for tags in lineage.values() for tag in tags]
+
+    def cache_to(self, target: str) -> List[str]:
+        """Return the `--cache-to` options to build the target."""
+        if not self.export:
+            return []
+        if self.type == "registry":
+            return [f"type=registry,ref={self.target_ref(target)},mode={self.mode}"]
+        if self.type == "local":
+            return [f"type=local,dest={self.target_ref(target)},mode={self.mode}"]
+        return ["type=inline"]
+
+
+BOOTSTRAP_INSTALLERS = ("miniconda", "micromamba")
+"""Supported conda installers for the base images."""
+
+BOOTSTRAP_ARCHS = ("x86_64", "aarch64")
+"""Supported image architectures (i.e. `uname -m`)."""
+
+
+@dataclass(config=ConfigDict(extra="forbid"))
+class BootstrapConfig:
+    """Conda installation of the base images specified in `agibuild.yaml`
+
+    bootstrap:
+        installer: <miniconda|micromamba>
+        version: <installer version, e.g. py311_24.1.2-0 (miniconda) or 1.5.8-0 (micromamba)>
+        sha256:
+            x86_64: <sha256 checksum of the installer>
+            aarch64: <sha256 checksum of the installer>
+
+    The installer is downloaded once into a build cache mount, and verified against its checksum
+    (if pinned) before every install. `micromamba` creates the environment with a single static binary,
+    instead of installing Miniconda (and mamba) into the image.
+    """
+
+    installer: str = field(default="miniconda")
+    """Conda installer (one of `miniconda` or `micromamba`)."""
+
+    version: str = field(default="latest")
+    """Installer version (`latest` is a floating release, pin a version along with its checksums)."""
+
+    sha256: Dict[str, str] = field(default_factory=dict)
+    """SHA-256 checksums of the installer for each architecture (see the installer's release page)."""
+
+    @field_validator("installer", mode="before")
+    def validate_installer(cls, installer) -> str:
+        """Validate the conda installer."""
+        if installer not in BOOTSTRAP_INSTALLERS:
+            raise ValueError(f"Bootstrap `installer` must be one of {BOOTSTRAP_INSTALLERS} (found {installer})")
+        return installer
+
+    @field_validator("sha256", mode="before")
+    def validate_sha256(cls, sha256) -> Dict[str, str]:
+        """Validate the installer checksums."""
+        for arch, digest in sha256.items():
+            if arch not in BOOTSTRAP_ARCHS:
+                raise ValueError(f"Bootstrap `sha256` architectures must be in {BOOTSTRAP_ARCHS} (found {arch})")
+            if not re.fullmatch(r"[0-9a-f]{64}", str(digest)):
+                raise ValueError(f"Bootstrap `sha256` for {arch} must be a SHA-256 hex digest (found {digest})")
+        return sha256
+
+    def is_pinned(self) -> bool:
+        """Check if the installer is pinned to a version, and verified against its checksum."""
+        return self.version != "latest" and bool(self.sha256)
+
+    def url(self, arch: str) -> str:
+        """Return the download URL of the installer for the architecture."""
+        if self.installer == "micromamba":
+            platform = "64" if arch == "x86_64" else arch
+            release = "latest/download" if self.version == "latest" else f"download/{self.version}"
+            return f"https://github.com/mamba-org/micromamba-releases/releases/{release}/micromamba-linux-{platform}"
+        return f"https://repo.anaconda.com/miniconda/Miniconda3-{self.version}-Linux-{arch}.sh"
+
+    def filename(self, arch: str) -> str:
+        """Return the (versioned) filename of the installer for the architecture."""
+        if self.installer == "micromamba":
+            return f"micromamba-{self.version}-linux-{arch}"
+        return f"Miniconda3-{self.version}-Linux-{arch}.sh"
+
+
+MIRROR_MOUNT_DIR = "/tmp/mirror"
+"""Directory where the local mirror files are bind-mounted during the build."""
+
+
+@dataclass(config=ConfigDict(extra="forbid"))
+class MirrorConfig:
+    """Package mirrors (or proxy caches) specified in `agibuild.yaml`
+
+    mirrors:
+        apt: <apt proxy URL, e.g. http://apt-cacher:3142>
+        pip: <pip index URL, e.g. http://devpi:3141/root/pypi/+simple>
+        wheels: <wheels directory (in the build context) or URL>
+        conda: <conda channel URL>
+        installer: <conda installer (in the build context) or URL>
+        offline: <true|false>
+
+    Local `wheels` / `installer` paths (e.g. prefetched with `agi-pack mirror`) are bind-mounted
+    into the build instead of being copied into the image.
+    """
+
+    apt: Optional[str] = field(default=None)
+    """Proxy (e.g. apt-cacher-ng) for the apt package downloads."""
+
+    pip: Optional[str] = field(default=None)
+    """Base URL of the Python package index (replaces PyPI)."""
+
+    wheels: Optional[str] = field(default=None)
+    """Directory of wheels (relative to the build context), or URL of a wheels page, to look for pip packages in."""
+
+    conda: Optional[str] = field(default=None)
+    """Conda channel URL (replaces the `conda-forge` / `defaults` channels)."""
+
+    installer: Optional[str] = field(default=None)
+    """Conda installer (relative to the build context) or URL, i.e. the Miniconda installer or the micromamba
+    binary (see `BootstrapConfig`). Replaces the installer download, but is still verified against its checksum.
+    """
+
+    offline: bool = field(default=False)
+    """Only install pip packages from `wheels` (without any package index). apt and conda packages are still
+    installed from the `apt` / `conda` mirrors (or the network), so these are needed as well to build offline.
+    """
+
+    def __post_init__(self):
+        for key in ["apt", "pip", "conda"]:
+            value = getattr(self, key)
+            if value is not None and not self.is_url(value):
+                raise ValueError(f"Mirror `{key}` must be a URL (found {value})")
+        if self.offline and not self.wheels:
+            raise ValueError("Mirror `wheels` must be specified for `offline` builds")
+
+    @classmethod
+    def parse(cls, spec: str) -> "MirrorConfig":
+        """Parse a mirror configuration from a `key=value` list (e.g. `apt=http://apt-cacher:3142,offline=true`)."""
+        try:
+            options = dict(option.split("=", 1) for option in spec.split(",") if option)
+        except ValueError:
+            raise ValueError(f"Mirrors must be a comma-separated list of `key=value` options (found {spec})")
+        if "offline" in options:
+            options["offline"] = options["offline"].lower() in ("1", "true", "yes")
+        return cls(**options)
+
+    @staticmethod
+    def is_url(value: str) -> bool:
+        """Check if the mirror is a URL (or else a path in the build context)."""
+        return "://" in value
+
+    def local_paths(self) -> List[str]:
+        """Return the local mirror paths, that need to be in the build context."""
+        return [value for value in [self.wheels, self.installer] if value and not self.is_url(value)]
+
+    def apt_options(self) -> str:
+        """Return the `apt-get` options (with a leading space, if any)."""
+        return f" -o Acquire::http::Proxy={self.apt}" if self.apt else ""
+
+    def pip_options(self) -> str:
+        """Return the `pip install` options (with a leading space, if any)."""
+        options = []
+        if self.pip:
+            options.append(f"--index-url {self.pip}")
+        if self.wheels:
+            wheels = self.wheels if self.is_url(self.wheels) else f"{MIRROR_MOUNT_DIR}/wheels"
+            options.append(f"--find-links {wheels}")
+        if self.offline:
+            options.append("--no-index")
+        return "".join(f" {option}" for option in options)
+
+    def conda_options(self) -> str:
+        """Return the `conda` / `mamba` install options (with a leading space, if any)."""
+        return f" --override-channels -c {self.conda}" if self.conda else ""
+
+    def wheels_mount(self) -> Optional[str]:
+        """Return the `RUN` bind mount of the local wheels directory (if any)."""
+        if not self.wheels or self.is_url(self.wheels):
+            return None
+        return f"--mount=type=bind,source={self.wheels},target={MIRROR_MOUNT_DIR}/wheels"
+
+    def installer_mount(self) -> Optional[str]:
+        """Return the `RUN` bind mount of the local conda installer (if any)."""
+        if not self.installer or self.is_url(self.installer):
+            return None
+        return f"--mount=type=bind,source={self.installer},target={MIRROR_MOUNT_DIR}/installer"
+
+
 @dataclass
 class AGIPackConfig:
     """AGIPack configuration specified in `agibuild.yaml`
@@ -180,26 +512,88 @@ class AGIPackConfig:
 
         base-prod:
             ...
+
+    matrix:
+        base-cpu:
+            python: ["3.8.10", "3.10"]
+            base:
+                cpu: debian:buster-slim
+                cu118: nvidia/cuda:11.8.0-base-ubuntu22.04
+
+    cache:
+        type: registry
+        ref: ghcr.io/org/agi-cache
+
+    mirrors:
+        apt: http://apt-cacher:3142
+        wheels: .agipack/mirror/wheels
+
+    bootstrap:
+        installer: micromamba
+        version: 1.5.8-0
     """
 
     images: Dict[str, ImageConfig]
     """Dictionary of targets to build and their configurations."""
 
+    matrix: Dict[str, Dict[str, Union[List[Any], Dict[str, Any]]]] = field(default_factory=dict)
+    """Build matrix that expands a target (and its descendants) over axes of ImageConfig fields.
+    Each axis is either a list of values, or a dictionary of variant names (suffixes) and values.
+    """
+
+    cache: Optional[CacheConfig] = field(default=None)
+    """BuildKit cache import / export configuration (no remote cache if not specified)."""
+
+    mirrors: Optional[MirrorConfig] = field(default=None)
+    """Package mirrors / proxy caches used by the builds (the public package repositories if not specified)."""
+
+    bootstrap: Optional[BootstrapConfig] = field(default=None)
+    """Conda installation of the base images (the latest Miniconda release if not specified)."""
+
     def __post_init__(self):
         """Post-initialization hook."""
         self._target_tree: Dict[str, _ImageNode] = {}
+        self._source_images: Dict[str, ImageConfig] = dict(self.images)
+        self._origins: Dict[str, str] = {name: name for name in self.images}
+        if self.matrix:
+            self._expand_matrix()
         self._build_target_tree()
 
     def root(self) -> str:
-        """Return the root target."""
+        """Return the root target (or the first root target for expanded build matrices)."""
+        return self.roots()[0]
+
+    def roots(self) -> List[str]:
+        """Return all the root targets."""
         targets = [target for target, node in self._target_tree.items() if node.root]
-        assert len(targets) == 1
-        return targets[0]
+        assert len(targets) >= 1
+        return targets
 
     def children(self, target: str) -> List[str]:
         """Return the list of children for the given target."""
         return self._target_tree[target].children
 
+    def descendants(self, target: str) -> List[str]:
+        """Return all the (transitive) descendants of the given target (breadth-first)."""
+        descendants, pending = [], list(self.children(target))
+        while pending:
+            child = pending.pop(0)
+            descendants.append(child)
+            pending.extend(self.children(child))
+        return descendants
+
+    def ancestors(self, target: str) -> List[str]:
+        """Return all the ancestors of the given target (closest first)."""
+        ancestors = []
+        while self.images[target].base in self.images:
+            target = self.images[target].base
+            ancestors.append(target)
+        return ancestors
+
+    def origin(self, target: str) -> str:
+        """Return the target that the given target was expanded from by the build matrix (or the target itself)."""
+        return self._origins[target]
+
     def is_root(self, target: str) -> bool:
         """Check if the given target is a base image."""
         return self._target_tree[target].root
@@ -210,23 +604,24 @@ class AGIPackConfig:
 
     @field_validator("images")
     def validate_python_dependencies_for_nonbase_images(cls, images):
-        """Validate that all images have the same python dependency as the base image."""
-        py_version = None
+        """Validate that all images have the same python dependency as their base image."""
         for target, config in images.items():
-            if config.is_base_image():
-                py_version = config.python
-            else:
-                if config.python != py_version:
-                    logger.debug(f"Ignoring python version for non-base image [{target}]")
-                    config.python = py_version
+            parent = images.get(config.base)
+            if config.is_base_image() or parent is None:
+                continue
+            if config.python != parent.python:
+                logger.debug(f"Ignoring python version for non-base image [{target}]")
+                config.python = parent.python
         return images
 
     @classmethod
-    def load_yaml(cls, filename: Union[str, Path]) -> "AGIPackConfig":
+    def load_yaml(cls, filename: Union[str, Path], cache: bool = False) -> "AGIPackConfig":
         """Load the AGIPack configuration from a YAML file.
 
         Args:
             filename (str): Path to the YAML file.
+            cache (bool): Re-use the validated configuration from the persistent config cache
+                if the YAML file is unchanged (see `ConfigCache`), and store it otherwise.
         Returns:
             AGIPackConfig: AGIPack configuration.
         """
@@ -236,11 +631,17 @@ class AGIPackConfig:
             raise ValueError(f"YAML file {path.name} does not exist")
         if not (path.name.endswith(".yaml") or path.name.endswith(".yml")):
             raise ValueError(f"YAML file {path.name} must have a .yaml or .yml extension")
+        content = path.read_bytes()
+
+        # Re-use the cached configuration (skipping parsing and validation)
+        config_cache = ConfigCache() if cache else None
+        if config_cache is not None:
+            config = config_cache.get(path, content)
+            if config is not None:
+                return config
 
-        # Load the YAML file
-        with path.open("r") as f:
-            data = yaml.safe_load(f)
-        logger.debug(f"AGIPack configuration: {data}")
+        # Load the YAML file (with the libyaml parser, if available)
+        data = yaml.load(content, Loader=YAML_LOADER)
 
         # Validate the YAML file
         images = data.get("images", {})
@@ -249,12 +650,15 @@ class AGIPackConfig:
 
         # Load default image target if not specified
         for target, config in data["images"].items():
-            logger.debug(f"Processing target [{target}]")
             if "image" not in config:
                 config["image"] = target
-            data["images"][target] = ImageConfig(**config)
-        logger.debug(f"AGIPack configuration: {data}")
-        return cls(**data)
+
+        # Validate the raw images (and cache) once, when constructing the configuration
+        config = cls(**data)
+        logger.debug(f"Loaded AGIPack configuration [filename={path}, targets={len(config.images)}]")
+        if config_cache is not None:
+            config_cache.put(path, content, config)
+        return config
 
     def save_yaml(self, filename: str) -> None:
         """Save the AGIPack configuration to a YAML file.
@@ -264,24 +668,150 @@ class AGIPackConfig:
         """
         # Pre-process the config to remove empty lists, etc.
         data = asdict(self)
+        if self.matrix:
+            # Images are saved as specified, along with the build matrix that expands them
+            data["images"] = {name: asdict(config) for name, config in self._source_images.items()}
+        else:
+            data.pop("matrix", None)
+        for key in ["cache", "mirrors", "bootstrap"]:
+            if data.get(key) is None:
+                data.pop(key, None)
         for _, config in data["images"].items():
-            for key in ["env", "system", "conda", "pip", "requirements", "add", "run", "entrypoint", "command"]:
+            for key in [
+                "env",
+                "system",
+                "conda",
+                "pip",
+                "requirements",
+                "layer_groups",
+                "add",
+                "run",
+                "entrypoint",
+                "command",
+            ]:
                 if not len(config[key]):
                     del config[key]
-            for key in ["workdir"]:
+            if config.get("layering") == "single":
+                del config["layering"]
+            for key in ["workdir", "runtime"]:
                 if config.get(key) is None:
                     del config[key]
         # Save the YAML file
         with open(filename, "w") as f:
             yaml.safe_dump(data, f, sort_keys=False)
 
+    @staticmethod
+    def _matrix_suffix(axis: str, value: str) -> str:
+        """Return the variant suffix for a matrix axis value (e.g. `py310` for python `3.10`)."""
+        if not isinstance(value, str):
+            raise ValueError(
+                f"Matrix axis `{axis}` values must be strings, use a dictionary of names and values instead"
+            )
+        if axis == "python":
+            return f"py{''.join(value.split('.')[:2])}"
+        return re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-")
+
+    def _expand_matrix(self) -> None:
+        """Expand the build matrix into variant targets.
+
+        Each matrix target is replaced by one variant per combination of its axes
+        (named `<target>-<suffix>`), and all of its descendants are cloned for each
+        variant. Ancestors of the matrix target are shared by all the variants.
+        """
+        # Original target names of the (expanded) variants
+        origins = self._origins
+        for target, axes in self.matrix.items():
+            instances = [name for name, origin in origins.items() if origin == target]
+            if not instances:
+                targets = list(dict.fromkeys(origins.values()))
+                raise ValueError(f"Matrix target `{target}` needs to be one of {targets}.")
+            if "python" in axes and not self.images[instances[0]].is_base_image():
+                raise ValueError(f"Matrix axis `python` is only supported for base targets (found `{target}`)")
+
+            # Variants for the cartesian product of all the axes
+            choices = []
+            for axis, values in axes.items():
+                if axis not in ImageConfig.__dataclass_fields__:
+                    raise ValueError(f"Matrix axis `{axis}` for target `{target}` must be an image config field")
+                if isinstance(values, dict):
+                    choices.append([(axis, suffix, value) for suffix, value in values.items()])
+                else:
+                    choices.append([(axis, self._matrix_suffix(axis, value), value) for value in values])
+
+            for instance in instances:
+                # Targets in the subtree of the instance (in dependency order)
+                subtree = [instance]
+                for name, config in self.images.items():
+                    if config.base in subtree and name not in subtree:
+                        subtree.append(name)
+
+                images: Dict[str, ImageConfig] = {}
+                for name, config in self.images.items():
+                    if name in subtree[1:]:
+                        continue
+                    if name != instance:
+                        images[name] = config
+                        continue
+                    for combination in itertools.product(*choices):
+                        suffix = "-".join(suffix for _, suffix, _ in combination)
+                        for member in subtree:
+                            member_config = self.images[member]
+                            variant = f"{member}-{suffix}"
+                            if member == instance:
+                                updates = {axis: value for axis, _, value in combination}
+                            else:
+                                base = f"{member_config.base}-{suffix}"
+                                updates = {"base": base, "python": images[base].python}
+                            if member_config.image == member:
+                                updates["image"] = variant
+                            images[variant] = replace(member_config, **updates)
+                            origins[variant] = origins[member]
+                            logger.debug(f"Expanded matrix target [{member} -> {variant}]")
+                for member in subtree:
+                    del origins[member]
+                self.images = images
+
+    def _to_cache(self) -> Dict[str, Any]:
+        """Return the validated configuration as JSON-serializable values (see `ConfigCache`)."""
+        data = {key: getattr(self, key) for key in ["matrix", "cache", "mirrors", "bootstrap"]}
+        data = {key: asdict(value) if key != "matrix" and value is not None else value for key, value in data.items()}
+        data["images"] = {name: asdict(config) for name, config in self.images.items()}
+        if self.matrix:
+            data["sources"] = {name: asdict(config) for name, config in self._source_images.items()}
+            data["origins"] = self._origins
+        return data
+
+    @classmethod
+    def _from_cache(cls, data: Dict[str, Any]) -> "AGIPackConfig":
+        """Re-build a configuration from the values of `_to_cache`, without validating them again."""
+        images = {name: _construct(ImageConfig, values) for name, values in data["images"].items()}
+        config = _construct(
+            cls,
+            {
+                "images": images,
+                "matrix": data["matrix"],
+                "cache": _construct(CacheConfig, data["cache"]) if data["cache"] is not None else None,
+                "mirrors": _construct(MirrorConfig, data["mirrors"]) if data["mirrors"] is not None else None,
+                "bootstrap": _construct(BootstrapConfig, data["bootstrap"]) if data["bootstrap"] is not None else None,
+            },
+        )
+        sources = data.get("sources")
+        if sources is not None:
+            sources = {name: _construct(ImageConfig, values) for name, values in sources.items()}
+        config._source_images = images if sources is None else sources
+        config._origins = data.get("origins") or {name: name for name in images}
+        config._target_tree = {}
+        config._build_target_tree()
+        return config
+
     def _build_target_tree(self) -> None:
         """Build the target dependency tree."""
         for idx, (target, config) in enumerate(self.images.items()):
             logger.debug(f"{target} -> {config.base}")
 
-            # Check if the first image is the base
-            if idx == 0:
+            # Check if the first image is the base (additional base images are only
+            # allowed for the variants of an expanded build matrix, as separate roots)
+            if idx == 0 or (self._origins[target] != target and config.is_base_image()):
                 if not config.is_base_image():
                     raise ValueError(f"First image [{target}] must be the base image")
                 self._target_tree[target] = _ImageNode(name=target, root=True)
@@ -293,3 +823,73 @@ class AGIPackConfig:
                 self._target_tree[target] = _ImageNode(name=target)
                 self._target_tree[config.base].children.append(target)
         logger.debug(f"Target dependencies: {self._target_tree}")
+
+
+class ConfigCache:
+    """Persistent on-disk cache of validated AGIPack configurations.
+
+    Each YAML file is cached as JSON of its validated `AGIPackConfig` values (with the
+    build matrix expanded), keyed on the hash of the YAML contents, the agipack and Python
+    versions, and re-built without validation on load. The cache lives in the user's cache
+    directory (see `AGIPACK_CONFIG_CACHE_DIR`), and never holds executable data (e.g. pickles).
+
+    Since validation only depends on the existence of the `add` paths (not their contents),
+    the entry also records the `add` paths, and is invalidated if any of them no longer exists.
+    The contents of the referenced files are deliberately not hashed (the build manifest
+    fingerprints them, see `compute_fingerprints`).
+
+    Args:
+        cache_dir (str): Directory of the cached configurations.
+    """
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None):
+        self.cache_dir = Path(cache_dir or AGIPACK_CONFIG_CACHE_DIR)
+
+    def filename(self, path: Path) -> Path:
+        """Return the cache filename for the YAML file."""
+        return self.cache_dir / f"{hashlib.sha256(str(path.resolve()).encode()).hexdigest()[:16]}.json"
+
+    @staticmethod
+    def key(content: bytes) -> str:
+        """Return the cache key for the YAML contents."""
+        digest = hashlib.sha256(f"agipack:{__version__}:python:{sys.version_info[:2]}".encode())
+        digest.update(content)
+        return digest.hexdigest()
+
+    def get(self, path: Path, content: bytes) -> Optional[AGIPackConfig]:
+        """Return the cached configuration for the YAML file (or None if missing / stale)."""
+        filename = self.filename(path)
+        try:
+            with filename.open("r") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring corrupt config cache {filename}: {e}")
+            return None
+        if not isinstance(entry, dict) or entry.get("key") != self.key(content):
+            logger.debug(f"Config cache miss [filename={path}]")
+            return None
+        if not all(Path(item).exists() for item in entry.get("paths", [])):
+            logger.debug(f"Config cache miss (missing `add` paths) [filename={path}]")
+            return None
+        try:
+            config = AGIPackConfig._from_cache(entry["config"])
+        except Exception as e:
+            logger.warning(f"Ignoring corrupt config cache {filename}: {e}")
+            return None
+        logger.debug(f"Config cache hit [filename={path}]")
+        return config
+
+    def put(self, path: Path, content: bytes, config: AGIPackConfig) -> None:
+        """Store the validated configuration for the YAML file (atomically)."""
+        paths = sorted({item.split(":")[0] for image in config.images.values() for item in image.add})
+        entry = {"key": self.key(content), "paths": paths, "config": config._to_cache()}
+        filename = self.filename(path)
+        try:
+            filename.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", dir=filename.parent, delete=False) as f:
+                json.dump(entry, f)
+            os.replace(f.name, filename)
+        except OSError as e:
+            logger.warning(f"Failed to write config cache {filename}: {e}")
@@ -5,5 +5,37 @@ AGIPACK_BASE_DIR = Path(__file__).parent
 AGIPACK_BASENAME = "agibuild.yaml"
 AGIPACK_TEMPLATE_DIR = AGIPACK_BASE_DIR / "templates"
 AGIPACK_DOCKERFILE_TEMPLATE = "Dockerfile.j2"
+AGIPACK_TEMPLATE_CACHE_DIR = os.getenv("AGIPACK_TEMPLATE_CACHE_DIR")
 AGIPACK_SAMPLE_FILENAME = AGIPACK_BASE_DIR / "templates/agibuild.sample.yaml"
+AGIPACK_MANIFEST_FILENAME = ".agipack/manifest.json"
+AGIPACK_RENDER_CACHE_FILENAME = ".agipack/render.json"
+AGIPACK_CONFIG_CACHE_DIR = os.getenv(
+    "AGIPACK_CONFIG_CACHE_DIR", str(Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "agipack/configs")
+)
+AGIPACK_LOCK_DIR = os.getenv("AGIPACK_LOCK_DIR", "agibuild.lock")
+AGIPACK_MIRROR_DIR = os.getenv("AGIPACK_MIRROR_DIR", ".agipack/mirror")
+AGIPACK_CONTEXT_PREFIX = ".agipack-context-"
+AGIPACK_DOCKER_BACKEND = os.getenv("AGIPACK_DOCKER_BACKEND", "cli")
+AGIPACK_MAX_CONCURRENT_BUILDS = int(os.getenv("AGIPACK_MAX_CONCURRENT_BUILDS", "4"))
+AGIPACK_MAX_CONCURRENT_PUSHES = int(os.getenv("AGIPACK_MAX_CONCURRENT_PUSHES", "4"))
+DOCKER_HOST = os.getenv("DOCKER_HOST", "unix:///var/run/docker.sock")
+AGIPACK_HEAVY_PACKAGE_THRESHOLD_MB = 100
+AGIPACK_HEAVY_PACKAGES = {
+    "torch": 2000,
+    "pytorch": 2000,
+    "cudatoolkit": 2000,
+    "cuda-toolkit": 2000,
+    "tensorflow": 600,
+    "tensorflow-gpu": 600,
+    "cudnn": 800,
+    "nvidia-*": 400,
+    "jaxlib": 250,
+    "triton": 250,
+    "xformers": 200,
+    "onnxruntime-gpu": 200,
+    "torchvision": 100,
+    "torchaudio": 100,
+    "opencv-python": 100,
+    "vllm": 100,
+}
 AGIPACK_ENV = os.getenv("AGIPACK_ENV", "prod")
@@ -0,0 +1,178 @@
+import logging
+import os
+import shutil
+from dataclasses import field
+from pathlib import Path, PurePosixPath
+from typing import Iterable, List, Optional, Union
+
+from pydantic.dataclasses import dataclass
+
+from agipack.config import AGIPackConfig
+from agipack.constants import AGIPACK_CONTEXT_PREFIX
+from agipack.manifest import referenced_files
+from agipack.report import format_size
+from agipack.version import __version__
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(path: Path) -> str:
+    """Normalize a build-context path for use in a `.dockerignore` pattern."""
+    posix = PurePosixPath(Path(path).as_posix())
+    if posix.is_absolute():
+        raise ValueError(f"Build context paths must be relative (found {path})")
+    parts = [part for part in posix.parts if part != "."]
+    return "/".join(parts)
+
+
+def render_dockerignore(paths: Iterable[Path], excludes: Iterable[str] = ()) -> str:
+    """Render a `.dockerignore` that excludes everything but the given paths.
+
+    Args:
+        paths (Iterable[Path]): Files / directories (relative to the build context) to include.
+        excludes (Iterable[str]): Files / directories to exclude, even if inside the included paths.
+    Returns:
+        str: Contents of the `.dockerignore` file.
+    """
+    includes: List[str] = sorted({_normalize(path) for path in paths})
+    lines = [f"# Auto-generated by agi-pack (version={__version__}).", "*"]
+    lines.extend(f"!{path}" for path in includes if path)
+    lines.extend(_normalize(Path(path)) for path in excludes)
+    return "\n".join(lines) + "\n"
+
+
+def missing_excludes(excludes: Iterable[str], filename: Union[str, Path] = ".dockerignore") -> List[str]:
+    """Return the files / directories that are not excluded by the `.dockerignore` of the build context.
+
+    The `.dockerignore` belongs to the project, so it is only checked (not updated).
+
+    Args:
+        excludes (Iterable[str]): Files / directories (relative to the build context) that should be excluded.
+        filename (Union[str, Path]): Path to the `.dockerignore` file.
+    Returns:
+        List[str]: Patterns missing from the `.dockerignore` file.
+    """
+    path = Path(filename)
+    lines = [line.strip().rstrip("/") for line in path.read_text().splitlines()] if path.exists() else []
+    return [pattern for pattern in map(_normalize, map(Path, excludes)) if pattern not in lines]
+
+
+def context_paths(config: AGIPackConfig, target: str, ancestors: bool = True, locked: bool = False) -> List[Path]:
+    """Return the files (or directories) that the target needs in its build context.
+
+    Building a target from a multi-stage Dockerfile also builds the stages of its
+    ancestors, so their `requirements`, `add` (and lockfile) paths are included as well.
+    The local package mirrors (bind-mounted by the build) are always included.
+
+    Args:
+        config (AGIPackConfig): AGIPack configuration.
+        target (str): Target image name.
+        ancestors (bool): Include the paths of the target's ancestors (i.e. for a multi-stage Dockerfile).
+        locked (bool): Include the lockfiles (i.e. for images installed from the lockfiles).
+    Returns:
+        List[Path]: De-duplicated paths (relative to the build context), ancestors first.
+    """
+    targets = [target]
+    while ancestors and config.images[targets[0]].base in config.images:
+        targets.insert(0, config.images[targets[0]].base)
+    paths = [path for t in targets for path in referenced_files(config, t, locked=locked)]
+    if config.mirrors is not None:
+        paths.extend(Path(path) for path in config.mirrors.local_paths())
+    return list(dict.fromkeys(Path(_normalize(path)) for path in paths))
+
+
+def _walk(paths: Iterable[Path], prune: Iterable[Union[str, Path]] = ()) -> Iterable[Path]:
+    """Yield all the files in the paths (recursively for directories, without following symlinks).
+
+    Staged build contexts (see `stage_context`) and the `prune` directories are not walked into,
+    so that staging a directory does not copy the context being staged into itself.
+    """
+    pruned = {os.path.abspath(path) for path in prune}
+    for path in paths:
+        if path.is_symlink() or path.is_file():
+            yield path
+            continue
+        for root, dirs, filenames in os.walk(path):
+            dirs[:] = [
+                name
+                for name in dirs
+                if not name.startswith(AGIPACK_CONTEXT_PREFIX)
+                and os.path.abspath(os.path.join(root, name)) not in pruned
+            ]
+            for filename in filenames:
+                yield Path(root) / filename
+
+
+@dataclass
+class ContextSize:
+    """Number of files and total size of a build context."""
+
+    files: int = field(default=0)
+    """Number of files in the build context."""
+
+    size: int = field(default=0)
+    """Total size (in bytes) of the files in the build context."""
+
+    def human(self) -> str:
+        """Human-readable size of the build context (e.g. `1.2 GB (1204 files)`)."""
+        return f"{format_size(self.size)} ({self.files} files)"
+
+
+def context_size(paths: Optional[Iterable[Union[str, Path]]] = None, root: Union[str, Path] = ".") -> ContextSize:
+    """Measure the build context, either the whole `root` directory or just the given paths.
+
+    Args:
+        paths (Iterable[Union[str, Path]]): Files / directories (relative to `root`) in the context (defaults to all).
+        root (Union[str, Path]): Root directory of the build context.
+    Returns:
+        ContextSize: Number of files and total size of the build context.
+    """
+    root = Path(root)
+    paths = [root] if paths is None else [root / path for path in paths]
+    result = ContextSize()
+    for path in _walk(p for p in paths if p.exists() or p.is_symlink()):
+        result.files += 1
+        result.size += path.lstat().st_size
+    return result
+
+
+def stage_context(
+    paths: Iterable[Union[str, Path]], context_dir: Union[str, Path], excludes: Iterable[str] = ()
+) -> ContextSize:
+    """Stage a minimal build context with only the given paths, hard-linking the files where possible.
+
+    Hard-links make staging cheap (no data is copied), but require the context directory to be on
+    the same filesystem as the source files; files are copied otherwise.
+
+    Args:
+        paths (Iterable[Union[str, Path]]): Files / directories (relative to the current directory) to stage.
+        context_dir (Union[str, Path]): Directory to stage the build context in.
+        excludes (Iterable[str]): Files / directories to leave out, even if inside the given paths.
+    Returns:
+        ContextSize: Number of files and total size of the staged context.
+    """
+    paths = [Path(_normalize(Path(path))) for path in paths]
+    excluded = [Path(_normalize(Path(path))) for path in excludes]
+    missing = [str(path) for path in paths if not path.exists()]
+    if missing:
+        raise ValueError(f"Build context paths not found: {missing}")
+
+    result = ContextSize()
+    for src in _walk(paths, prune=[context_dir]):
+        if any(src == path or path in src.parents for path in excluded):
+            continue
+        dst = Path(context_dir) / src
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        if dst.exists() or dst.is_symlink():
+            continue
+        if src.is_symlink():
+            os.symlink(os.readlink(src), dst)
+        else:
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copy2(src, dst)
+        result.files += 1
+        result.size += src.lstat().st_size
+    logger.debug(f"Staged build context [context_dir={context_dir}, size={result.human()}]")
+    return result
@@ -0,0 +1,785 @@
+import asyncio
+import base64
+import fnmatch
+import http.client
+import json
+import logging
+import os
+import socket
+import subprocess
+import tarfile
+import tempfile
+import threading
+from collections import deque
+from pathlib import Path
+from typing import IO, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import quote, urlencode, urlparse
+
+from agipack.aio import iterate_in_thread, run_in_thread
+from agipack.constants import AGIPACK_DOCKER_BACKEND, DOCKER_HOST
+
+logger = logging.getLogger(__name__)
+
+Runner = Callable[[List[str]], subprocess.CompletedProcess]
+
+HADOLINT_IMAGE = "hadolint/hadolint:latest"
+"""Image used to lint the generated Dockerfiles."""
+
+
+def run_command(cmd: List[str]) -> subprocess.CompletedProcess:
+    """Run the command (without a shell), capturing its output."""
+    logger.debug(f"Running command: {' '.join(cmd)}")
+    try:
+        return subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    except FileNotFoundError as e:
+        return subprocess.CompletedProcess(cmd, 127, stdout="", stderr=str(e))
+
+
+class DockerError(Exception):
+    """A Docker command (or Engine API request) failed, with the error / tail of its output as the message."""
+
+
+def split_tag(tag: str) -> Tuple[str, str]:
+    """Split an image tag into its repository and tag (defaults to `latest`)."""
+    name = tag.split("@")[0]
+    if ":" in name.rsplit("/", 1)[-1]:
+        repository, tag = name.rsplit(":", 1)
+        return repository, tag
+    return name, "latest"
+
+
+class DockerBackend:
+    """Interface for the Docker operations used by agi-pack (build, inspect, push and lint).
+
+    Implementations run the operations either with the `docker` CLI (`DockerCLI`), directly
+    against the Docker Engine API (`DockerEngineAPI`), or in-memory for tests (`FakeDockerBackend`).
+    """
+
+    name: str = "base"
+    """Name of the backend (see `get_backend`)."""
+
+    def build(
+        self,
+        dockerfile: str,
+        target: str,
+        tags: List[str],
+        context: str = ".",
+        plain: bool = False,
+        cache_from: Optional[List[str]] = None,
+        cache_to: Optional[List[str]] = None,
+    ) -> Iterator[str]:
+        """Build the target of the Dockerfile, streaming the build output.
+
+        Args:
+            dockerfile (str): Path to the Dockerfile.
+            target (str): Target stage to build.
+            tags (List[str]): Tags for the built image.
+            context (str): Path to the build context.
+            plain (bool): Stream BuildKit's plain (`--progress=plain`) progress output.
+            cache_from (List[str]): BuildKit cache sources to import (`--cache-from`, e.g. `type=local,src=<dir>`).
+            cache_to (List[str]): BuildKit cache destinations to export (`--cache-to`, e.g. `type=inline`).
+        Returns:
+            Iterator[str]: Lines of build output (raises DockerError if the build fails).
+        """
+        raise NotImplementedError()
+
+    def inspect(self, tag: str) -> Tuple[Optional[str], int]:
+        """Return the local image ID and size (in bytes) for the tag (or `(None, 0)` if not present)."""
+        raise NotImplementedError()
+
+    def push(self, tag: str) -> None:
+        """Push the image tag to its container repository (raises DockerError if the push fails)."""
+        raise NotImplementedError()
+
+    def lint(self, dockerfile: str) -> bool:
+        """Lint the Dockerfile with hadolint, and return True if there are no issues."""
+        raise NotImplementedError()
+
+    def exists(self, tag: str) -> bool:
+        """Check if the image tag is present locally."""
+        return self.inspect(tag)[0] is not None
+
+    def abuild(
+        self,
+        dockerfile: str,
+        target: str,
+        tags: List[str],
+        context: str = ".",
+        plain: bool = False,
+        cache_from: Optional[List[str]] = None,
+        cache_to: Optional[List[str]] = None,
+    ) -> AsyncIterator[str]:
+        """Async counterpart of `build`, streaming the build output without blocking the event loop.
+
+        By default, the blocking build runs in a thread; it is stopped (see `build`) if the
+        consumer stops iterating or is cancelled.
+        """
+        return iterate_in_thread(
+            lambda: self.build(
+                dockerfile, target, tags, context=context, plain=plain, cache_from=cache_from, cache_to=cache_to
+            )
+        )
+
+    async def ainspect(self, tag: str) -> Tuple[Optional[str], int]:
+        """Async counterpart of `inspect`."""
+        return await run_in_thread(self.inspect, tag)
+
+    async def apush(self, tag: str) -> None:
+        """Async counterpart of `push`."""
+        await run_in_thread(self.push, tag)
+
+
+class DockerCLI(DockerBackend):
+    """Docker backend that runs the `docker` CLI (without a shell).
+
+    Args:
+        executable (str): Path to the `docker` executable.
+        runner (Runner): Function that runs a docker command and returns the completed process.
+    """
+
+    name = "cli"
+
+    def __init__(self, executable: str = "docker", runner: Runner = run_command):
+        self.executable = executable
+        self.runner = runner
+
+    def build(
+        self,
+        dockerfile: str,
+        target: str,
+        tags: List[str],
+        context: str = ".",
+        plain: bool = False,
+        cache_from: Optional[List[str]] = None,
+        cache_to: Optional[List[str]] = None,
+    ) -> Iterator[str]:
+        try:
+            process = subprocess.Popen(
+                self._build_cmd(dockerfile, target, tags, context, plain, cache_from, cache_to),
+                env={**os.environ, "DOCKER_BUILDKIT": "1"},
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                universal_newlines=True,
+            )
+        except FileNotFoundError as e:
+            raise DockerError(str(e))
+
+        tail: Deque[str] = deque(maxlen=20)
+        try:
+            for line in process.stdout:
+                line = line.rstrip("\n")
+                tail.append(line)
+                yield line
+            returncode = process.wait()
+        finally:
+            # Stop the build if the caller stops consuming the output (e.g. cancelled)
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+        if returncode != 0:
+            raise DockerError("\n".join(tail))
+
+    def _build_cmd(
+        self,
+        dockerfile: str,
+        target: str,
+        tags: List[str],
+        context: str,
+        plain: bool,
+        cache_from: Optional[List[str]],
+        cache_to: Optional[List[str]],
+    ) -> List[str]:
+        cmd = [self.executable, "build", "-f", dockerfile, "--target", target]
+        for tag in tags:
+            cmd.extend(["-t", tag])
+        if plain:
+            cmd.append("--progress=plain")
+        for cache in cache_from or []:
+            cmd.extend(["--cache-from", cache])
+        for cache in cache_to or []:
+            cmd.extend(["--cache-to", cache])
+        if any(cache != "type=inline" for cache in cache_to or []):
+            # Cache exports need a `docker-container` builder, which does not load the image by default
+            cmd.append("--load")
+        cmd.append(context)
+        logger.debug(f"Running command: {' '.join(cmd)}")
+        return cmd
+
+    async def abuild(
+        self,
+        dockerfile: str,
+        target: str,
+        tags: List[str],
+        context: str = ".",
+        plain: bool = False,
+        cache_from: Optional[List[str]] = None,
+        cache_to: Optional[List[str]] = None,
+    ) -> AsyncIterator[str]:
+        """Async counterpart of `build`, using an asyncio subprocess (killed if the build is cancelled)."""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self._build_cmd(dockerfile, target, tags, context, plain, cache_from, cache_to),
+                env={**os.environ, "DOCKER_BUILDKIT": "1"},
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+            )
+        except FileNotFoundError as e:
+            raise DockerError(str(e))
+
+        tail: Deque[str] = deque(maxlen=20)
+        try:
+            async for line in process.stdout:
+                line = line.decode(errors="replace").rstrip("\n")
+                tail.append(line)
+                yield line
+            returncode = await process.wait()
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await asyncio.shield(process.wait())
+        if returncode != 0:
+            raise DockerError("\n".join(tail))
+
+    async def apush(self, tag: str) -> None:
+        """Async counterpart of `push`, using an asyncio subprocess (killed if the push is cancelled)."""
+        cmd = [self.executable, "push", tag]
+        logger.debug(f"Running command: {' '.join(cmd)}")
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+        except FileNotFoundError as e:
+            raise DockerError(str(e))
+        try:
+            stdout, stderr = await process.communicate()
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await asyncio.shield(process.wait())
+        if process.returncode != 0:
+            raise DockerError((stderr or stdout or b"").decode(errors="replace").strip())
+
+    def inspect(self, tag: str) -> Tuple[Optional[str], int]:
+        process = self.runner([self.executable, "image", "inspect", "--format", "{{.Id}} {{.Size}}", tag])
+        if process.returncode != 0 or not process.stdout.strip():
+            return None, 0
+        image_id, size = process.stdout.strip().split(" ")
+        return image_id, int(size)
+
+    def push(self, tag: str) -> None:
+        process = self.runner([self.executable, "push", tag])
+        if process.returncode != 0:
+            raise DockerError((process.stderr or process.stdout or "").strip())
+
+    def lint(self, dockerfile: str) -> bool:
+        cmd = [self.executable, "run", "--pull=always", "--rm", "-i", HADOLINT_IMAGE]
+        logger.debug(f"Running command: {' '.join(cmd)} < {dockerfile}")
+        try:
+            with open(dockerfile, "r") as f:
+                process = subprocess.run(cmd, stdin=f)
+        except FileNotFoundError as e:
+            raise DockerError(str(e))
+        return process.returncode == 0
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a unix socket."""
+
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Read a protobuf varint, and return its value and the next position."""
+    value, shift = 0, 0
+    while True:
+        byte = data[pos]
+        value |= (byte & 0x7F) << shift
+        pos, shift = pos + 1, shift + 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def _proto_fields(data: bytes) -> Iterator[Tuple[int, Union[int, bytes]]]:
+    """Yield the (field number, value) pairs of a protobuf message (varint and length-delimited fields)."""
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        number, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, pos = _read_varint(data, pos)
+            yield number, value
+        elif wire_type == 2:
+            length, pos = _read_varint(data, pos)
+            yield number, data[pos : pos + length]
+            pos += length
+        elif wire_type == 1:
+            pos += 8
+        elif wire_type == 5:
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+
+
+def _proto_timestamp(data: bytes) -> float:
+    """Decode a `google.protobuf.Timestamp` into seconds."""
+    fields = dict(_proto_fields(data))
+    return fields.get(1, 0) + fields.get(2, 0) / 1e9
+
+
+class BuildKitTraceDecoder:
+    """Decodes the BuildKit status updates (`moby.buildkit.trace`) streamed by the Engine API.
+
+    The status updates are protobuf-encoded `StatusResponse` messages; they are
+    translated into the same lines as `docker build --progress=plain`, so that the
+    output can be parsed by `BuildProgressParser`.
+    """
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.finished: set = set()
+
+    def _id(self, digest: str) -> int:
+        return self.ids.setdefault(digest, len(self.ids) + 1)
+
+    def decode(self, payload: bytes) -> List[str]:
+        """Decode a status update into plain progress lines."""
+        lines: List[str] = []
+        for number, value in _proto_fields(payload):
+            if number == 1:
+                lines.extend(self._vertex(dict(_proto_fields(value))))
+            elif number == 3:
+                log = dict(_proto_fields(value))
+                step_id = self._id(log.get(1, b"").decode())
+                lines.extend(f"#{step_id} {line}" for line in log.get(4, b"").decode(errors="replace").splitlines())
+        return lines
+
+    def _vertex(self, vertex: Dict[int, Union[int, bytes]]) -> List[str]:
+        digest = vertex.get(1, b"").decode()
+        if digest in self.finished:
+            return []
+        new = digest not in self.ids
+        step_id = self._id(digest)
+        lines = [f"#{step_id} {vertex.get(3, b'').decode()}"] if new else []
+        started = _proto_timestamp(vertex[5]) if 5 in vertex else None
+        if vertex.get(4):
+            lines.append(f"#{step_id} CACHED")
+        elif vertex.get(7):
+            lines.append(f"#{step_id} ERROR: {vertex[7].decode()}")
+        elif 6 in vertex:
+            duration = _proto_timestamp(vertex[6]) - (started or _proto_timestamp(vertex[6]))
+            lines.append(f"#{step_id} DONE {duration:.1f}s")
+        else:
+            return lines
+        self.finished.add(digest)
+        return lines
+
+
+def _dockerignore_patterns(filename: Path) -> List[Tuple[bool, str]]:
+    """Parse a `.dockerignore` file into (negated, pattern) pairs."""
+    patterns = []
+    for line in filename.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        pattern = os.path.normpath(line.lstrip("!").strip()).lstrip("/")
+        patterns.append((negated, pattern))
+    return patterns
+
+
+def _is_ignored(path: str, patterns: List[Tuple[bool, str]]) -> bool:
+    """Check if the path (or one of its parent directories) is excluded by the `.dockerignore` patterns."""
+    parts = path.split("/")
+    prefixes = ["/".join(parts[: i + 1]) for i in range(len(parts))]
+    ignored = False
+    for negated, pattern in patterns:
+        if any(fnmatch.fnmatchcase(prefix, pattern) for prefix in prefixes):
+            ignored = not negated
+    return ignored
+
+
+def _may_include(path: str, patterns: List[Tuple[bool, str]]) -> bool:
+    """Check if a negated pattern may re-include files within the (ignored) directory."""
+    return any(
+        negated and (pattern.startswith(f"{path}/") or any(c in pattern for c in "*?["))
+        for negated, pattern in patterns
+    )
+
+
+def write_context_tarball(context: str, dockerfile: str, fileobj: IO[bytes]) -> str:
+    """Write the build context (excluding the `.dockerignore`-d files) and the Dockerfile as a tarball.
+
+    The Dockerfile-specific `<dockerfile>.dockerignore` takes precedence over the context's `.dockerignore`.
+    Patterns are matched with `fnmatch` (i.e. `**` is not supported).
+
+    Args:
+        context (str): Path to the build context.
+        dockerfile (str): Path to the Dockerfile (relative to the current directory).
+        fileobj (IO[bytes]): File to write the tarball to.
+    Returns:
+        str: Path of the Dockerfile within the tarball.
+    """
+    patterns: List[Tuple[bool, str]] = []
+    for filename in [Path(f"{dockerfile}.dockerignore"), Path(context) / ".dockerignore"]:
+        if filename.exists():
+            patterns = _dockerignore_patterns(filename)
+            break
+
+    arcname = ".agipack.Dockerfile"
+    with tarfile.open(fileobj=fileobj, mode="w") as tar:
+        for root, dirnames, filenames in os.walk(context):
+            rel_root = os.path.relpath(root, context)
+            for dirname in list(dirnames):
+                path = os.path.normpath(os.path.join(rel_root, dirname))
+                if _is_ignored(path, patterns) and not _may_include(path, patterns):
+                    dirnames.remove(dirname)
+            for filename in filenames:
+                path = os.path.normpath(os.path.join(rel_root, filename))
+                if path != arcname and not _is_ignored(path, patterns):
+                    tar.add(os.path.join(root, filename), arcname=path, recursive=False)
+        tar.add(dockerfile, arcname=arcname)
+    return arcname
+
+
+def _docker_config() -> Dict:
+    """Load the docker client configuration (`~/.docker/config.json`)."""
+    filename = Path(os.getenv("DOCKER_CONFIG", Path.home() / ".docker")) / "config.json"
+    if not filename.exists():
+        return {}
+    with filename.open() as f:
+        return json.load(f)
+
+
+def _decode_auth(registry: str, auth: str) -> Dict[str, str]:
+    """Decode a base64-encoded `<username>:<password>` auth into an Engine API auth config."""
+    username, password = base64.b64decode(auth).decode().split(":", 1)
+    return {"username": username, "password": password, "serveraddress": registry}
+
+
+def registry_auth(repository: str) -> Dict[str, str]:
+    """Return the credentials for the repository's registry, from the `auths` of the docker client config.
+
+    Credential helpers / stores (`credsStore`) are not supported; an empty (anonymous) auth is returned instead.
+    """
+    first = repository.split("/")[0]
+    registry = first if "/" in repository and ("." in first or ":" in first or first == "localhost") else None
+    auths = _docker_config().get("auths", {})
+    keys = [registry] if registry else ["https://index.docker.io/v1/", "index.docker.io", "docker.io"]
+    for key in keys:
+        for candidate in [key, f"https://{key}", f"http://{key}"]:
+            auth = auths.get(candidate, {}).get("auth")
+            if auth:
+                return _decode_auth(key, auth)
+    return {}
+
+
+class DockerEngineAPI(DockerBackend):
+    """Docker backend that talks to the Docker Engine API directly (by default, over the unix socket).
+
+    Each thread re-uses a single keep-alive connection to the daemon, so operations do not pay
+    for a `docker` CLI process (or a new connection) each. Builds use BuildKit (`version=2`),
+    whose status updates are decoded into `--progress=plain` lines as they are streamed.
+
+    Usage Example:
+        ```python
+        backend = DockerEngineAPI("unix:///var/run/docker.sock")
+        for line in backend.build("Dockerfile", "base-cpu", ["agipack:base-cpu"]):
+            print(line)
+        ```
+
+    Args:
+        base_url (str): URL of the Docker daemon (`unix:///path/to/docker.sock` or `tcp://host:port`).
+        api_version (str): Docker Engine API version.
+        timeout (float): Socket timeout (in seconds), unset by default as builds / pushes can take a while.
+    """
+
+    name = "api"
+
+    def __init__(self, base_url: str = DOCKER_HOST, api_version: str = "1.41", timeout: Optional[float] = None):
+        self.base_url = base_url
+        self.api_version = api_version
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        """Create a new connection to the daemon."""
+        url = urlparse(self.base_url)
+        if url.scheme == "unix":
+            return _UnixHTTPConnection(url.path, timeout=self.timeout)
+        if url.scheme in ("tcp", "http"):
+            return http.client.HTTPConnection(url.hostname, url.port or 2375, timeout=self.timeout)
+        raise ValueError(f"Unsupported Docker host {self.base_url}, must be `unix://` or `tcp://`")
+
+    def _request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[List[Tuple[str, str]]] = None,
+        body: Optional[Union[bytes, IO[bytes]]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> http.client.HTTPResponse:
+        """Send a request over the thread's connection (re-connecting once if it was closed)."""
+        url = f"/v{self.api_version}{path}"
+        if params:
+            url += f"?{urlencode(params)}"
+        headers = dict(headers or {})
+        if isinstance(body, bytes):
+            headers.setdefault("Content-Type", "application/json")
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = self._connect()
+            try:
+                conn.request(method, url, body=body, headers=headers)
+                return conn.getresponse()
+            except (ConnectionError, http.client.RemoteDisconnected, http.client.CannotSendRequest) as e:
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise DockerError(f"Failed to connect to the Docker daemon at {self.base_url} (e={e})")
+                if hasattr(body, "seek"):
+                    body.seek(0)
+        raise AssertionError("unreachable")
+
+    def _json(self, method: str, path: str, **kwargs) -> Tuple[int, Optional[Dict]]:
+        """Send a request, and return the status and JSON response."""
+        response = self._request(method, path, **kwargs)
+        data = response.read()
+        return response.status, json.loads(data) if data.strip() else None
+
+    @staticmethod
+    def _check(status: int, data: Optional[Dict], action: str) -> None:
+        if status >= 400:
+            raise DockerError(f"Failed to {action} (status={status}, e={(data or {}).get('message', '')})")
+
+    def _stream(self, response: http.client.HTTPResponse, action: str) -> Iterator[Dict]:
+        """Yield the JSON messages of a streaming response (raising DockerError on an error message)."""
+        if response.status >= 400:
+            data = response.read()
+            message = json.loads(data).get("message", "") if data.strip() else ""
+            raise DockerError(f"Failed to {action} (status={response.status}, e={message})")
+        for line in response:
+            if not line.strip():
+                continue
+            message = json.loads(line)
+            if message.get("error"):
+                response.read()
+                raise DockerError(message.get("errorDetail", {}).get("message") or message["error"])
+            yield message
+
+    @staticmethod
+    def _cache_params(cache_from: List[str], cache_to: List[str]) -> List[Tuple[str, str]]:
+        """Map the BuildKit cache options to build parameters (the Engine API only supports registry imports)."""
+        refs = []
+        for cache in cache_from:
+            options = dict(option.split("=", 1) for option in cache.split(","))
+            if options.get("type") == "registry" and "ref" in options:
+                refs.append(options["ref"])
+            else:
+                logger.warning(f"Ignoring unsupported cache import for the Engine API backend [{cache}]")
+        params = [("cachefrom", json.dumps(refs))] if refs else []
+        for cache in cache_to:
+            if cache == "type=inline":
+                params.append(("buildargs", json.dumps({"BUILDKIT_INLINE_CACHE": "1"})))
+            else:
+                logger.warning(f"Ignoring unsupported cache export for the Engine API backend [{cache}]")
+        return params
+
+    def build(
+        self,
+        dockerfile: str,
+        target: str,
+        tags: List[str],
+        context: str = ".",
+        plain: bool = False,
+        cache_from: Optional[List[str]] = None,
+        cache_to: Optional[List[str]] = None,
+    ) -> Iterator[str]:
+        params = [("dockerfile", ""), ("target", target), ("version", "2"), ("rm", "1")]
+        params.extend(("t", tag) for tag in tags)
+        params.extend(self._cache_params(cache_from or [], cache_to or []))
+        auths = _docker_config().get("auths", {})
+        auths = {key: _decode_auth(key, entry["auth"]) for key, entry in auths.items() if entry.get("auth")}
+        headers = {"Content-Type": "application/x-tar"}
+        if auths:
+            headers["X-Registry-Config"] = base64.urlsafe_b64encode(json.dumps(auths).encode()).decode()
+
+        decoder = BuildKitTraceDecoder()
+        tail: Deque[str] = deque(maxlen=20)
+        with tempfile.TemporaryFile() as tarball:
+            params[0] = ("dockerfile", write_context_tarball(context, dockerfile, tarball))
+            headers["Content-Length"] = str(tarball.tell())
+            tarball.seek(0)
+            response = self._request("POST", "/build", params=params, body=tarball, headers=headers)
+        try:
+            for message in self._stream(response, f"build target {target}"):
+                if message.get("id") == "moby.buildkit.trace":
+                    lines = decoder.decode(base64.b64decode(message["aux"]))
+                elif "stream" in message:
+                    lines = message["stream"].splitlines()
+                else:
+                    continue
+                for line in lines:
+                    tail.append(line)
+                    yield line
+        except DockerError as e:
+            raise DockerError("\n".join([*tail, str(e)]))
+        finally:
+            # Drop the connection if the build output was not fully consumed (e.g. cancelled)
+            if not response.isclosed():
+                response.close()
+                self._local.conn.close()
+                self._local.conn = None
+
+    def inspect(self, tag: str) -> Tuple[Optional[str], int]:
+        status, data = self._json("GET", f"/images/{quote(tag, safe='')}/json")
+        if status == 404:
+            return None, 0
+        self._check(status, data, f"inspect image {tag}")
+        return data["Id"], int(data["Size"])
+
+    def push(self, tag: str) -> None:
+        repository, image_tag = split_tag(tag)
+        auth = base64.urlsafe_b64encode(json.dumps(registry_auth(repository)).encode()).decode()
+        response = self._request(
+            "POST", f"/images/{repository}/push", params=[("tag", image_tag)], headers={"X-Registry-Auth": auth}
+        )
+        for message in self._stream(response, f"push image {tag}"):
+            logger.debug(f"Push progress [tag={tag}, status={message.get('status')}]")
+
+    def lint(self, dockerfile: str) -> bool:
+        repository, image_tag = split_tag(HADOLINT_IMAGE)
+        response = self._request("POST", "/images/create", params=[("fromImage", repository), ("tag", image_tag)])
+        for _ in self._stream(response, f"pull image {HADOLINT_IMAGE}"):
+            pass
+        spec = {"Image": HADOLINT_IMAGE, "Cmd": ["/bin/hadolint", "/Dockerfile"]}
+        status, data = self._json("POST", "/containers/create", body=json.dumps(spec).encode())
+        self._check(status, data, "create the hadolint container")
+        container = data["Id"]
+        try:
+            with tempfile.TemporaryFile() as tarball:
+                with tarfile.open(fileobj=tarball, mode="w") as tar:
+                    tar.add(dockerfile, arcname="Dockerfile")
+                tarball.seek(0)
+                status, data = self._json(
+                    "PUT", f"/containers/{container}/archive", params=[("path", "/")], body=tarball.read()
+                )
+            self._check(status, data, "copy the Dockerfile to the hadolint container")
+            self._check(*self._json("POST", f"/containers/{container}/start"), "start the hadolint container")
+            status, data = self._json("POST", f"/containers/{container}/wait")
+            self._check(status, data, "wait for the hadolint container")
+            response = self._request("GET", f"/containers/{container}/logs", params=[("stdout", "1"), ("stderr", "1")])
+            logs = response.read()
+            # Demultiplex the log stream (8-byte header: stream type, 3 bytes padding, 4 bytes size)
+            pos, output = 0, []
+            while pos + 8 <= len(logs):
+                size = int.from_bytes(logs[pos + 4 : pos + 8], "big")
+                output.append(logs[pos + 8 : pos + 8 + size].decode(errors="replace"))
+                pos += 8 + size
+            for line in "".join(output).splitlines():
+                logger.warning(f"hadolint: {line} [dockerfile={dockerfile}]")
+            return data["StatusCode"] == 0
+        finally:
+            self._json("DELETE", f"/containers/{container}", params=[("force", "1")])
+
+
+class FakeDockerBackend(DockerBackend):
+    """In-memory Docker backend for tests, that records the operations instead of running them.
+
+    Usage Example:
+        ```python
+        backend = FakeDockerBackend(logs=["#1 [base-cpu 1/2] FROM debian", "#1 DONE 0.1s"])
+        builder = AGIPack(config, backend=backend)
+        ```
+
+    Args:
+        images (Dict[str, Tuple[str, int]]): Local images (tag -> image ID and size).
+        logs (List[str]): Build output replayed by every build.
+        failures (Dict[str, List[str]]): Errors raised by the next builds (by target) / pushes (by tag).
+        sizes (Dict[str, int]): Size (in bytes) of the images built for each target.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        images: Optional[Dict[str, Tuple[str, int]]] = None,
+        logs: Optional[List[str]] = None,
+        failures: Optional[Dict[str, List[str]]] = None,
+        sizes: Optional[Dict[str, int]] = None,
+    ):
+        self.images = dict(images or {})
+        self.sizes = dict(sizes or {})
+        self.logs = list(logs or [])
+        self.failures = {key: list(errors) for key, errors in (failures or {}).items()}
+        self.builds: List[Dict] = []
+        self.pushed: List[str] = []
+        self.linted: List[str] = []
+        self._lock = threading.Lock()
+
+    def _fail(self, key: str) -> None:
+        with self._lock:
+            errors = self.failures.get(key, [])
+            if errors:
+                raise DockerError(errors.pop(0))
+
+    def build(
+        self,
+        dockerfile: str,
+        target: str,
+        tags: List[str],
+        context: str = ".",
+        plain: bool = False,
+        cache_from: Optional[List[str]] = None,
+        cache_to: Optional[List[str]] = None,
+    ) -> Iterator[str]:
+        with self._lock:
+            self.builds.append(
+                {
+                    "dockerfile": dockerfile,
+                    "target": target,
+                    "tags": list(tags),
+                    "context": context,
+                    "cache_from": list(cache_from or []),
+                    "cache_to": list(cache_to or []),
+                }
+            )
+        yield from self.logs
+        self._fail(target)
+        with self._lock:
+            for tag in tags:
+                self.images[tag] = (f"sha256:{target}", self.sizes.get(target, 0))
+
+    def inspect(self, tag: str) -> Tuple[Optional[str], int]:
+        with self._lock:
+            return self.images.get(tag, (None, 0))
+
+    def push(self, tag: str) -> None:
+        self._fail(tag)
+        with self._lock:
+            self.pushed.append(tag)
+
+    def lint(self, dockerfile: str) -> bool:
+        with self._lock:
+            self.linted.append(dockerfile)
+        return True
+
+
+BACKENDS = {"cli": DockerCLI, "api": DockerEngineAPI, "fake": FakeDockerBackend}
+"""Docker backends (by name)."""
+
+
+def get_backend(name: str = AGIPACK_DOCKER_BACKEND) -> DockerBackend:
+    """Return a Docker backend by name (one of `cli`, `api` or `fake`)."""
+    if name not in BACKENDS:
+        raise ValueError(f"Docker backend must be one of {list(BACKENDS.keys())} (found {name})")
+    return BACKENDS[name]()
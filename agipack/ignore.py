@@ -0,0 +1,104 @@
+import os
+import re
+from pathlib import Path
+from typing import Iterable, List, Pattern, Tuple, Union
+
+from agipack.constants import AGIPACK_CONTEXT_PREFIX, AGIPACK_MANIFEST_FILENAME, AGIPACK_MIRROR_DIR
+
+AGIPACK_IGNORED_DIRS = (".git", str(Path(AGIPACK_MANIFEST_FILENAME).parent), AGIPACK_MIRROR_DIR)
+"""Directories (relative to the build context) of the VCS and agi-pack state (manifest, render cache, mirror)."""
+
+
+def _clean(path: Union[str, Path]) -> str:
+    """Normalize a path (or pattern) relative to the build context, e.g. `./src/` -> `src`."""
+    return os.path.normpath(path).replace(os.sep, "/").lstrip("/")
+
+
+def _translate(pattern: str) -> Pattern:
+    """Translate a `.dockerignore` pattern into a regular expression (`**` matches any number of directories)."""
+    regex, i = "", 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            regex, i = regex + "(.*/)?", i + 3
+            continue
+        if pattern.startswith("**", i):
+            regex, i = regex + ".*", i + 2
+            continue
+        regex += {"*": "[^/]*", "?": "[^/]"}.get(char, re.escape(char))
+        i += 1
+    return re.compile(f"^{regex}$")
+
+
+class DockerIgnore:
+    """Matches build-context paths against the patterns of a `.dockerignore` file.
+
+    As with Docker, the last matching pattern wins, `!` patterns re-include paths, and a
+    pattern that matches a directory also matches everything inside it.
+
+    Usage Example:
+        ```python
+        ignore = DockerIgnore.load(".dockerignore")
+        files = [path for path in files if not ignore.ignored(path)]
+        ```
+
+    Args:
+        patterns (Iterable[str]): Patterns of the `.dockerignore` file (comments and blank lines are skipped).
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.patterns: List[Tuple[Pattern, bool]] = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            negated = pattern.startswith("!")
+            self.patterns.append((_translate(_clean(pattern.lstrip("!").strip())), negated))
+
+    @classmethod
+    def load(cls, filename: Union[str, Path] = ".dockerignore") -> "DockerIgnore":
+        """Load the patterns of a `.dockerignore` file (if any)."""
+        path = Path(filename)
+        return cls(path.read_text().splitlines() if path.exists() else [])
+
+    @property
+    def negated(self) -> bool:
+        """Check if some patterns re-include paths (so that ignored directories may still have included files)."""
+        return any(negated for _, negated in self.patterns)
+
+    def ignored(self, path: Union[str, Path]) -> bool:
+        """Check if the path (relative to the build context) is excluded from the build context."""
+        path = _clean(path)
+        parts = path.split("/")
+        candidates = ["/".join(parts[: i + 1]) for i in range(len(parts))]
+        ignored = False
+        for regex, negated in self.patterns:
+            if any(regex.match(candidate) for candidate in candidates):
+                ignored = not negated
+        return ignored
+
+
+def walk_files(path: Union[str, Path], ignore: DockerIgnore) -> List[Path]:
+    """Return the files in the directory that end up in the build context, sorted.
+
+    The VCS / agi-pack state directories (see `AGIPACK_IGNORED_DIRS`), staged build contexts
+    and the paths excluded by the `.dockerignore` are skipped.
+
+    Args:
+        path (Union[str, Path]): Directory (relative to the build context) to walk.
+        ignore (DockerIgnore): Patterns of the `.dockerignore` of the build context.
+    Returns:
+        List[Path]: Files in the directory (recursively, without following symlinks).
+    """
+    pruned = {_clean(name) for name in AGIPACK_IGNORED_DIRS}
+    files = []
+    for root, dirs, filenames in os.walk(path):
+        dirs[:] = [
+            name
+            for name in dirs
+            if not name.startswith(AGIPACK_CONTEXT_PREFIX)
+            and _clean(os.path.join(root, name)) not in pruned
+            and (ignore.negated or not ignore.ignored(os.path.join(root, name)))
+        ]
+        files.extend(Path(root) / name for name in filenames if not ignore.ignored(os.path.join(root, name)))
+    return sorted(files)
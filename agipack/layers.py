@@ -0,0 +1,141 @@
+import logging
+import re
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from agipack.constants import AGIPACK_HEAVY_PACKAGE_THRESHOLD_MB, AGIPACK_HEAVY_PACKAGES
+
+if TYPE_CHECKING:
+    from agipack.config import AGIPackConfig, ImageConfig
+
+logger = logging.getLogger(__name__)
+
+LAYERING_STRATEGIES = ("single", "heavy", "groups")
+"""Supported strategies for splitting `pip` / `conda` packages into layers.
+
+- `single`: All packages are installed in a single layer.
+- `heavy`: Heavy packages (see `AGIPACK_HEAVY_PACKAGES`) are installed in their own
+    layers (largest first), followed by a single layer for all the light packages.
+- `groups`: Packages are installed in the explicit `layer_groups` (in order), followed
+    by a single layer for all the remaining packages.
+"""
+
+_PACKAGE_NAME_RE = re.compile(r"[\s\[<>=!~;@]")
+
+
+def package_name(package: str) -> str:
+    """Return the normalized name of a pip / conda package specifier.
+
+    Examples: `torch==2.0.1` -> `torch`, `pytorch::pytorch=2.0` -> `pytorch`, `Scikit_Learn>=1.0` -> `scikit-learn`.
+    """
+    name = package.split("::")[-1]
+    name = _PACKAGE_NAME_RE.split(name, maxsplit=1)[0]
+    return name.lower().replace("_", "-")
+
+
+def package_size(package: str) -> int:
+    """Approximate install size (in MB) of a package, or 0 if unknown."""
+    name = package_name(package)
+    for pattern, size in AGIPACK_HEAVY_PACKAGES.items():
+        if name == pattern or (pattern.endswith("*") and name.startswith(pattern[:-1])):
+            return size
+    return 0
+
+
+def split_layers(
+    packages: List[str], strategy: str = "single", groups: Dict[str, List[str]] = None
+) -> List[List[str]]:
+    """Split the packages into layers according to the layering strategy.
+
+    Args:
+        packages (List[str]): Package specifiers (in the order specified in the config).
+        strategy (str): Layering strategy (one of `LAYERING_STRATEGIES`).
+        groups (Dict[str, List[str]]): Explicit groups of package names (for the `groups` strategy).
+    Returns:
+        List[List[str]]: Non-empty layers of package specifiers, in install order.
+    """
+    if strategy not in LAYERING_STRATEGIES:
+        raise ValueError(f"Layering strategy must be one of {LAYERING_STRATEGIES} (found {strategy})")
+    if not packages:
+        return []
+    if strategy == "single":
+        return [list(packages)]
+
+    layers: List[List[str]] = []
+    if strategy == "heavy":
+        heavy = [package for package in packages if package_size(package) >= AGIPACK_HEAVY_PACKAGE_THRESHOLD_MB]
+        heavy = sorted(heavy, key=lambda package: (-package_size(package), package_name(package)))
+        layers.extend([package] for package in heavy)
+        remaining = [package for package in packages if package not in heavy]
+    else:
+        remaining = list(packages)
+        for names in (groups or {}).values():
+            names = {package_name(name) for name in names}
+            layer = [package for package in remaining if package_name(package) in names]
+            if layer:
+                layers.append(layer)
+            remaining = [package for package in remaining if package not in layer]
+    if remaining:
+        layers.append(remaining)
+    return layers
+
+
+def stage_layers(image_config: "ImageConfig") -> List[Tuple[str, Tuple]]:
+    """Return the cache-relevant layers of a target's Dockerfile stage, in build order.
+
+    Each layer is a (label, inputs) tuple, where a change in the inputs invalidates
+    the layer and all the layers that follow it (including those of descendant targets).
+
+    Args:
+        image_config (ImageConfig): Image configuration.
+    """
+    layers: List[Tuple[str, Tuple]] = [("base", (image_config.base, image_config.python))]
+    if image_config.system:
+        layers.append(("system", tuple(image_config.system)))
+    for manager, packages in [("conda", image_config.conda_layers()), ("pip", image_config.pip_layers())]:
+        for layer in packages:
+            names = " ".join(package_name(package) for package in layer)
+            layers.append((f"{manager}: {names}", tuple(layer)))
+    if image_config.requirements:
+        layers.append(("requirements", tuple(image_config.requirements)))
+    layers.append(("workdir", (image_config.workdir,)))
+    if image_config.add:
+        layers.append(("add", tuple(image_config.add)))
+    for cmd in image_config.run:
+        layers.append((f"run: {cmd}", (cmd,)))
+    if image_config.env:
+        layers.append(("env", tuple(sorted(image_config.env.items()))))
+    if image_config.entrypoint or image_config.command:
+        layers.append(("entrypoint", (tuple(image_config.entrypoint), tuple(image_config.command))))
+    return layers
+
+
+def invalidated_layers(old: "AGIPackConfig", new: "AGIPackConfig") -> Dict[str, List[str]]:
+    """Return the layers of each target that a config change would invalidate.
+
+    Within a stage, the first changed layer invalidates all the layers after it,
+    and any change to a target invalidates all the layers of its descendants.
+
+    Args:
+        old (AGIPackConfig): Previous AGIPack configuration.
+        new (AGIPackConfig): Updated AGIPack configuration.
+    Returns:
+        Dict[str, List[str]]: Dictionary of targets (in `new`) and their invalidated layer labels.
+    """
+    invalidated: Dict[str, List[str]] = {}
+    changed_targets = set()
+    for target, image_config in new.images.items():
+        layers = stage_layers(image_config)
+        if image_config.base in changed_targets:
+            changed_targets.add(target)
+            invalidated[target] = [label for label, _ in layers]
+            continue
+        old_layers = stage_layers(old.images[target]) if target in old.images else []
+        if layers != old_layers:
+            changed_targets.add(target)
+        changed = next(
+            (idx for idx, layer in enumerate(layers) if idx >= len(old_layers) or old_layers[idx] != layer),
+            len(layers),
+        )
+        invalidated[target] = [label for label, _ in layers[changed:]]
+        logger.debug(f"Invalidated layers [target={target}, layers={invalidated[target]}]")
+    return invalidated
@@ -0,0 +1,301 @@
+import hashlib
+import json
+import logging
+import os
+import shlex
+import shutil
+import sys
+import tempfile
+from dataclasses import field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from pydantic.dataclasses import dataclass
+
+from agipack.config import AGIPackConfig
+from agipack.constants import AGIPACK_LOCK_DIR
+from agipack.docker import Runner, run_command
+from agipack.version import __version__
+
+logger = logging.getLogger(__name__)
+
+LOCK_MANAGERS = ("conda", "pip")
+"""Package managers that are locked (in install order)."""
+
+
+def lockfile_path(target: str, manager: str, lock_dir: str = AGIPACK_LOCK_DIR) -> Path:
+    """Return the lockfile path (relative to the build context) for the target and package manager."""
+    if manager not in LOCK_MANAGERS:
+        raise ValueError(f"Package manager must be one of {LOCK_MANAGERS} (found {manager})")
+    return Path(lock_dir) / f"{target}.{manager}.txt"
+
+
+def lockfiles(target: str, lock_dir: str = AGIPACK_LOCK_DIR) -> Dict[str, Path]:
+    """Return the existing lockfiles for the target (keyed by package manager)."""
+    paths = {manager: lockfile_path(target, manager, lock_dir) for manager in LOCK_MANAGERS}
+    return {manager: path for manager, path in paths.items() if path.exists()}
+
+
+def lockfile_entries(path: Path) -> List[str]:
+    """Return the locked packages in the lockfile (i.e. the non-comment / non-directive lines)."""
+    lines = [line.strip() for line in path.read_text().splitlines()]
+    return [line for line in lines if line and not line.startswith(("#", "@", "--hash"))]
+
+
+@dataclass
+class LockedPackage:
+    """A pinned pip package, with the hashes of its distribution."""
+
+    name: str
+    """Normalized name of the package."""
+
+    version: str
+    """Pinned version of the package."""
+
+    url: str
+    """URL of the distribution that was resolved."""
+
+    hashes: List[str] = field(default_factory=list)
+    """Hashes (`<algorithm>:<digest>`) of the distribution."""
+
+    def requirement(self) -> str:
+        """Hash-checked requirement specifier (in the pip requirements file format)."""
+        hashes = "".join(f" \\\n    --hash={digest}" for digest in self.hashes)
+        return f"{self.name}=={self.version}{hashes}"
+
+
+@dataclass
+class LockResult:
+    """Lockfiles written for a single target."""
+
+    target: str
+    """Name of the target."""
+
+    pip: List[LockedPackage] = field(default_factory=list)
+    """Pinned pip packages installed by the target (excluding the ones locked by its ancestors)."""
+
+    conda: List[str] = field(default_factory=list)
+    """Pinned conda package URLs (`<url>#<md5>`) installed by the target (excluding its ancestors')."""
+
+    lockfiles: Dict[str, str] = field(default_factory=dict)
+    """Dictionary of package managers and their written lockfiles."""
+
+
+def _file_sha256(url: str) -> Optional[str]:
+    """Compute the sha256 digest of a local (`file://`) distribution."""
+    parsed = urlparse(url)
+    if parsed.scheme != "file":
+        return None
+    digest = hashlib.sha256()
+    with open(unquote(parsed.path), "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AGIPackLocker:
+    """Resolves the `pip` / `conda` packages of each target into lockfiles.
+
+    Each target's packages are resolved together with those of its ancestors,
+    so that a target's lockfile only pins the packages it adds (or upgrades)
+    on top of its parent image. Pip packages are resolved with
+    `pip install --dry-run --report` for the target's python version, and
+    locked with their hashes (`--require-hashes`). Conda packages are resolved
+    with `conda create --dry-run --json`, and locked as an `@EXPLICIT` spec file.
+
+    Usage Example:
+        ```python
+        locker = AGIPackLocker(config, index_url="https://pypi.org/simple")
+        results = locker.lock()
+        ```
+
+    Args:
+        config (AGIPackConfig): AGIPack configuration.
+        lock_dir (str): Directory for the lockfiles (relative to the build context).
+        index_url (str): Base URL of the Python package index.
+        find_links (List[str]): Additional local directories / URLs to look for distributions in.
+        no_index (bool): Ignore the package index (and only use `find_links`).
+        platforms (List[str]): Platform tags to resolve wheels for (defaults to the host platform).
+        host_python (bool): Resolve for the host interpreter instead of the target's python version
+            (allows source distributions, which cannot be resolved for another python version).
+        conda_exe (str): Conda / mamba executable used to resolve the conda packages.
+        runner (Runner): Function that runs a command and returns the completed process.
+    """
+
+    def __init__(
+        self,
+        config: AGIPackConfig,
+        lock_dir: str = AGIPACK_LOCK_DIR,
+        index_url: Optional[str] = None,
+        find_links: Optional[List[str]] = None,
+        no_index: bool = False,
+        platforms: Optional[List[str]] = None,
+        host_python: bool = False,
+        conda_exe: Optional[str] = None,
+        runner: Runner = run_command,
+    ):
+        self.config = config
+        self.lock_dir = lock_dir
+        self.index_url = index_url
+        self.find_links = find_links or []
+        self.no_index = no_index
+        self.platforms = platforms or []
+        self.host_python = host_python
+        self.conda_exe = conda_exe or shutil.which("mamba") or shutil.which("conda") or "conda"
+        self.runner = runner
+
+    def _pip_command(self, python: str, report: str, target_dir: str) -> List[str]:
+        """Return the `pip install --dry-run --report` command (without the packages)."""
+        cmd = [sys.executable, "-m", "pip", "install", "--dry-run", "--ignore-installed", "--quiet"]
+        cmd.extend(["--report", report])
+        if self.index_url:
+            cmd.extend(["--index-url", self.index_url])
+        if self.no_index:
+            cmd.append("--no-index")
+        for link in self.find_links:
+            cmd.extend(["--find-links", link])
+        if not self.host_python:
+            # Resolving for another python version / platform requires wheels (and a `--target`)
+            cmd.extend(["--python-version", ".".join(python.split(".")[:2]), "--only-binary=:all:"])
+            cmd.extend(["--target", target_dir])
+            for platform in self.platforms:
+                cmd.extend(["--platform", platform])
+        return cmd
+
+    def resolve_pip(self, packages: List[str], requirements: List[str], python: str) -> List[LockedPackage]:
+        """Resolve the pip packages and requirements files into pinned, hash-checked packages.
+
+        Args:
+            packages (List[str]): Pip package specifiers.
+            requirements (List[str]): Pip requirements files.
+            python (str): Python version of the image.
+        Returns:
+            List[LockedPackage]: Pinned packages (sorted by name).
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            report = str(Path(tmp_dir) / "report.json")
+            cmd = self._pip_command(python, report, str(Path(tmp_dir) / "target"))
+            for filename in requirements:
+                cmd.extend(["-r", filename])
+            cmd.extend(packages)
+            process = self.runner(cmd)
+            if process.returncode != 0:
+                raise ValueError(f"Failed to resolve pip packages {packages} (e={process.stderr.strip()})")
+            with open(report) as f:
+                data = json.load(f)
+
+        locked: List[LockedPackage] = []
+        for item in data.get("install", []):
+            metadata, download_info = item["metadata"], item["download_info"]
+            name = metadata["name"].lower().replace("_", "-")
+            hashes = download_info.get("archive_info", {}).get("hashes", {})
+            if "sha256" not in hashes:
+                digest = _file_sha256(download_info["url"])
+                if digest is None:
+                    raise ValueError(f"No sha256 hash for pip package `{name}` (url={download_info['url']})")
+                hashes = {"sha256": digest}
+            digest = f"sha256:{hashes['sha256']}"
+            locked.append(
+                LockedPackage(name=name, version=metadata["version"], url=download_info["url"], hashes=[digest])
+            )
+        return sorted(locked, key=lambda package: package.name)
+
+    def _conda_channels(self) -> List[str]:
+        """Return the conda channel options of the images, i.e. the conda mirror (if any) or `conda-forge`."""
+        mirrors = self.config.mirrors
+        if mirrors is not None and mirrors.conda:
+            return ["--override-channels", "-c", mirrors.conda]
+        return ["-c", "conda-forge"]
+
+    def resolve_conda(self, packages: List[str], python: str) -> List[str]:
+        """Resolve the conda packages into pinned package URLs (with their md5 checksums).
+
+        Args:
+            packages (List[str]): Conda package specifiers (and flags, e.g. `-c pytorch`).
+            python (str): Python version of the image.
+        Returns:
+            List[str]: Pinned package URLs (`<url>#<md5>`, in install order).
+        """
+        args = [arg for package in packages for arg in shlex.split(package)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Use an empty package cache, so that all the packages are reported as fetched (with their URLs)
+            cmd = ["env", f"CONDA_PKGS_DIRS={tmp_dir}", self.conda_exe, "create", "--dry-run", "--json", "-n"]
+            cmd.extend(["agipack-lock", *self._conda_channels(), f"python={python}", *args])
+            process = self.runner(cmd)
+        if process.returncode != 0:
+            raise ValueError(f"Failed to resolve conda packages {packages} (e={process.stderr.strip()})")
+        data = json.loads(process.stdout)
+        return [f"{item['url']}#{item['md5']}" for item in data.get("actions", {}).get("FETCH", [])]
+
+    def _write(self, target: str, manager: str, lines: List[str], python: str) -> str:
+        """Write the lockfile for the target, and return its path."""
+        path = lockfile_path(target, manager, self.lock_dir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        header = [
+            f"# Auto-generated by agi-pack (version={__version__}), do not edit.",
+            f"# target={target}, python={python}",
+        ]
+        if manager == "conda":
+            header.append("@EXPLICIT")
+        path.write_text("\n".join(header + lines) + "\n")
+        logger.info(f"🔒 Wrote lockfile [target={target}, filename={path}, packages={len(lines)}]")
+        return str(path)
+
+    def lock(self, targets: Optional[List[str]] = None) -> Dict[str, LockResult]:
+        """Resolve the packages of each target, and write the lockfiles.
+
+        Args:
+            targets (List[str]): Targets to lock (defaults to all the targets).
+        Returns:
+            Dict[str, LockResult]: Lock results for each target.
+        """
+        selected = set(self.config.images.keys()) if targets is None else set(targets)
+        unknown = selected - set(self.config.images.keys())
+        if unknown:
+            raise ValueError(f"Unknown targets {sorted(unknown)}, must be one of {list(self.config.images.keys())}")
+
+        # Only the selected targets and their ancestors need to be resolved
+        needed = set()
+        for target in selected:
+            while target in self.config.images and target not in needed:
+                needed.add(target)
+                target = self.config.images[target].base
+
+        # Packages requested by each target and its ancestors, and their locked versions / URLs
+        specs: Dict[str, Tuple[List[str], List[str], List[str]]] = {}
+        pinned: Dict[str, Dict[str, Dict[str, str]]] = {}
+        results: Dict[str, LockResult] = {}
+        for target, image_config in self.config.images.items():
+            if target not in needed:
+                continue
+            parent = image_config.base if image_config.base in self.config.images else None
+            conda, pip, requirements = specs.get(parent, ([], [], []))
+            specs[target] = (
+                conda + image_config.conda,
+                pip + image_config.pip,
+                requirements + image_config.requirements,
+            )
+            inherited = pinned.get(parent, {"conda": {}, "pip": {}})
+            pinned[target] = {manager: dict(packages) for manager, packages in inherited.items()}
+
+            result = LockResult(target=target)
+            if image_config.conda:
+                urls = self.resolve_conda(specs[target][0], image_config.python)
+                result.conda = [url for url in urls if url not in inherited["conda"].values()]
+                pinned[target]["conda"].update({url.rsplit("/", 1)[-1]: url for url in result.conda})
+            if image_config.pip or image_config.requirements:
+                packages = self.resolve_pip(specs[target][1], specs[target][2], image_config.python)
+                result.pip = [p for p in packages if inherited["pip"].get(p.name) != p.version]
+                pinned[target]["pip"].update({package.name: package.version for package in result.pip})
+
+            if target not in selected:
+                continue
+            for manager, lines in [("conda", result.conda), ("pip", [p.requirement() for p in result.pip])]:
+                path = lockfile_path(target, manager, self.lock_dir)
+                if getattr(image_config, manager) or (manager == "pip" and image_config.requirements):
+                    result.lockfiles[manager] = self._write(target, manager, lines, image_config.python)
+                elif path.exists():
+                    os.remove(path)
+            results[target] = result
+        return results
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from agipack.config import AGIPackConfig
+from agipack.ignore import DockerIgnore, walk_files
+from agipack.lock import lockfiles
+from agipack.version import __version__
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_path(path: Path, digest: "hashlib._Hash", ignore: DockerIgnore) -> None:
+    """Update the digest with the contents of a file, or of all the files in a directory (see `walk_files`)."""
+    if not path.exists():
+        digest.update(f"missing:{path}".encode())
+        return
+    paths = [path] if path.is_file() else [p for p in walk_files(path, ignore) if p.is_file()]
+    for p in paths:
+        digest.update(f"file:{p}".encode())
+        with p.open("rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+
+
+def referenced_files(config: AGIPackConfig, target: str, locked: bool = False) -> List[Path]:
+    """Return the files (or directories) referenced by the target's `requirements`, `add` and lockfiles.
+
+    Args:
+        config (AGIPackConfig): AGIPack configuration.
+        target (str): Target image name.
+        locked (bool): Include the target's lockfiles (i.e. for images installed from the lockfiles).
+    Returns:
+        List[Path]: Paths referenced by the target, relative to the build context.
+    """
+    image_config = config.images[target]
+    paths = [Path(filename) for filename in image_config.requirements]
+    paths.extend(Path(item.split(":")[0]) for item in image_config.add)
+    if locked:
+        paths.extend(lockfiles(target).values())
+    return paths
+
+
+def compute_fingerprints(config: AGIPackConfig, stages: Dict[str, str], locked: bool = False) -> Dict[str, str]:
+    """Compute the content-hash fingerprint for every target in the configuration.
+
+    The fingerprint of a target is the hash of its fully resolved configuration,
+    its rendered Dockerfile stage, the contents of its referenced `requirements`
+    and `add` files, and the fingerprint of its parent target. Files of `add` directories
+    that are not in the build context (e.g. the build manifest itself, `.git` or paths
+    excluded by the `.dockerignore`) are not part of the fingerprint.
+
+    Args:
+        config (AGIPackConfig): AGIPack configuration.
+        stages (Dict[str, str]): Rendered Dockerfile stages for each target.
+        locked (bool): Whether the images are installed from the lockfiles (see `referenced_files`).
+    Returns:
+        Dict[str, str]: Dictionary of target image names and their fingerprints.
+    """
+    fingerprints: Dict[str, str] = {}
+    ignore = DockerIgnore.load()
+
+    def fingerprint(target: str) -> str:
+        if target in fingerprints:
+            return fingerprints[target]
+        image_config = config.images[target]
+        digest = hashlib.sha256()
+        digest.update(f"agipack:{__version__}".encode())
+        if image_config.base in config.images:
+            digest.update(f"parent:{fingerprint(image_config.base)}".encode())
+        digest.update(json.dumps(image_config.dict(), sort_keys=True, default=str).encode())
+        digest.update(stages.get(target, "").encode())
+        for path in referenced_files(config, target, locked=locked):
+            _hash_path(path, digest, ignore)
+        fingerprints[target] = digest.hexdigest()
+        return fingerprints[target]
+
+    for target in config.images:
+        fingerprint(target)
+    return fingerprints
+
+
+class BuildManifest:
+    """Persistent on-disk manifest of previously built images.
+
+    The manifest records the fingerprint that each image tag was last built from,
+    so that targets whose fingerprint is unchanged (and whose tags are still
+    present) can be skipped.
+
+    Args:
+        filename (str): Path to the JSON manifest file.
+    """
+
+    def __init__(self, filename: Union[str, Path]):
+        self.filename = Path(filename)
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict] = {}
+        if self.filename.exists():
+            try:
+                with self.filename.open("r") as f:
+                    self.entries = json.load(f).get("images", {})
+            except Exception as e:
+                logger.warning(f"Ignoring corrupt build manifest {self.filename}: {e}")
+
+    def is_fresh(self, fingerprint: str, tags: Iterable[str], exists: Callable[[str], bool]) -> bool:
+        """Check if all the tags were built from the given fingerprint and are still present.
+
+        Args:
+            fingerprint (str): Fingerprint of the target.
+            tags (Iterable[str]): Tags for the Docker image.
+            exists (Callable[[str], bool]): Function that checks if an image tag is present.
+        """
+        tags = list(tags)
+        with self._lock:
+            if not all(self.entries.get(tag, {}).get("fingerprint") == fingerprint for tag in tags):
+                return False
+        return all(exists(tag) for tag in tags)
+
+    def update(self, target: str, fingerprint: str, tags: Iterable[str]) -> None:
+        """Record the tags built for the target, and save the manifest.
+
+        Args:
+            target (str): Target image name.
+            fingerprint (str): Fingerprint of the target.
+            tags (Iterable[str]): Tags for the Docker image.
+        """
+        with self._lock:
+            for tag in tags:
+                self.entries[tag] = {"target": target, "fingerprint": fingerprint, "built_at": time.time()}
+            self._save()
+
+    def _save(self) -> None:
+        """Save the manifest atomically."""
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        tmp_filename = self.filename.with_name(f"{self.filename.name}.tmp")
+        with tmp_filename.open("w") as f:
+            json.dump({"version": __version__, "images": self.entries}, f, indent=2, sort_keys=True)
+        tmp_filename.replace(self.filename)
+
+    def get(self, tag: str) -> Optional[Dict]:
+        """Return the manifest entry for the given tag."""
+        return self.entries.get(tag)
+
+
+class RenderCache:
+    """Persistent on-disk cache of rendered Dockerfile stages.
+
+    Each stage is stored along with the fingerprint of its template context
+    and template version, so that unchanged stages can be re-used without
+    re-rendering the template.
+
+    Args:
+        filename (str): Path to the JSON cache file.
+    """
+
+    def __init__(self, filename: Union[str, Path]):
+        self.filename = Path(filename)
+        self.entries: Dict[str, Dict[str, str]] = {}
+        self._dirty = False
+        if self.filename.exists():
+            try:
+                with self.filename.open("r") as f:
+                    self.entries = json.load(f).get("stages", {})
+            except Exception as e:
+                logger.warning(f"Ignoring corrupt render cache {self.filename}: {e}")
+
+    @staticmethod
+    def fingerprint(context: Dict, template_fingerprint: str) -> str:
+        """Fingerprint of the template context and template version.
+
+        Args:
+            context (Dict): Template context for the stage.
+            template_fingerprint (str): Fingerprint of the template source.
+        """
+        digest = hashlib.sha256(template_fingerprint.encode())
+        digest.update(json.dumps(context, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str, fingerprint: str) -> Optional[str]:
+        """Return the cached stage if its fingerprint matches."""
+        entry = self.entries.get(key)
+        if entry is None or entry.get("fingerprint") != fingerprint:
+            return None
+        return entry.get("content")
+
+    def put(self, key: str, fingerprint: str, content: str) -> None:
+        """Cache the rendered stage."""
+        self.entries[key] = {"fingerprint": fingerprint, "content": content}
+        self._dirty = True
+
+    def save(self) -> None:
+        """Save the cache (only if it was modified)."""
+        if not self._dirty:
+            return
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+        tmp_filename = self.filename.with_name(f"{self.filename.name}.tmp")
+        with tmp_filename.open("w") as f:
+            json.dump({"version": __version__, "stages": self.entries}, f, sort_keys=True)
+        tmp_filename.replace(self.filename)
+        self._dirty = False
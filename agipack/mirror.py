@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from dataclasses import field, replace
+from pathlib import Path
+from typing import List, Optional
+from urllib.request import urlopen
+
+from pydantic.dataclasses import dataclass
+
+from agipack.config import BOOTSTRAP_ARCHS, AGIPackConfig, BootstrapConfig, MirrorConfig
+from agipack.constants import AGIPACK_LOCK_DIR, AGIPACK_MIRROR_DIR
+from agipack.docker import Runner, run_command
+from agipack.lock import lockfiles
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MirrorResult:
+    """Files prefetched into the local mirror."""
+
+    mirrors: MirrorConfig
+    """Mirror configuration to build from the local mirror (see `AGIPackConfig.mirrors`)."""
+
+    installer: Optional[str] = field(default=None)
+    """Path of the conda installer."""
+
+    wheels: List[str] = field(default_factory=list)
+    """Wheels in the local mirror."""
+
+
+class AGIPackMirror:
+    """Prefetches the conda installer and pip packages of the targets into a local mirror.
+
+    The conda installer of the base images (see `BootstrapConfig`) is downloaded into `<mirror_dir>`
+    and verified against its pinned checksum. The pip packages and requirements of each target (and of
+    its ancestors) are downloaded as wheels into `<mirror_dir>/wheels`, for the target's python version
+    and the image platform.
+    apt and conda packages (including the python of the base images) are not prefetched, so builds
+    from the mirror still need a proxy cache or a channel mirror for those (see `MirrorConfig`).
+
+    Usage Example:
+        ```python
+        mirror = AGIPackMirror(config, mirror_dir=".agipack/mirror")
+        result = mirror.mirror()
+        config.mirrors = result.mirrors
+        ```
+
+    Args:
+        config (AGIPackConfig): AGIPack configuration.
+        mirror_dir (str): Directory for the local mirror (relative to the build context).
+        arch (str): Architecture of the images (`x86_64` or `aarch64`).
+        platforms (List[str]): Platform tags to download wheels for (defaults to `manylinux2014_<arch>`).
+        installer_url (str): URL of the conda installer (defaults to the configured installer release).
+        locked (bool): Download the pinned pip packages from the lockfiles (see `agi-pack lock`), if any.
+        lock_dir (str): Directory of the lockfiles.
+        runner (Runner): Function that runs a command and returns the completed process.
+    """
+
+    def __init__(
+        self,
+        config: AGIPackConfig,
+        mirror_dir: str = AGIPACK_MIRROR_DIR,
+        arch: str = "x86_64",
+        platforms: Optional[List[str]] = None,
+        installer_url: Optional[str] = None,
+        locked: bool = False,
+        lock_dir: str = AGIPACK_LOCK_DIR,
+        runner: Runner = run_command,
+    ):
+        if arch not in BOOTSTRAP_ARCHS:
+            raise ValueError(f"Architecture must be one of {BOOTSTRAP_ARCHS} (found {arch})")
+        self.config = config
+        self.mirror_dir = Path(mirror_dir)
+        self.arch = arch
+        self.platforms = platforms or [f"manylinux2014_{arch}"]
+        self.bootstrap = config.bootstrap or BootstrapConfig()
+        self.installer_url = installer_url or self.bootstrap.url(arch)
+        self.locked = locked
+        self.lock_dir = lock_dir
+        self.runner = runner
+
+    @property
+    def index_url(self) -> Optional[str]:
+        """Python package index (or mirror) to download the wheels from."""
+        mirrors = self.config.mirrors
+        return mirrors.pip if mirrors is not None else None
+
+    def fetch_installer(self) -> str:
+        """Download the conda installer (unless already present), verify its checksum, and return its path."""
+        path = self.mirror_dir / self.bootstrap.filename(self.arch)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            logger.info(f"🪞 Downloading conda installer [url={self.installer_url}]")
+            with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as f:
+                try:
+                    with urlopen(self.installer_url) as response:
+                        shutil.copyfileobj(response, f)
+                except Exception as e:
+                    os.remove(f.name)
+                    raise ValueError(f"Failed to download the conda installer (url={self.installer_url}, e={e})")
+            os.replace(f.name, path)
+
+        expected = self.bootstrap.sha256.get(self.arch)
+        if expected is None:
+            logger.warning(f"Conda installer is not pinned to a checksum [filename={path}]")
+            return path.as_posix()
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        if digest.hexdigest() != expected:
+            os.remove(path)
+            raise ValueError(f"Conda installer checksum mismatch (expected={expected}, found={digest.hexdigest()})")
+        return path.as_posix()
+
+    def fetch_wheels(self, packages: List[str], requirements: List[str], python: str, no_deps: bool = False) -> None:
+        """Download the pip packages and requirements files (and their dependencies) as wheels.
+
+        Args:
+            packages (List[str]): Pip package specifiers.
+            requirements (List[str]): Pip requirements files.
+            python (str): Python version of the image.
+            no_deps (bool): Only download the listed packages (e.g. pinned in a lockfile).
+        """
+        wheels = self.mirror_dir / "wheels"
+        wheels.mkdir(parents=True, exist_ok=True)
+        cmd = [sys.executable, "-m", "pip", "download", "--quiet", "--dest", str(wheels), "--only-binary=:all:"]
+        cmd.extend(["--python-version", ".".join(python.split(".")[:2])])
+        for platform in self.platforms:
+            cmd.extend(["--platform", platform])
+        if self.index_url:
+            cmd.extend(["--index-url", self.index_url])
+        if no_deps:
+            cmd.append("--no-deps")
+        for filename in requirements:
+            cmd.extend(["-r", filename])
+        cmd.extend(packages)
+        process = self.runner(cmd)
+        if process.returncode != 0:
+            raise ValueError(f"Failed to download pip packages {packages} (e={process.stderr.strip()})")
+
+    def mirror(self, targets: Optional[List[str]] = None) -> MirrorResult:
+        """Prefetch the files needed to build the targets into the local mirror.
+
+        Args:
+            targets (List[str]): Targets to mirror (defaults to all the targets).
+        Returns:
+            MirrorResult: Prefetched files, and the mirror configuration to build from them.
+        """
+        selected = list(self.config.images.keys()) if targets is None else targets
+        unknown = set(selected) - set(self.config.images.keys())
+        if unknown:
+            raise ValueError(f"Unknown targets {sorted(unknown)}, must be one of {list(self.config.images.keys())}")
+
+        # The base images install conda, and upgrade pip (from the mirror as well)
+        result = MirrorResult(mirrors=MirrorConfig(), installer=self.fetch_installer())
+        for python in dict.fromkeys(self.config.images[target].python for target in selected):
+            self.fetch_wheels(["pip"], [], python)
+        for target in selected:
+            lineage = [*reversed(self.config.ancestors(target)), target]
+            python = self.config.images[target].python
+
+            # Locked builds install the pinned packages of the target and its ancestors (without dependencies)
+            locks = [lockfiles(name, self.lock_dir).get("pip") for name in lineage] if self.locked else []
+            locks = [path.as_posix() for path in locks if path is not None]
+            if locks:
+                self.fetch_wheels([], locks, python, no_deps=True)
+                continue
+            packages = [package for name in lineage for package in self.config.images[name].pip]
+            requirements = [filename for name in lineage for filename in self.config.images[name].requirements]
+            if packages or requirements:
+                logger.info(f"🪞 Downloading pip packages [target={target}, packages={len(packages)}]")
+                self.fetch_wheels(packages, requirements, python)
+
+        wheels = self.mirror_dir / "wheels"
+        result.wheels = sorted(path.name for path in wheels.iterdir()) if wheels.exists() else []
+        result.mirrors = replace(
+            self.config.mirrors or MirrorConfig(), wheels=wheels.as_posix(), installer=result.installer
+        )
+        logger.info(f"🪞 Mirrored {len(result.wheels)} wheels [mirror_dir={self.mirror_dir}]")
+        return result
@@ -0,0 +1,108 @@
+import threading
+import time
+from dataclasses import field
+from typing import Dict, List, Optional
+
+from pydantic.dataclasses import dataclass
+from rich.table import Table
+
+from agipack.report import BuildEvent
+
+
+@dataclass
+class TargetProgress:
+    """Progress of a single target, accumulated from its build events."""
+
+    target: str
+    """Name of the target."""
+
+    status: str = field(default="pending")
+    """Status of the build (one of `pending`, `building`, `skipped`, `done` or `failed`)."""
+
+    step: Optional[str] = field(default=None)
+    """Name (and instruction) of the last step that was started."""
+
+    finished: int = field(default=0)
+    """Number of finished steps (including cached steps)."""
+
+    cached: int = field(default=0)
+    """Number of cached steps."""
+
+    transferred: Dict[int, int] = field(default_factory=dict)
+    """Bytes transferred for each step."""
+
+    started_at: Optional[float] = field(default=None)
+    """Time (monotonic) when the build started."""
+
+    duration: Optional[float] = field(default=None)
+    """Duration (in seconds) of the build, once finished."""
+
+
+STATUS_STYLES = {
+    "pending": "dim",
+    "building": "yellow",
+    "skipped": "green",
+    "done": "bold green",
+    "failed": "bold red",
+}
+"""Rich styles for each build status."""
+
+
+class BuildProgressDisplay:
+    """Live progress display of the targets being built, fed by their build events.
+
+    The display is thread-safe (targets can be built concurrently), and is rendered
+    as a table with one row per target by `rich.live.Live`.
+
+    Usage Example:
+        ```python
+        display = BuildProgressDisplay(["base-cpu", "dev-cpu"])
+        with Live(display):
+            builder.build("Dockerfile", "base-cpu", on_event=display.update)
+        ```
+
+    Args:
+        targets (List[str]): Targets to display (in order).
+    """
+
+    def __init__(self, targets: List[str]):
+        self.targets = {target: TargetProgress(target=target) for target in targets}
+        self._lock = threading.Lock()
+
+    def update(self, event: BuildEvent) -> None:
+        """Update the progress of the event's target."""
+        with self._lock:
+            progress = self.targets.setdefault(event.target, TargetProgress(target=event.target))
+            if event.type == "build_started":
+                progress.status, progress.started_at = "building", time.monotonic()
+            elif event.type == "step_started" and event.step.stage is not None:
+                progress.step = f"[{event.step.name}] {event.step.instruction}"
+            elif event.type in ("step_finished", "step_cached") and event.step.stage is not None:
+                progress.finished += 1
+                progress.cached += int(event.type == "step_cached")
+            elif event.type == "step_progress":
+                progress.transferred[event.step.id] = event.current
+            elif event.type in ("build_finished", "build_skipped", "error"):
+                progress.status = {"build_finished": "done", "build_skipped": "skipped", "error": "failed"}[event.type]
+                progress.duration = time.monotonic() - (progress.started_at or time.monotonic())
+                progress.step = event.message.splitlines()[-1] if event.type == "error" and event.message else None
+
+    def __rich__(self) -> Table:
+        table = Table(box=None, show_edge=False)
+        for column in ["Target", "Status", "Steps", "Cached", "Transferred", "Time", "Step"]:
+            table.add_column(column, no_wrap=True, overflow="ellipsis", max_width=60 if column == "Step" else None)
+        with self._lock:
+            for progress in self.targets.values():
+                elapsed = progress.duration
+                if elapsed is None and progress.started_at is not None:
+                    elapsed = time.monotonic() - progress.started_at
+                table.add_row(
+                    f"[bold white]{progress.target}[/bold white]",
+                    f"[{STATUS_STYLES[progress.status]}]{progress.status}[/{STATUS_STYLES[progress.status]}]",
+                    str(progress.finished),
+                    str(progress.cached),
+                    f"{sum(progress.transferred.values()) / 1e6:.1f} MB",
+                    f"{elapsed:.1f}s" if elapsed is not None else "-",
+                    progress.step or "",
+                )
+        return table
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import field
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pydantic.dataclasses import dataclass
+
+from agipack.aio import limiter
+from agipack.docker import DockerBackend, DockerCLI, DockerError, Runner, run_command
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT_PUSH_ERRORS = (
+    "timeout",
+    "timed out",
+    "connection reset",
+    "connection refused",
+    "broken pipe",
+    "unexpected eof",
+    "tls handshake",
+    "too many requests",
+    "toomanyrequests",
+    "500 internal server error",
+    "502 bad gateway",
+    "503 service unavailable",
+    "504 gateway timeout",
+)
+"""Error messages (lower-case) of `docker push` failures that are worth retrying."""
+
+
+@dataclass
+class PushResult:
+    """Result of pushing a single image tag."""
+
+    tag: str
+    """Image tag that was pushed."""
+
+    image_id: Optional[str] = field(default=None)
+    """Local image ID for the tag."""
+
+    size: int = field(default=0)
+    """Size (in bytes) of the local image (not the bytes uploaded, which skip the layers already in the registry)."""
+
+    status: str = field(default="pending")
+    """Status of the push (one of `success` or `failed`)."""
+
+    attempts: int = field(default=0)
+    """Number of push attempts."""
+
+    started: float = field(default=0.0)
+    """Time (`time.perf_counter`) when the push started."""
+
+    duration: float = field(default=0.0)
+    """Wall time (in seconds) spent pushing the tag, including retries."""
+
+    error: Optional[str] = field(default=None)
+    """Error message if the push failed."""
+
+    def ok(self) -> bool:
+        """Check if the tag was pushed successfully."""
+        return self.status == "success"
+
+
+def push_wall_time(results: Iterable[PushResult]) -> float:
+    """Wall-clock time (in seconds) spent pushing, counting concurrent pushes once."""
+    total, end = 0.0, None
+    for result in sorted(results, key=lambda result: result.started):
+        finished = result.started + result.duration
+        if end is None or result.started >= end:
+            total += result.duration
+            end = finished
+        elif finished > end:
+            total += finished - end
+            end = finished
+    return total
+
+
+class AGIPackPusher:
+    """Concurrent push engine for Docker image tags.
+
+    Tags are de-duplicated and grouped by (repository, image ID): tags within a group
+    are pushed sequentially so that the image layers are only uploaded once, while
+    the groups themselves are pushed concurrently, bounded by `jobs`. Transient
+    failures (timeouts, connection resets, 5xx / 429 responses) are retried with
+    exponential backoff.
+
+    Note that different images can share layers (e.g. a child and its parent target), and
+    concurrent groups may upload the same base layers at the same time. The registry keeps a
+    single copy, but the bandwidth is spent twice. Push the parents first (e.g. as the targets
+    are built) to avoid it.
+
+    Args:
+        jobs (int): Maximum number of concurrent pushes.
+        retries (int): Maximum number of retries for transient failures.
+        backoff (float): Initial backoff (in seconds) between retries, doubled on every retry.
+        runner (Runner): Function that runs a docker command and returns the completed process
+            (used by the default `docker` CLI backend).
+        sleep (Callable[[float], None]): Function used to sleep between retries.
+        asleep (Callable[[float], Awaitable[None]]): Coroutine function used to sleep between retries by `apush`.
+        backend (DockerBackend): Docker backend used to inspect and push the images (defaults to the CLI).
+    """
+
+    def __init__(
+        self,
+        jobs: int = 4,
+        retries: int = 3,
+        backoff: float = 1.0,
+        runner: Runner = run_command,
+        sleep: Callable[[float], None] = time.sleep,
+        backend: Optional[DockerBackend] = None,
+        asleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        if jobs < 1:
+            raise ValueError(f"Number of jobs must be >= 1 (found {jobs})")
+        self.jobs = jobs
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.asleep = asleep
+        self.backend = backend or DockerCLI(runner=runner)
+
+    @staticmethod
+    def repository(tag: str) -> str:
+        """Return the repository for the tag (i.e. the tag without the `:<tag>` / `@<digest>` suffix)."""
+        name = tag.split("@")[0]
+        if ":" in name.rsplit("/", 1)[-1]:
+            name = name.rsplit(":", 1)[0]
+        return name
+
+    @staticmethod
+    def is_transient(error: str) -> bool:
+        """Check if the push error is transient, and worth retrying."""
+        error = error.lower()
+        return any(pattern in error for pattern in TRANSIENT_PUSH_ERRORS)
+
+    def inspect(self, tag: str) -> Tuple[Optional[str], int]:
+        """Return the local image ID and size (in bytes) for the tag."""
+        return self.backend.inspect(tag)
+
+    def _retry_delay(self, result: PushResult) -> Optional[float]:
+        """Return the backoff (in seconds) before retrying a failed push, or None if it should not be retried."""
+        if result.attempts > self.retries or not self.is_transient(result.error):
+            logger.error(f"Failed to push image [tag={result.tag}, attempts={result.attempts}, e={result.error}]")
+            return None
+        delay = self.backoff * 2 ** (result.attempts - 1)
+        logger.warning(
+            f"Retrying push in {delay:.1f}s [tag={result.tag}, attempt={result.attempts}, e={result.error}]"
+        )
+        return delay
+
+    def _push_one(self, result: PushResult) -> PushResult:
+        """Push a single tag, retrying on transient failures."""
+        tag = result.tag
+        start = result.started = time.perf_counter()
+        while True:
+            result.attempts += 1
+            try:
+                self.backend.push(tag)
+            except DockerError as e:
+                result.status, result.error = "failed", str(e)
+            else:
+                result.status, result.error = "success", None
+                break
+            delay = self._retry_delay(result)
+            if delay is None:
+                break
+            self.sleep(delay)
+        result.duration = time.perf_counter() - start
+        logger.info(f"🚀 Pushed image [tag={tag}, status={result.status}, duration={result.duration:.2f}s]")
+        return result
+
+    async def _apush_one(self, result: PushResult) -> PushResult:
+        """Async counterpart of `_push_one`."""
+        tag = result.tag
+        start = result.started = time.perf_counter()
+        while True:
+            result.attempts += 1
+            try:
+                await self.backend.apush(tag)
+            except DockerError as e:
+                result.status, result.error = "failed", str(e)
+            else:
+                result.status, result.error = "success", None
+                break
+            delay = self._retry_delay(result)
+            if delay is None:
+                break
+            await self.asleep(delay)
+        result.duration = time.perf_counter() - start
+        logger.info(f"🚀 Pushed image [tag={tag}, status={result.status}, duration={result.duration:.2f}s]")
+        return result
+
+    def _push_group(self, group: List[PushResult]) -> List[PushResult]:
+        """Push a group of tags (for the same repository and image) sequentially."""
+        return [self._push_one(result) for result in group]
+
+    def _group(
+        self, tags: List[str], images: List[Tuple[Optional[str], int]]
+    ) -> Dict[Tuple[str, str], List[PushResult]]:
+        """Group the tags by (repository, image ID), given the local image ID and size of each tag."""
+        groups: Dict[Tuple[str, str], List[PushResult]] = {}
+        for tag, (image_id, size) in zip(tags, images):
+            result = PushResult(tag=tag, image_id=image_id, size=size)
+            groups.setdefault((self.repository(tag), image_id or tag), []).append(result)
+        logger.info(f"🚀 Pushing {len(tags)} tags in {len(groups)} groups [jobs={self.jobs}]")
+        return groups
+
+    def push(self, tags: List[str]) -> Dict[str, PushResult]:
+        """Push the image tags concurrently.
+
+        Args:
+            tags (List[str]): Tags for the Docker images.
+        Returns:
+            Dict[str, PushResult]: Push results for each (de-duplicated) tag, in the order provided.
+        """
+        tags = list(dict.fromkeys(tags))
+        groups = self._group(tags, [self.inspect(tag) for tag in tags])
+
+        results: Dict[str, PushResult] = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            for group_results in executor.map(self._push_group, groups.values()):
+                for result in group_results:
+                    results[result.tag] = result
+        return {tag: results[tag] for tag in tags}
+
+    async def apush(self, tags: List[str]) -> Dict[str, PushResult]:
+        """Push the image tags concurrently, on the running event loop.
+
+        On top of `jobs`, pushes are bounded by the `push` limiter shared by all the pushers
+        (and AGIPack instances) on the event loop (see `agipack.aio.set_concurrency`).
+        Cancelling `apush` cancels the in-flight pushes.
+
+        Args:
+            tags (List[str]): Tags for the Docker images.
+        Returns:
+            Dict[str, PushResult]: Push results for each (de-duplicated) tag, in the order provided.
+        """
+        tags = list(dict.fromkeys(tags))
+        images = await asyncio.gather(*(self.backend.ainspect(tag) for tag in tags))
+        groups = self._group(tags, list(images))
+        jobs = asyncio.Semaphore(self.jobs)
+
+        async def push_group(group: List[PushResult]) -> None:
+            for result in group:
+                async with jobs, limiter("push"):
+                    await self._apush_one(result)
+
+        await asyncio.gather(*(push_group(group) for group in groups.values()))
+        results = {result.tag: result for group in groups.values() for result in group}
+        return {tag: results[tag] for tag in tags}
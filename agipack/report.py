@@ -0,0 +1,347 @@
+import json
+import logging
+import re
+from dataclasses import asdict, field, replace
+from typing import Dict, Iterable, List, Optional
+
+from pydantic.dataclasses import dataclass
+
+from agipack.config import ImageConfig
+
+logger = logging.getLogger(__name__)
+
+_STEP_RE = re.compile(r"^#(?P<id>\d+) \[(?P<name>[^\]]+)\] (?P<instruction>.*)$")
+_DONE_RE = re.compile(r"^#(?P<id>\d+) DONE (?P<duration>[\d.]+)s$")
+_CACHED_RE = re.compile(r"^#(?P<id>\d+) CACHED$")
+_ERROR_RE = re.compile(r"^#(?P<id>\d+) (?:ERROR|CANCELED)\b(?P<error>.*)$")
+_PROGRESS_RE = re.compile(
+    r"^#(?P<id>\d+) (?:transferring [\w ]+: |sha256:[0-9a-f]+ )"
+    r"(?P<current>[\d.]+[kMGT]?B)(?: / (?P<total>[\d.]+[kMGT]?B))?"
+)
+_ID_RE = re.compile(r"^#(?P<id>\d+) ")
+_PIP_UPGRADE_RE = re.compile(r"pip install\b[^&]* --upgrade pip\b")
+_SIZE_UNITS = {"B": 1, "kB": 1e3, "MB": 1e6, "GB": 1e9, "TB": 1e12}
+
+FIELDS = ["base", "system", "python", "conda", "pip", "requirements", "workdir", "add", "run", "env", "other"]
+"""ImageConfig fields (and pseudo-fields) that build steps are attributed to."""
+
+STEP_MARKERS = {
+    "pip requirements install complete": "requirements",
+    "python install complete": "python",
+    "pip upgrade complete": "python",
+    "conda/mamba install complete": "conda",
+    "pip install complete": "pip",
+    "system install complete": "system",
+    "running commands": "run",
+    "run commands complete": "run",
+}
+"""Markers echoed by the `RUN` steps of the Dockerfile template, and the ImageConfig fields they belong to."""
+
+
+@dataclass
+class BuildStep:
+    """A single BuildKit build step, parsed from the `--progress=plain` output."""
+
+    id: int
+    """BuildKit vertex ID (`#<id>`)."""
+
+    name: str
+    """Step name (e.g. `base-cpu 3/12` or `internal`)."""
+
+    instruction: str
+    """Dockerfile instruction for the step."""
+
+    stage: Optional[str] = field(default=None)
+    """Dockerfile stage / target that the step belongs to."""
+
+    config_field: str = field(default="other")
+    """ImageConfig field that produced the step."""
+
+    cached: bool = field(default=False)
+    """Whether the step was a cache hit."""
+
+    duration: float = field(default=0.0)
+    """Duration (in seconds) of the step."""
+
+    status: str = field(default="running")
+    """Status of the step (one of `running`, `done`, `cached` or `error`)."""
+
+
+def parse_size(size: str) -> int:
+    """Parse a (decimal) human-readable size printed by BuildKit (e.g. `3.12kB`) into bytes."""
+    match = re.match(r"^(?P<value>[\d.]+)(?P<unit>[kMGT]?B)$", size)
+    if match is None:
+        raise ValueError(f"Invalid size {size}")
+    return int(float(match.group("value")) * _SIZE_UNITS[match.group("unit")])
+
+
+def format_size(size: int) -> str:
+    """Format a size in bytes as a (binary) human-readable size (e.g. `1.2 GB`)."""
+    value = float(size)
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if value < 1024 or unit == "TB":
+            break
+        value /= 1024
+    return f"{size} B" if unit == "B" else f"{value:.1f} {unit}"
+
+
+@dataclass
+class BuildEvent:
+    """Structured event streamed while building a target (see `AGIPack.build_events`)."""
+
+    type: str
+    """Type of the event (one of `build_started`, `step_started`, `step_cached`, `step_progress`,
+    `step_finished`, `step_error`, `log`, `build_finished` or `error`)."""
+
+    target: str
+    """Name of the target being built."""
+
+    step: Optional[BuildStep] = field(default=None)
+    """Snapshot of the build step the event belongs to (if any)."""
+
+    current: int = field(default=0)
+    """Bytes transferred so far (for `step_progress` events)."""
+
+    total: int = field(default=0)
+    """Total bytes to transfer, if known (for `step_progress` events)."""
+
+    duration: float = field(default=0.0)
+    """Duration (in seconds) of the step (`step_finished`) or of the build (`build_finished` / `error`)."""
+
+    message: Optional[str] = field(default=None)
+    """Line of build output, or the error message (for `error` events)."""
+
+    tail: List[str] = field(default_factory=list)
+    """Last lines of build output (for `error` events)."""
+
+
+def attribute_step(instruction: str, image_config: Optional[ImageConfig] = None) -> str:
+    """Map a Dockerfile instruction back to the ImageConfig field that produced it.
+
+    `RUN` steps are matched on the markers they echo (see `STEP_MARKERS`), so that they are attributed
+    regardless of the installer, mirrors or options rendered into the commands. Steps without a marker
+    (e.g. from Dockerfiles rendered by older versions) fall back to matching the commands.
+
+    Args:
+        instruction (str): Dockerfile instruction (as printed by BuildKit).
+        image_config (ImageConfig): Image configuration for the stage (used to match `run` and `add` entries).
+    Returns:
+        str: ImageConfig field (one of `FIELDS`).
+    """
+    if image_config is not None:
+        if any(cmd and cmd in instruction for cmd in image_config.run):
+            return "run"
+        if instruction.startswith(("ADD ", "COPY ")) and any(
+            item.split(":")[0] in instruction for item in image_config.add
+        ):
+            return "add"
+    for marker, config_field in STEP_MARKERS.items():
+        if marker in instruction:
+            return config_field
+    if instruction.startswith("FROM"):
+        return "base"
+    if "/tmp/reqs" in instruction or "pip install -r" in instruction:
+        return "requirements"
+    if "miniconda" in instruction.lower() or "micromamba" in instruction or _PIP_UPGRADE_RE.search(instruction):
+        return "python"
+    if "mamba install" in instruction:
+        return "conda"
+    if "pip install" in instruction:
+        return "pip"
+    if "apt-get" in instruction:
+        return "system"
+    if instruction.startswith("WORKDIR"):
+        return "workdir"
+    if instruction.startswith(("ADD ", "COPY ")):
+        return "add"
+    if instruction.startswith("ENV"):
+        return "env"
+    return "other"
+
+
+class BuildProgressParser:
+    """Incremental parser for BuildKit's `--progress=plain` output.
+
+    Args:
+        image_configs (Dict[str, ImageConfig]): Image configurations for each stage / target.
+    """
+
+    def __init__(self, image_configs: Optional[Dict[str, ImageConfig]] = None):
+        self.image_configs = image_configs or {}
+        self.steps: Dict[int, BuildStep] = {}
+        self.offset = 0
+
+    def restart(self) -> None:
+        """Continue with the output of another build (e.g. the slim runtime stage after its build stage).
+
+        Step ids start over in every build, so the ids of the next build are offset past the parsed steps.
+        """
+        self.offset = max(self.steps, default=0)
+
+    def feed(self, line: str) -> Optional[BuildStep]:
+        """Parse a single line of progress output.
+
+        Args:
+            line (str): Line of `--progress=plain` output.
+        Returns:
+            Optional[BuildStep]: The step updated by the line (if any).
+        """
+        line = line.rstrip("\n")
+        match = _STEP_RE.match(line)
+        if match:
+            step_id, name = int(match.group("id")) + self.offset, match.group("name")
+            if step_id in self.steps:
+                return self.steps[step_id]
+            stage = name.split(" ")[0] if name != "internal" else None
+            instruction = match.group("instruction")
+            step = BuildStep(
+                id=step_id,
+                name=name,
+                instruction=instruction,
+                stage=stage,
+                config_field=attribute_step(instruction, self.image_configs.get(stage)),
+            )
+            self.steps[step_id] = step
+            return step
+        for regex, status in [(_DONE_RE, "done"), (_CACHED_RE, "cached"), (_ERROR_RE, "error")]:
+            match = regex.match(line)
+            if match and int(match.group("id")) + self.offset in self.steps:
+                step = self.steps[int(match.group("id")) + self.offset]
+                step.status = status
+                step.cached = status == "cached"
+                if status == "done":
+                    step.duration = float(match.group("duration"))
+                return step
+        return None
+
+    def event(self, line: str, target: str) -> BuildEvent:
+        """Parse a single line of progress output into a structured build event.
+
+        Args:
+            line (str): Line of `--progress=plain` output.
+            target (str): Name of the target being built.
+        Returns:
+            BuildEvent: Event for the line (a `log` event if it does not change any step).
+        """
+        line = line.rstrip("\n")
+        match = _ID_RE.match(line)
+        previous = self.steps.get(int(match.group("id")) + self.offset) if match else None
+        status = previous.status if previous is not None else None
+
+        progress = _PROGRESS_RE.match(line) if previous is not None else None
+        if progress:
+            total = parse_size(progress.group("total")) if progress.group("total") else 0
+            current = parse_size(progress.group("current"))
+            return BuildEvent(
+                type="step_progress", target=target, step=replace(previous), current=current, total=total, message=line
+            )
+
+        step = self.feed(line)
+        if step is None or (previous is not None and step.status == status):
+            return BuildEvent(type="log", target=target, step=replace(step) if step else None, message=line)
+        if previous is None:
+            event_type = "step_started"
+        else:
+            event_type = {"done": "step_finished", "cached": "step_cached", "error": "step_error"}[step.status]
+        return BuildEvent(type=event_type, target=target, step=replace(step), duration=step.duration, message=line)
+
+    def parse(self, lines: Iterable[str]) -> List[BuildStep]:
+        """Parse all the lines of progress output, and return the parsed steps."""
+        for line in lines:
+            self.feed(line)
+        return list(self.steps.values())
+
+
+@dataclass
+class BuildReport:
+    """Per-target build timing report."""
+
+    target: str
+    """Name of the target."""
+
+    steps: List[BuildStep] = field(default_factory=list)
+    """Build steps (excluding BuildKit internal steps)."""
+
+    wall_time: float = field(default=0.0)
+    """Wall time (in seconds) of the build."""
+
+    image_size: int = field(default=0)
+    """Size (in bytes) of the built image."""
+
+    build_stage_size: int = field(default=0)
+    """Size (in bytes) of the `<target>-build` stage, for images with a slim runtime stage."""
+
+    @classmethod
+    def from_steps(cls, target: str, steps: Iterable[BuildStep], wall_time: float = 0.0) -> "BuildReport":
+        """Create a report from the parsed steps, dropping BuildKit internal steps and the steps repeated
+        by a later build (e.g. the build stage re-used from the cache by the slim runtime stage)."""
+        unique: Dict[str, BuildStep] = {}
+        for step in steps:
+            if step.stage is not None:
+                unique.setdefault(step.name, step)
+        return cls(target=target, steps=list(unique.values()), wall_time=wall_time)
+
+    @property
+    def total_duration(self) -> float:
+        """Sum of the durations of all the steps."""
+        return sum(step.duration for step in self.steps)
+
+    def size_summary(self) -> str:
+        """Human-readable image size, compared to the build stage for slim images."""
+        if not self.build_stage_size:
+            return format_size(self.image_size)
+        saved = 100.0 * (self.build_stage_size - self.image_size) / self.build_stage_size
+        return f"{format_size(self.image_size)} (build stage: {format_size(self.build_stage_size)}, -{saved:.0f}%)"
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Duration, share of the build and cache hits, aggregated by ImageConfig field."""
+        total = self.total_duration
+        summary: Dict[str, Dict[str, float]] = {}
+        for step in self.steps:
+            entry = summary.setdefault(step.config_field, {"duration": 0.0, "percent": 0.0, "steps": 0, "cached": 0})
+            entry["duration"] += step.duration
+            entry["steps"] += 1
+            entry["cached"] += int(step.cached)
+        for entry in summary.values():
+            entry["percent"] = 100.0 * entry["duration"] / total if total > 0 else 0.0
+        return dict(sorted(summary.items(), key=lambda item: -item[1]["duration"]))
+
+    def to_json(self) -> str:
+        """JSON representation of the report."""
+        return json.dumps(
+            {
+                "target": self.target,
+                "wall_time": self.wall_time,
+                "total_duration": self.total_duration,
+                "image_size": self.image_size,
+                "build_stage_size": self.build_stage_size,
+                "summary": self.summary(),
+                "steps": [asdict(step) for step in self.steps],
+            },
+            indent=2,
+        )
+
+    def to_markdown(self) -> str:
+        """Markdown representation of the report."""
+        lines = [
+            f"# Build report: `{self.target}`",
+            "",
+            f"Wall time: {self.wall_time:.1f}s, total step time: {self.total_duration:.1f}s",
+            "",
+        ]
+        if self.image_size:
+            lines.extend([f"Image size: {self.size_summary()}", ""])
+        lines.extend(["| Field | Time (s) | Share | Steps | Cached |", "|---|---:|---:|---:|---:|"])
+        for name, entry in self.summary().items():
+            lines.append(
+                f"| {name} | {entry['duration']:.1f} | {entry['percent']:.0f}% | {entry['steps']} | {entry['cached']} |"
+            )
+        lines.extend(["", "| Step | Field | Time (s) | Cached | Instruction |", "|---|---|---:|---|---|"])
+        for step in sorted(self.steps, key=lambda step: -step.duration):
+            instruction = step.instruction.replace("|", "\\|")
+            if len(instruction) > 80:
+                instruction = instruction[:77] + "..."
+            lines.append(
+                f"| {step.name} | {step.config_field} | {step.duration:.1f} | {'yes' if step.cached else 'no'} | `{instruction}` |"
+            )
+        return "\n".join(lines) + "\n"
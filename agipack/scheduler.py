@@ -0,0 +1,133 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import field
+from typing import Callable, Dict, Iterable, List, Optional
+
+from pydantic.dataclasses import dataclass
+
+from agipack.config import AGIPackConfig
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BuildResult:
+    """Result of a scheduled build for a single target."""
+
+    target: str
+    """Name of the target."""
+
+    status: str = field(default="pending")
+    """Status of the build (one of `success`, `cached`, `failed`, `skipped` or `cancelled`)."""
+
+    duration: float = field(default=0.0)
+    """Wall time (in seconds) spent building the target."""
+
+    error: Optional[str] = field(default=None)
+    """Error message if the build failed."""
+
+    def ok(self) -> bool:
+        """Check if the target was built successfully."""
+        return self.status in ("success", "cached")
+
+
+class AGIPackScheduler:
+    """DAG-scheduler for building the targets in an AGIPack configuration.
+
+    The scheduler walks the target tree from the roots, building each parent
+    before its children. Once a parent has been built, its children are
+    independent of each other and are built concurrently, bounded by `jobs`.
+
+    Usage Example:
+        ```python
+        scheduler = AGIPackScheduler(config, jobs=4)
+        results = scheduler.run(lambda target: builder.build(filename, target))
+        ```
+
+    Args:
+        config (AGIPackConfig): AGIPack configuration.
+        jobs (int): Maximum number of concurrent builds.
+        fail_fast (bool): Stop scheduling new builds after the first failure.
+    """
+
+    def __init__(self, config: AGIPackConfig, jobs: int = 1, fail_fast: bool = True):
+        if jobs < 1:
+            raise ValueError(f"Number of jobs must be >= 1 (found {jobs})")
+        self.config = config
+        self.jobs = jobs
+        self.fail_fast = fail_fast
+
+    def _build_one(self, build_fn: Callable[[str], Optional[bool]], target: str) -> BuildResult:
+        """Build a single target, and time it."""
+        start = time.perf_counter()
+        try:
+            built = build_fn(target)
+        except Exception as e:
+            logger.error(f"Failed to build target [{target}]: {e}")
+            return BuildResult(target=target, status="failed", duration=time.perf_counter() - start, error=str(e))
+        status = "cached" if built is False else "success"
+        return BuildResult(target=target, status=status, duration=time.perf_counter() - start)
+
+    def run(
+        self, build_fn: Callable[[str], Optional[bool]], targets: Optional[Iterable[str]] = None
+    ) -> Dict[str, BuildResult]:
+        """Build the targets in dependency order.
+
+        Args:
+            build_fn (Callable[[str], Optional[bool]]): Function that builds the given target,
+                raising an exception on failure. Returning False marks the target as `cached`.
+            targets (Iterable[str]): Targets to build (defaults to all targets).
+                Targets that are not selected are traversed, but not built.
+        Returns:
+            Dict[str, BuildResult]: Build results for the selected targets, in completion order.
+        """
+        selected = set(self.config.images.keys()) if targets is None else set(targets)
+        unknown = selected - set(self.config.images.keys())
+        if unknown:
+            raise ValueError(f"Unknown targets {sorted(unknown)}, must be one of {list(self.config.images.keys())}")
+
+        results: Dict[str, BuildResult] = {}
+        ready: List[str] = list(self.config.roots())
+        running: Dict[Future, str] = {}
+        stopped = False
+
+        logger.info(f"🚀 Scheduling {len(selected)} builds [jobs={self.jobs}, fail_fast={self.fail_fast}]")
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while ready or running:
+                # Submit the ready targets (up to `jobs`), passing through the ones that are not selected
+                while ready and not stopped and len(running) < self.jobs:
+                    target = ready.pop(0)
+                    if target not in selected:
+                        ready.extend(self.config.children(target))
+                        continue
+                    logger.debug(f"Submitting build for target [{target}]")
+                    running[executor.submit(self._build_one, build_fn, target)] = target
+                if not running:
+                    break
+
+                # Wait for any of the running builds to complete
+                done, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    target = running.pop(future)
+                    result = future.result()
+                    results[target] = result
+                    logger.info(f"📦 Built target [{target}, status={result.status}, duration={result.duration:.2f}s]")
+                    if result.ok():
+                        ready.extend(self.config.children(target))
+                        continue
+
+                    # Skip all the descendants of the failed target
+                    for child in self.config.descendants(target):
+                        if child in selected:
+                            results[child] = BuildResult(
+                                target=child, status="skipped", error=f"Parent target [{target}] failed"
+                            )
+                    if self.fail_fast:
+                        stopped = True
+
+        # Mark all the targets that were never scheduled as cancelled
+        for target in self.config.images.keys():
+            if target in selected and target not in results:
+                results[target] = BuildResult(target=target, status="cancelled")
+        return results
@@ -0,0 +1,172 @@
+import logging
+import time
+from dataclasses import field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from pydantic.dataclasses import dataclass
+
+from agipack.builder import AGIPack
+from agipack.config import AGIPackConfig
+from agipack.docker import DockerBackend
+from agipack.manifest import compute_fingerprints, referenced_files
+
+logger = logging.getLogger(__name__)
+
+Snapshot = Dict[str, Tuple[int, int]]
+"""Modification time (ns) and size of each watched file."""
+
+
+@dataclass
+class WatchEvent:
+    """Result of re-rendering the Dockerfiles after a change."""
+
+    changed: List[str] = field(default_factory=list)
+    """Watched files that changed."""
+
+    affected: List[str] = field(default_factory=list)
+    """Targets affected by the change (including descendants), in render order."""
+
+    dockerfiles: Dict[str, str] = field(default_factory=dict)
+    """Dictionary of targets and their Dockerfile paths."""
+
+    latency: float = field(default=0.0)
+    """Time (in seconds) from detecting the change to the Dockerfiles being re-rendered."""
+
+    error: Optional[str] = field(default=None)
+    """Error message if the configuration could not be re-loaded / rendered."""
+
+
+def snapshot(paths: List[Path]) -> Snapshot:
+    """Snapshot the modification time and size of the files (or all the files in the directories)."""
+    state: Snapshot = {}
+    for path in paths:
+        if not path.exists():
+            continue
+        files = [path] if path.is_file() else sorted(p for p in path.rglob("*") if p.is_file())
+        for p in files:
+            stat = p.stat()
+            state[str(p)] = (stat.st_mtime_ns, stat.st_size)
+    return state
+
+
+class AGIPackWatcher:
+    """Watches a configuration and its referenced files, re-rendering the Dockerfiles on change.
+
+    Files are polled every `interval` seconds. Once a change is detected, the
+    watcher waits until the files have been quiet for `debounce` seconds (so
+    that a burst of edits triggers a single reload), then re-loads the
+    configuration and re-renders the Dockerfiles incrementally. Only the
+    targets whose content fingerprint changed (and their descendants) are
+    reported as affected.
+
+    Usage Example:
+        ```python
+        watcher = AGIPackWatcher("agibuild.yaml", filename="Dockerfile")
+        watcher.run(lambda event: print(event.affected, event.latency))
+        ```
+
+    Args:
+        config_filename (str): Path to the YAML configuration file.
+        interval (float): Polling interval (in seconds).
+        debounce (float): Quiet period (in seconds) to wait for after a change.
+        loader (Callable[[str], AGIPackConfig]): Function that loads the configuration.
+        backend (DockerBackend): Docker backend of the rendering builder (see `builder`).
+        render_kwargs: Optional arguments for the render process, see AGIPackRenderOptions for details.
+    """
+
+    def __init__(
+        self,
+        config_filename: Union[str, Path],
+        interval: float = 0.5,
+        debounce: float = 0.3,
+        loader: Callable[[str], AGIPackConfig] = AGIPackConfig.load_yaml,
+        backend: Optional[DockerBackend] = None,
+        **render_kwargs,
+    ):
+        self.config_filename = str(config_filename)
+        self.interval = interval
+        self.debounce = debounce
+        self.loader = loader
+        self.backend = backend
+        self.render_kwargs = {**render_kwargs, "incremental": True}
+        self.locked = bool(render_kwargs.get("locked", False))
+        self.config: Optional[AGIPackConfig] = None
+        self.builder: Optional[AGIPack] = None
+        """Builder of the last successful render (with its rendered stages, to build the affected targets)."""
+        self.fingerprints: Dict[str, str] = {}
+        self.state: Snapshot = {}
+
+    def watched_files(self) -> List[Path]:
+        """Return the configuration file, and the `requirements` / `add` paths (and lockfiles) of all the targets."""
+        paths = [Path(self.config_filename)]
+        if self.config is not None:
+            for target in self.config.images:
+                paths.extend(referenced_files(self.config, target, locked=self.locked))
+        return list(dict.fromkeys(paths))
+
+    def changed_files(self, state: Optional[Snapshot] = None) -> List[str]:
+        """Return the watched files that changed since the last render."""
+        state = snapshot(self.watched_files()) if state is None else state
+        return sorted(path for path in set(state) | set(self.state) if state.get(path) != self.state.get(path))
+
+    def render(self, changed: Optional[List[str]] = None) -> WatchEvent:
+        """Re-load the configuration and re-render the Dockerfiles incrementally."""
+        start = time.perf_counter()
+        event = WatchEvent(changed=changed or [])
+        try:
+            config = self.loader(self.config_filename)
+            builder = AGIPack(config, backend=self.backend)
+            event.dockerfiles = builder.render(**self.render_kwargs)
+        except Exception as e:
+            event.error = str(e)
+            logger.error(f"Failed to re-render Dockerfiles [config={self.config_filename}, e={e}]")
+        else:
+            fingerprints = compute_fingerprints(config, {}, locked=self.locked)
+            event.affected = [
+                target for target in event.dockerfiles if self.fingerprints.get(target) != fingerprints[target]
+            ]
+            self.config, self.builder, self.fingerprints = config, builder, fingerprints
+        self.state = snapshot(self.watched_files())
+        event.latency = time.perf_counter() - start
+        return event
+
+    def wait(self, timeout: Optional[float] = None) -> List[str]:
+        """Block until the watched files change and then settle for `debounce` seconds.
+
+        Args:
+            timeout (float): Maximum time (in seconds) to wait for a change.
+        Returns:
+            List[str]: Watched files that changed (empty if timed out).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pending: Optional[Snapshot] = None
+        last_change = time.monotonic()
+        while True:
+            state = snapshot(self.watched_files())
+            if state == self.state:
+                # No changes (or the changes were reverted)
+                pending = None
+                if deadline is not None and time.monotonic() >= deadline:
+                    return []
+            elif state != pending:
+                # New change (or another edit in the same burst), restart the debounce period
+                pending, last_change = state, time.monotonic()
+            elif time.monotonic() - last_change >= self.debounce:
+                return self.changed_files(state)
+            time.sleep(self.interval if pending is None else min(self.interval, self.debounce))
+
+    def run(self, callback: Callable[[WatchEvent], None], max_events: Optional[int] = None) -> None:
+        """Render the Dockerfiles, and re-render them on every change until interrupted.
+
+        Args:
+            callback (Callable[[WatchEvent], None]): Function called with every (re-)render.
+            max_events (int): Maximum number of re-renders (runs forever if not set).
+        """
+        callback(self.render())
+        count = 0
+        while max_events is None or count < max_events:
+            changed = self.wait()
+            logger.info(f"👀 Detected changes [files={changed}]")
+            callback(self.render(changed))
+            count += 1
@@ -0,0 +1,249 @@
+"""Benchmarks for config loading, validation, tree building and rendering at scale.
+
+Usage:
+    python tests/benchmark.py                                    # run all the cases
+    python tests/benchmark.py --cases deep-100 wide-500          # run selected cases
+    python tests/benchmark.py --output baseline.json             # save the results
+    python tests/benchmark.py --compare baseline.json            # fail on regressions (> 20% slower)
+    python tests/benchmark.py --startup                          # CLI startup time of short commands
+"""
+import argparse
+import gc
+import json
+import logging
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agipack.builder import AGIPack  # noqa: E402
+from agipack.config import AGIPackConfig  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+METRICS = ["load", "validate", "tree", "render"]
+"""Timed stages of the benchmark (in seconds)."""
+
+STARTUP_COMMANDS = [["version"], ["--help"]]
+"""Short CLI commands whose startup time is benchmarked."""
+
+
+@dataclass
+class BenchmarkCase:
+    """Synthetic AGIPack configuration to benchmark."""
+
+    name: str
+    """Name of the case (e.g. `deep-100`)."""
+
+    shape: str
+    """Shape of the target tree (one of `deep` or `wide`)."""
+
+    targets: int
+    """Number of targets in the config."""
+
+    packages: int
+    """Number of pip / conda packages per target."""
+
+
+@dataclass
+class BenchmarkResult:
+    """Timings (best of `repeat`) and peak memory of a benchmark case."""
+
+    name: str
+    targets: int
+    packages: int
+    timings: Dict[str, float] = field(default_factory=dict)
+    peak_memory_mb: float = 0.0
+
+
+CASES = [
+    BenchmarkCase("deep-10", "deep", 10, 10),
+    BenchmarkCase("wide-10", "wide", 10, 10),
+    BenchmarkCase("deep-100", "deep", 100, 20),
+    BenchmarkCase("wide-100", "wide", 100, 20),
+    BenchmarkCase("deep-500", "deep", 500, 10),
+    BenchmarkCase("wide-500", "wide", 500, 10),
+]
+"""Default benchmark cases: deep chains and wide fans of targets at several sizes."""
+
+
+def synthetic_config(shape: str, targets: int, packages: int) -> Dict[str, Any]:
+    """Generate a synthetic `agibuild.yaml` configuration.
+
+    Args:
+        shape (str): `deep` for a single chain of targets (each target is the base of
+            the next), or `wide` for a single base with all other targets as its children.
+        targets (int): Number of targets.
+        packages (int): Number of pip / conda packages per target.
+    Returns:
+        Dict[str, Any]: Configuration that can be dumped to YAML / loaded with `AGIPackConfig`.
+    """
+    if shape not in ("deep", "wide"):
+        raise ValueError(f"Shape must be one of `deep` or `wide` (found {shape})")
+    images: Dict[str, Dict[str, Any]] = {}
+    for idx in range(targets):
+        target = f"target-{idx:04d}"
+        config: Dict[str, Any] = {
+            "image": f"agipack-benchmark:{target}",
+            "env": {f"ENV_{idx}_{key}": str(key) for key in range(3)},
+            "pip": [f"package-{idx}-{pkg}=={pkg}.0" for pkg in range(packages)],
+            "run": [f"echo {target}"],
+        }
+        if idx == 0:
+            config.update(
+                {
+                    "base": "debian:buster-slim",
+                    "python": "3.8.10",
+                    "system": [f"system-{pkg}" for pkg in range(packages)],
+                    "conda": [f"conda-{pkg}" for pkg in range(packages)],
+                }
+            )
+        else:
+            config["base"] = f"target-{idx - 1:04d}" if shape == "deep" else "target-0000"
+        images[target] = config
+    return {"images": images}
+
+
+def _best_of(fn: Callable[[], Any], repeat: int) -> float:
+    """Best wall time (in seconds) of `repeat` calls."""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_case(case: BenchmarkCase, repeat: int = 3) -> BenchmarkResult:
+    """Benchmark loading, validating, building the target tree and rendering a synthetic config."""
+    data = synthetic_config(case.shape, case.targets, case.packages)
+    result = BenchmarkResult(name=case.name, targets=case.targets, packages=case.packages)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = Path(tmp_dir) / "agibuild.yaml"
+        with filename.open("w") as f:
+            yaml.safe_dump(data, f, sort_keys=False)
+        dockerfile = Path(tmp_dir) / "Dockerfile"
+
+        def validate() -> AGIPackConfig:
+            # The raw images are validated once, when constructing the configuration (as in `load_yaml`)
+            return AGIPackConfig(images=data["images"])
+
+        def render() -> None:
+            dockerfile.unlink(missing_ok=True)
+            AGIPack(config).render(filename=str(dockerfile))
+
+        config = AGIPackConfig.load_yaml(filename)
+
+        def tree() -> None:
+            config._target_tree = {}
+            config._build_target_tree()
+
+        result.timings["load"] = _best_of(lambda: AGIPackConfig.load_yaml(filename), repeat)
+        result.timings["validate"] = _best_of(validate, repeat)
+        result.timings["tree"] = _best_of(tree, repeat)
+        result.timings["render"] = _best_of(render, repeat)
+
+        # Peak memory of the full load + render pipeline
+        gc.collect()
+        tracemalloc.start()
+        try:
+            config = AGIPackConfig.load_yaml(filename)
+            render()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        result.peak_memory_mb = peak / 2**20
+    return result
+
+
+def run(cases: List[BenchmarkCase], repeat: int = 3) -> Dict[str, BenchmarkResult]:
+    """Run the benchmark cases, and return the results for each case."""
+    results = {}
+    for case in cases:
+        results[case.name] = run_case(case, repeat=repeat)
+        timings = ", ".join(f"{key}={value * 1e3:.1f}ms" for key, value in results[case.name].timings.items())
+        logger.info(f"⏱ Benchmark [{case.name}, {timings}, peak={results[case.name].peak_memory_mb:.1f}MB]")
+    return results
+
+
+def startup_time(args: List[str], repeat: int = 5) -> float:
+    """Best wall time (in seconds) of running `agi-pack <args>` in a fresh interpreter."""
+    cmd = [sys.executable, "-m", "agipack.cli", *args]
+    cwd = str(Path(__file__).parent.parent)
+    return _best_of(lambda: subprocess.run(cmd, cwd=cwd, stdout=subprocess.DEVNULL, check=True), repeat)
+
+
+def compare(
+    results: Dict[str, BenchmarkResult], baseline: Dict[str, Dict[str, Any]], threshold: float = 0.2
+) -> List[str]:
+    """Compare the results against a baseline.
+
+    Args:
+        results (Dict[str, BenchmarkResult]): Benchmark results.
+        baseline (Dict[str, Dict[str, Any]]): Baseline results (as saved with `--output`).
+        threshold (float): Relative slowdown (or memory increase) considered a regression.
+    Returns:
+        List[str]: Regressions, as human-readable messages.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        current = {**result.timings, "peak_memory_mb": result.peak_memory_mb}
+        reference = {**expected["timings"], "peak_memory_mb": expected["peak_memory_mb"]}
+        for metric, value in current.items():
+            if reference.get(metric, 0) > 0 and value > reference[metric] * (1 + threshold):
+                ratio = value / reference[metric]
+                regressions.append(f"{name}/{metric}: {reference[metric]:.4f} -> {value:.4f} ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=[case.name for case in CASES], help="Cases to run.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of repeats (the best time is reported).")
+    parser.add_argument("--output", type=Path, help="Save the results to a JSON file.")
+    parser.add_argument("--compare", type=Path, help="Compare the results against a baseline JSON file.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown considered a regression.")
+    parser.add_argument("--startup", action="store_true", help="Benchmark the CLI startup time instead.")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        for cmd in STARTUP_COMMANDS:
+            print(f"agi-pack {' '.join(cmd):<12} {startup_time(cmd, repeat=max(args.repeat, 5)) * 1e3:>8.1f} ms")
+        return 0
+
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("agipack").setLevel(logging.WARNING)
+    cases = [case for case in CASES if args.cases is None or case.name in args.cases]
+    results = run(cases, repeat=args.repeat)
+
+    print(
+        f"{'case':<12} {'targets':>8} {'pkgs':>6} " + " ".join(f"{m + ' (ms)':>14}" for m in METRICS) + "  peak (MB)"
+    )
+    for result in results.values():
+        timings = " ".join(f"{result.timings[m] * 1e3:>14.2f}" for m in METRICS)
+        print(f"{result.name:<12} {result.targets:>8} {result.packages:>6} {timings}  {result.peak_memory_mb:>9.2f}")
+
+    if args.output:
+        args.output.write_text(json.dumps({name: asdict(result) for name, result in results.items()}, indent=2))
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text()), threshold=args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+from typer.testing import CliRunner
+
+from agipack.affected import AffectedIndex, affected_targets
+from agipack.cli import app
+from agipack.config import AGIPackConfig
+
+CONFIG = """
+images:
+  base-cpu:
+    base: debian:buster-slim
+    python: "3.8.10"
+    requirements:
+      - requirements/base.txt
+  dev-cpu:
+    base: base-cpu
+    add:
+      - src:/app/src
+  test-cpu:
+    base: dev-cpu
+    pip:
+      - pytest
+  prod-cpu:
+    base: base-cpu
+    requirements:
+      - ./requirements/prod.txt
+"""
+
+
+@pytest.fixture
+def context_dir(tmp_path):
+    os.chdir(tmp_path)
+    (tmp_path / "requirements").mkdir()
+    (tmp_path / "requirements" / "base.txt").write_text("numpy\n")
+    (tmp_path / "requirements" / "prod.txt").write_text("gunicorn\n")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.py").write_text("print('hello')\n")
+    (tmp_path / "agibuild.yaml").write_text(CONFIG)
+    return tmp_path
+
+
+def test_affected_index(context_dir):
+    config = AGIPackConfig.load_yaml("agibuild.yaml")
+    index = AffectedIndex(config, config_filename="agibuild.yaml")
+    assert index.index == {
+        "requirements/base.txt": {"base-cpu"},
+        "src": {"dev-cpu"},
+        "requirements/prod.txt": {"prod-cpu"},
+    }
+    assert config.descendants("base-cpu") == ["dev-cpu", "prod-cpu", "test-cpu"]
+
+    assert index.affected([]) == []
+    assert index.affected(["README.md", "srcs/main.py"]) == []
+    assert index.affected(["requirements/prod.txt"]) == ["prod-cpu"]
+    assert index.affected(["./src/main.py"]) == ["dev-cpu", "test-cpu"]
+    assert index.affected([context_dir / "requirements" / "base.txt"]) == list(config.images.keys())
+
+    # Without the previous config, a config change affects all the targets
+    assert index.affected(["agibuild.yaml"]) == list(config.images.keys())
+
+    # With the previous config, only the changed targets (and their descendants) are affected
+    (context_dir / "agibuild.old.yaml").write_text(CONFIG.replace("- pytest", "- pytest-cov"))
+    previous = AGIPackConfig.load_yaml("agibuild.old.yaml")
+    index = AffectedIndex(config, config_filename="agibuild.yaml", previous=previous)
+    assert index.affected(["agibuild.yaml"]) == ["test-cpu"]
+
+    # ... unless a config-level section rendered into every target changed
+    (context_dir / "agibuild.new.yaml").write_text(CONFIG + "mirrors:\n  pip: https://pypi.example.com/simple\n")
+    updated = AGIPackConfig.load_yaml("agibuild.new.yaml")
+    index = AffectedIndex(updated, config_filename="agibuild.new.yaml", previous=config)
+    assert index.affected(["agibuild.new.yaml"]) == list(config.images.keys())
+
+    # Adding the whole build context makes every file affect the target
+    config.images["prod-cpu"].add.append(".:/app")
+    index = AffectedIndex(config)
+    assert index.affected(["README.md"]) == ["prod-cpu"]
+    assert index.affected(["src/main.py"]) == ["dev-cpu", "test-cpu", "prod-cpu"]
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_affected_since(context_dir):
+    def git(*args):
+        subprocess.run(["git", *args], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    git("init", "-q")
+    git("-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "--allow-empty", "-m", "empty")
+    git("add", ".")
+    git("-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", "initial")
+    assert affected_targets("agibuild.yaml", since="HEAD") == []
+
+    (context_dir / "agibuild.yaml").write_text(CONFIG.replace("- pytest", "- pytest-cov"))
+    (context_dir / "requirements" / "prod.txt").write_text("uvicorn\n")
+    assert affected_targets("agibuild.yaml", since="HEAD") == ["test-cpu", "prod-cpu"]
+    assert affected_targets("agibuild.yaml", since="HEAD~1") == list(AGIPackConfig.load_yaml("agibuild.yaml").images)
+
+    with pytest.raises(ValueError):
+        affected_targets("agibuild.yaml", since="unknown-revision")
+    with pytest.raises(ValueError):
+        affected_targets("agibuild.yaml")
+
+
+def test_affected_cli(context_dir):
+    runner = CliRunner()
+    result = runner.invoke(app, ["affected", "-c", "agibuild.yaml", "src/main.py"])
+    assert result.exit_code == 0
+    assert result.output.split() == ["dev-cpu", "test-cpu"]
+
+    result = runner.invoke(app, ["affected", "-c", "agibuild.yaml", "requirements/prod.txt", "--json"])
+    assert result.exit_code == 0
+    assert json.loads(result.output) == ["prod-cpu"]
+
+    result = runner.invoke(app, ["affected", "-c", "agibuild.yaml"])
+    assert result.exit_code == 1
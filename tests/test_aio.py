@@ -0,0 +1,161 @@
+import asyncio
+import os
+import threading
+from pathlib import Path
+
+import pytest
+
+from agipack.aio import iterate_in_thread, limiter, set_concurrency
+from agipack.builder import AGIPack
+from agipack.config import AGIPackConfig, ImageConfig
+from agipack.docker import DockerCLI, FakeDockerBackend
+from agipack.manifest import BuildManifest
+from agipack.pusher import AGIPackPusher
+
+
+class SlowDockerBackend(FakeDockerBackend):
+    """Fake backend whose async builds take a while, recording the maximum number of concurrent builds."""
+
+    running, max_running = 0, 0
+
+    async def abuild(self, dockerfile, target, tags, **kwargs):
+        cls = SlowDockerBackend
+        cls.running += 1
+        cls.max_running = max(cls.max_running, cls.running)
+        try:
+            await asyncio.sleep(0.05)
+            yield f"#1 [{target} 1/1] FROM debian"
+        finally:
+            cls.running -= 1
+
+
+@pytest.fixture
+def config(tmp_path):
+    os.chdir(tmp_path)
+    images = {"base-cpu": ImageConfig(name="agipack"), "dev-cpu": ImageConfig(name="dev", base="base-cpu")}
+    return AGIPackConfig(images=images)
+
+
+def test_concurrency_shared_across_builders(config):
+    builders = [AGIPack(config, backend=SlowDockerBackend()) for _ in range(3)]
+
+    async def main():
+        set_concurrency(builds=2)
+        assert limiter("build") is limiter("build")
+        return await asyncio.gather(
+            *(builder.abuild("Dockerfile", target) for builder in builders for target in ["base-cpu", "dev-cpu"])
+        )
+
+    assert all(asyncio.run(main()))
+    assert SlowDockerBackend.max_running == 2
+
+    async def unknown():
+        return limiter("lint")
+
+    with pytest.raises(ValueError):
+        asyncio.run(unknown())
+
+
+def test_arender_abuild_apush(config):
+    backend = FakeDockerBackend(logs=["#1 [base-cpu 1/1] FROM debian", "#1 DONE 0.1s"], failures={"dev-cpu": ["boom"]})
+    builder = AGIPack(config, backend=backend)
+
+    async def main():
+        dockerfiles = await builder.arender()
+        events = []
+        assert await builder.abuild(dockerfiles["base-cpu"], "base-cpu", on_event=events.append)
+        with pytest.raises(Exception, match="boom"):
+            await builder.abuild(dockerfiles["dev-cpu"], "dev-cpu")
+        pusher = AGIPackPusher(backend=backend, asleep=lambda _: asyncio.sleep(0))
+        backend.failures["agipack:base-cpu"] = ["timeout"]
+        return events, await pusher.apush(["agipack:base-cpu", "agipack:base-cpu"])
+
+    events, results = asyncio.run(main())
+    assert [event.type for event in events] == ["build_started", "step_started", "step_finished", "build_finished"]
+    assert "base-cpu" in builder.reports
+    assert list(results) == ["agipack:base-cpu"]
+    assert results["agipack:base-cpu"].ok() and results["agipack:base-cpu"].attempts == 2
+    assert backend.pushed == ["agipack:base-cpu"]
+
+
+def test_abuild_push_after_build(config, tmp_path):
+    built = asyncio.Event()
+
+    class BlockingPushBackend(FakeDockerBackend):
+        async def abuild(self, dockerfile, target, tags, **kwargs):
+            if target == "dev-cpu":
+                built.set()
+            async for line in super().abuild(dockerfile, target, tags, **kwargs):
+                yield line
+
+        async def apush(self, tag):
+            # Pushing waits for the other target to be built (which would deadlock if the push held the build slot)
+            await built.wait()
+            await super().apush(tag)
+
+    backend = BlockingPushBackend()
+    builder = AGIPack(config, backend=backend)
+    builder.render(filename="Dockerfile")
+    threads = []
+    fingerprint = builder._fingerprint
+    builder._fingerprint = lambda target: threads.append(threading.current_thread()) or fingerprint(target)
+    manifest = BuildManifest(tmp_path / "manifest.json")
+
+    async def main():
+        set_concurrency(builds=1)
+        return await asyncio.wait_for(
+            asyncio.gather(
+                builder.abuild("Dockerfile", "base-cpu", push=True, manifest=manifest),
+                builder.abuild("Dockerfile", "dev-cpu", manifest=manifest),
+            ),
+            timeout=5,
+        )
+
+    assert asyncio.run(main()) == [True, True]
+    assert backend.pushed == ["agipack:base-cpu"]
+    # Fingerprints are computed off the event loop
+    assert threads and threading.main_thread() not in threads
+
+
+def test_abuild_cancellation(config, tmp_path):
+    pidfile = tmp_path / "docker.pid"
+    docker = tmp_path / "docker"
+    docker.write_text(f'#!/bin/sh\necho "#1 [base-cpu 1/1] FROM debian"\necho $$ > {pidfile}\nexec sleep 30\n')
+    docker.chmod(0o755)
+    builder = AGIPack(config, backend=DockerCLI(executable=str(docker)))
+
+    async def main():
+        started = asyncio.Event()
+        task = asyncio.ensure_future(builder.abuild("Dockerfile", "base-cpu", on_event=lambda event: started.set()))
+        await started.wait()
+        while not pidfile.exists() or not pidfile.read_text().strip():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    # The build process was killed (and reaped) when the build was cancelled
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(Path(pidfile).read_text()), 0)
+
+
+def test_iterate_in_thread_closes_iterator():
+    closed = threading.Event()
+
+    def lines():
+        try:
+            for i in range(1000):
+                yield i
+        finally:
+            closed.set()
+
+    async def main():
+        items = iterate_in_thread(lines)
+        async for i in items:
+            if i == 2:
+                break
+        await items.aclose()
+        return await asyncio.get_running_loop().run_in_executor(None, closed.wait, 5)
+
+    assert asyncio.run(main())
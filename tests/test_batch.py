@@ -0,0 +1,58 @@
+import shutil
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from agipack.batch import expand_config_filenames, generate_all
+from agipack.cli import app
+
+
+@pytest.fixture
+def configs_dir(test_data_dir, tmp_path, monkeypatch):
+    for name, config in [
+        ("a", "agibuild-minimal.yaml"),
+        ("b/c", "agibuild-with-deps.yaml"),
+        ("b", "agibuild-malformed-py-version.yaml"),
+    ]:
+        (tmp_path / name).mkdir(parents=True, exist_ok=True)
+        shutil.copy(test_data_dir / config, tmp_path / name / "agibuild.yaml")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_expand_config_filenames(configs_dir):
+    filenames = expand_config_filenames(["**/agibuild.yaml", "a/agibuild.yaml", "missing.yaml"])
+    assert filenames == ["a/agibuild.yaml", "b/agibuild.yaml", "b/c/agibuild.yaml", "missing.yaml"]
+    assert expand_config_filenames(["**/*.yml"]) == []
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_generate_all(configs_dir, jobs):
+    results = generate_all(["**/agibuild.yaml"], jobs=jobs, output_dir="docker")
+    assert Path.cwd() == configs_dir
+    assert list(results.keys()) == ["a/agibuild.yaml", "b/agibuild.yaml", "b/c/agibuild.yaml"]
+    assert results["a/agibuild.yaml"].ok()
+    assert results["b/c/agibuild.yaml"].ok()
+    assert not results["b/agibuild.yaml"].ok()
+    assert "Python version" in results["b/agibuild.yaml"].error
+
+    # Output paths are relative to each configuration file
+    dockerfiles = results["b/c/agibuild.yaml"].dockerfiles
+    assert dockerfiles == {"base-cpu": "b/c/docker/base-cpu/Dockerfile", "dev-cpu": "b/c/docker/dev-cpu/Dockerfile"}
+    assert all(Path(filename).exists() for filename in dockerfiles.values())
+
+    with pytest.raises(ValueError):
+        generate_all(["**/*.yml"])
+
+
+def test_generate_all_cli(configs_dir):
+    runner = CliRunner()
+    result = runner.invoke(app, ["generate-all", "a/agibuild.yaml", "b/c/agibuild.yaml", "-j", "1"])
+    assert result.exit_code == 0
+    assert "Generated 2/2 configs" in result.output
+    assert (configs_dir / "a" / "Dockerfile").exists()
+
+    result = runner.invoke(app, ["generate-all", "**/agibuild.yaml"])
+    assert result.exit_code == 1
+    assert "Generated 2/3 configs" in result.output
@@ -0,0 +1,33 @@
+import pytest
+from benchmark import CASES, METRICS, BenchmarkResult, compare, run, synthetic_config
+
+from agipack.config import AGIPackConfig, ImageConfig
+
+
+@pytest.mark.parametrize("shape", ["deep", "wide"])
+def test_synthetic_config(shape):
+    data = synthetic_config(shape, targets=5, packages=3)
+    images = {target: ImageConfig(**config) for target, config in data["images"].items()}
+    config = AGIPackConfig(images=images)
+    assert config.roots() == ["target-0000"]
+    if shape == "deep":
+        assert config.children("target-0000") == ["target-0001"]
+    else:
+        assert len(config.children("target-0000")) == 4
+
+
+def test_compare():
+    result = BenchmarkResult(name="deep-10", targets=10, packages=10, timings={"load": 0.2}, peak_memory_mb=1.0)
+    baseline = {"deep-10": {"timings": {"load": 0.1}, "peak_memory_mb": 1.0}}
+    assert len(compare({"deep-10": result}, baseline, threshold=0.2)) == 1
+    assert compare({"deep-10": result}, baseline, threshold=1.5) == []
+    assert compare({"deep-10": result}, {}, threshold=0.2) == []
+
+
+@pytest.mark.benchmark
+def test_benchmark():
+    cases = [case for case in CASES if case.targets <= 100]
+    results = run(cases, repeat=1)
+    for result in results.values():
+        assert set(result.timings.keys()) == set(METRICS)
+        assert result.peak_memory_mb > 0
@@ -4,9 +4,11 @@ import tempfile
 from pathlib import Path
 
 import pytest
+from jinja2 import Template
 
-from agipack.builder import AGIPack, AGIPackConfig
-from agipack.constants import AGIPACK_SAMPLE_FILENAME
+from agipack.builder import AGIPack, AGIPackConfig, get_template_env
+from agipack.config import BootstrapConfig
+from agipack.constants import AGIPACK_DOCKERFILE_TEMPLATE, AGIPACK_SAMPLE_FILENAME
 
 logger = logging.getLogger(__name__)
 
@@ -62,3 +64,170 @@ def test_builder_cls_with_deps(test_data_dir):
         assert Path(dockerfiles["base-cpu"]).exists()
         assert Path(dockerfiles["base-cpu"]).parent == Path(tmp_dir)
         builder.lint(filename=filename)
+
+
+def test_builder_output_dir(test_data_dir):
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-with-deps.yaml")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        builder = AGIPack(config)
+        dockerfiles = builder.render(output_dir=tmp_dir, tag="agi:{target}")
+        assert dockerfiles["base-cpu"] == str(Path(tmp_dir) / "base-cpu" / "Dockerfile")
+        assert dockerfiles["dev-cpu"] == str(Path(tmp_dir) / "dev-cpu" / "Dockerfile")
+
+        # Derived targets build from the parent image tag
+        base, dev = Path(dockerfiles["base-cpu"]).read_text(), Path(dockerfiles["dev-cpu"]).read_text()
+        assert "FROM debian:buster-slim AS base-cpu" in base
+        assert "FROM agi:base-cpu AS dev-cpu" in dev
+        assert "AS base-cpu" not in dev
+
+        # Each target gets its own minimal build context
+        dockerignore = Path(f"{dockerfiles['dev-cpu']}.dockerignore").read_text().splitlines()
+        assert dockerignore[1:] == ["*"]
+
+        # Re-rendering overwrites instead of appending
+        builder.render(output_dir=tmp_dir, tag="agi:{target}")
+        assert Path(dockerfiles["dev-cpu"]).read_text() == dev
+
+
+def test_builder_matrix(test_data_dir):
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-matrix.yaml")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        builder = AGIPack(config)
+        filename = str(Path(tmp_dir) / "Dockerfile")
+        dockerfiles = builder.render(filename=filename)
+        assert list(dockerfiles.keys())[:2] == config.roots()
+        assert set(dockerfiles.keys()) == set(config.images.keys())
+
+        # All the variants are rendered in one pass, with each stage rendered once
+        content = Path(filename).read_text()
+        for target in config.images:
+            assert content.count(f"AS {target}\n") == 1
+        assert "FROM base-cpu-py310 AS dev-cpu-py310-torch20" in content
+
+
+def test_builder_single_file_appends_stages(test_data_dir):
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-with-deps.yaml")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        builder = AGIPack(config)
+        filename = str(Path(tmp_dir) / "Dockerfile")
+        builder.render(filename=filename)
+        builder.render(filename=filename)
+        content = Path(filename).read_text()
+        assert content.count("AS base-cpu") == 1
+        assert content.count("AS dev-cpu") == 1
+
+
+def test_builder_incremental(test_data_dir, monkeypatch):
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-wide.yaml")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = Path(tmp_dir) / "Dockerfile"
+        cache_filename = Path(tmp_dir) / "render.json"
+        AGIPack(config).render(filename=filename, incremental=True, cache_filename=cache_filename)
+        assert cache_filename.exists()
+        content, mtime = filename.read_text(), filename.stat().st_mtime_ns
+
+        # Count the number of stages that are re-rendered
+        rendered, render = [], Template.render
+        monkeypatch.setattr(Template, "render", lambda self, ctx: rendered.append(ctx["target"]) or render(self, ctx))
+        builder = AGIPack(config)
+
+        # Unchanged inputs: nothing is re-rendered and the file is untouched
+        builder.render(filename=filename, incremental=True, cache_filename=cache_filename)
+        assert rendered == []
+        assert filename.read_text() == content
+        assert filename.stat().st_mtime_ns == mtime
+
+        # Changing a target only re-renders that stage
+        config.images["test-cpu"].pip.append("pytest-xdist")
+        builder.render(filename=filename, incremental=True, cache_filename=cache_filename)
+        assert rendered == ["test-cpu"]
+        assert "pytest-xdist" in filename.read_text()
+        assert builder.stages["dev-tools"] in filename.read_text()
+
+
+def test_builder_template_cache(test_data_dir):
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-with-deps.yaml")
+    assert AGIPack(config).template is AGIPack(config).template
+    assert get_template_env() is get_template_env()
+
+    # Compiled templates are persisted to the bytecode cache
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        try:
+            env = get_template_env(bytecode_cache_dir=tmp_dir)
+            env.get_template(AGIPACK_DOCKERFILE_TEMPLATE)
+            assert len(list(Path(tmp_dir).iterdir())) == 1
+        finally:
+            # Do not leak the environment (bound to the removed cache directory) to the other tests
+            get_template_env.cache_clear()
+
+
+def test_builder_render_many(test_data_dir):
+    configs = [
+        AGIPackConfig.load_yaml(test_data_dir / "agibuild-minimal.yaml"),
+        AGIPackConfig.load_yaml(test_data_dir / "agibuild-with-deps.yaml"),
+    ]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filenames = [Path(tmp_dir) / "Dockerfile.minimal", Path(tmp_dir) / "Dockerfile.with-deps"]
+        results = AGIPack.render_many(dict(zip(filenames, configs)), env="dev")
+        assert list(results.keys()) == [str(filename) for filename in filenames]
+        assert list(results[str(filenames[1])].keys()) == ["base-cpu", "dev-cpu"]
+        assert all(filename.exists() for filename in filenames)
+
+        with pytest.raises(ValueError):
+            AGIPack.render_many(dict(zip(filenames, configs)), filename="Dockerfile")
+
+
+def test_builder_slim(test_data_dir):
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-with-deps.yaml")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        builder = AGIPack(config)
+        filename = str(Path(tmp_dir) / "Dockerfile")
+        dockerfiles = builder.render(filename=filename, env="prod", slim=True)
+        assert builder.build_stages == {"base-cpu": "base-cpu-build", "dev-cpu": "dev-cpu-build"}
+
+        # Children build on the parent's build stage, and each target is a slim runtime stage
+        content = Path(dockerfiles["dev-cpu"]).read_text()
+        assert "FROM debian:buster-slim AS base-cpu-build" in content
+        assert "FROM base-cpu-build AS dev-cpu-build" in content
+        assert "FROM debian:buster-slim AS dev-cpu" in content
+        assert "COPY --from=dev-cpu-build ${CONDA_PATH} ${CONDA_PATH}" in content
+        runtime = content.split("AS dev-cpu\n")[1]
+        assert "wget \\\n    build-essential \\\n" in runtime
+        assert "miniconda" not in runtime
+        assert "pip cleanup complete" not in content
+
+        # Production images without a slim runtime stage clean up the caches instead
+        builder = AGIPack(config)
+        dockerfiles = builder.render(filename=filename, env="prod")
+        assert "pip cleanup complete" in Path(dockerfiles["dev-cpu"]).read_text()
+
+        # Per-target Dockerfiles keep the parents with children whole (for the children to build on)
+        builder = AGIPack(config)
+        dockerfiles = builder.render(output_dir=tmp_dir, env="prod", slim=True, tag="agi:{target}")
+        assert builder.build_stages == {"dev-cpu": "dev-cpu-build"}
+        assert "AS base-cpu-build" not in Path(dockerfiles["base-cpu"]).read_text()
+        assert "FROM agi:base-cpu AS dev-cpu-build" in Path(dockerfiles["dev-cpu"]).read_text()
+
+
+def test_builder_bootstrap(test_data_dir):
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-with-deps.yaml")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = str(Path(tmp_dir) / "Dockerfile")
+
+        # The installer is cached in a build cache mount (and only verified if pinned)
+        AGIPack(config).render(filename=filename)
+        content = Path(filename).read_text()
+        assert "--mount=type=cache,target=/var/cache/agipack/installers" in content
+        assert 'installer="/var/cache/agipack/installers/Miniconda3-latest-Linux-x86_64.sh"' in content
+        assert 'sha256=""' in content and "conda install mamba -y" in content
+
+        # micromamba creates the environment without installing Miniconda
+        digest = "0" * 64
+        config.bootstrap = BootstrapConfig(installer="micromamba", version="1.5.8-0", sha256={"x86_64": digest})
+        AGIPack(config).render(filename=filename)
+        content = Path(filename).read_text()
+        assert "releases/download/1.5.8-0/micromamba-linux-64" in content
+        assert f'sha256="{digest}"' in content
+        assert "ENV MAMBA_ROOT_PREFIX=${AGIPACK_PATH}/conda" in content
+        assert "micromamba create -n ${AGIPACK_PYENV} python=${PYTHON_VERSION} pip -y" in content
+        assert "Miniconda3" not in content and "conda install mamba" not in content
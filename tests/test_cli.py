@@ -1,6 +1,9 @@
 import os
 import shutil
+import subprocess
+import sys
 import tempfile
+import time
 from pathlib import Path as Pathlib
 
 import pytest
@@ -9,6 +12,8 @@ from typer.testing import CliRunner
 from agipack.cli import app
 from agipack.constants import AGIPACK_BASENAME, AGIPACK_SAMPLE_FILENAME
 
+ROOT_DIR = Pathlib(__file__).parent.parent
+
 
 @pytest.fixture
 def runner():
@@ -72,3 +77,52 @@ def test_builder(runner):
         result = runner.invoke(app, ["generate", "-c", AGIPACK_SAMPLE_FILENAME, "-t", "agi:{target}", "--build"])
         assert result.exit_code == 0
         assert Pathlib("Dockerfile").exists()
+
+
+def test_build_fake_backend(runner, tmp_path):
+    # `build` forwards to `generate` with watch mode disabled (instead of its typer option defaults)
+    os.chdir(tmp_path)
+    shutil.copy(AGIPACK_SAMPLE_FILENAME, AGIPACK_BASENAME)
+    result = runner.invoke(app, ["build", "--backend", "fake"])
+    assert result.exit_code == 0
+    assert "Watching" not in result.output
+    assert "Successfully built image" in result.output
+
+    result = runner.invoke(app, ["build", "--backend", "fake", "--force", "--push", "--push-jobs", "2"])
+    assert result.exit_code == 0
+    assert "Push summary" in result.output
+
+
+def test_load_config_matrix_overrides(test_data_dir):
+    from agipack.cli import _load_config
+
+    # Overrides apply to all the roots, unless they collapse an axis of the build matrix
+    config = _load_config(test_data_dir / "agibuild-matrix.yaml", base_image="ubuntu:22.04")
+    assert [config.images[root].base for root in config.roots()] == ["ubuntu:22.04", "ubuntu:22.04"]
+    with pytest.raises(ValueError, match="python"):
+        _load_config(test_data_dir / "agibuild-matrix.yaml", python="3.11")
+
+
+AGIPACK_STARTUP_MODULES = ["jinja2", "pydantic", "yaml", "agipack.builder", "agipack.config"]
+"""Heavy modules that must not be imported when the CLI starts up."""
+
+AGIPACK_STARTUP_BUDGET = 1.0
+"""Time budget (in seconds) for short CLI commands, i.e. `agi-pack version` / `agi-pack --help`."""
+
+
+def test_cli_lazy_imports():
+    code = "import sys, agipack.cli; print(' '.join(sorted(sys.modules)))"
+    process = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, stdout=subprocess.PIPE, check=True)
+    modules = set(process.stdout.decode().split())
+    assert not modules & set(AGIPACK_STARTUP_MODULES)
+
+
+@pytest.mark.parametrize("args", [["version"], ["--help"]])
+def test_cli_startup_time(args):
+    cmd = [sys.executable, "-m", "agipack.cli", *args]
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=ROOT_DIR, stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    assert min(timings) < AGIPACK_STARTUP_BUDGET
@@ -1,9 +1,13 @@
+import json
 import logging
 import os
+from pathlib import Path
 
 import pytest
+import yaml
 
-from agipack.config import AGIPackConfig
+from agipack import config as config_module
+from agipack.config import AGIPackConfig, BootstrapConfig, CacheConfig, ConfigCache, ImageConfig
 
 logging_level = os.environ.get("AGIPACK_LOGGING_LEVEL", "DEBUG")
 logging.basicConfig(level=logging.getLevelName(logging_level))
@@ -33,3 +37,150 @@ def test_poorly_formatted_configs(test_data_dir):
     for filename in poorly_formatted_configs:
         with pytest.raises(ValueError):
             AGIPackConfig.load_yaml(filename)
+
+
+def test_matrix_config(test_data_dir, tmp_path):
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-matrix.yaml")
+    assert config.roots() == ["base-cpu-py38", "base-cpu-py310"]
+    assert config.root() == "base-cpu-py38"
+    assert len(config.images) == 2 * (1 + 2 * 2 + 1)
+
+    # Variants are cloned for each python version, and share the ancestors of the matrix target
+    assert config.images["base-cpu-py310"].python == "3.10"
+    assert config.images["prod-cpu-py310"].base == "base-cpu-py310"
+    assert config.images["prod-cpu-py310"].python == "3.10"
+    assert config.children("dev-cpu-py310-torch21") == ["test-cpu-py310-torch21"]
+    assert config.images["dev-cpu-py310-torch20"].base == "base-cpu-py310"
+    assert config.images["dev-cpu-py310-torch20"].pip == ["torch==2.0.1"]
+    assert config.images["test-cpu-py310-torch20"].python == "3.10"
+
+    assert config.origin("test-cpu-py310-torch20") == "test-cpu"
+    assert config.origin("prod-cpu-py38") == "prod-cpu"
+
+    # The images are saved with the matrix (and expanded again on load)
+    filename = tmp_path / "agibuild.yaml"
+    config.save_yaml(filename)
+    saved = AGIPackConfig.load_yaml(filename)
+    assert saved.matrix == config.matrix
+    assert list(saved.images.keys()) == list(config.images.keys())
+
+
+def test_matrix_config_errors(test_data_dir):
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-minimal.yaml")
+    base = config.root()
+    with pytest.raises(ValueError, match=f"needs to be one of \\['{base}'"):
+        AGIPackConfig(images=config.images, matrix={"unknown": {"python": ["3.10"]}})
+    with pytest.raises(ValueError):
+        AGIPackConfig(images=config.images, matrix={base: {"unknown": ["value"]}})
+
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-matrix.yaml")
+    with pytest.raises(ValueError):
+        AGIPackConfig(images=config.images, matrix={"dev-cpu-py38-torch21": {"python": ["3.10"]}})
+
+    # Additional base images are only allowed for the variants of the build matrix
+    images = {"base-cpu": ImageConfig(base="debian:buster-slim"), "base-gpu": ImageConfig(base="ubuntu:22.04")}
+    with pytest.raises(ValueError, match="base-gpu"):
+        AGIPackConfig(images=images)
+
+
+def test_cache_config(test_data_dir, tmp_path):
+    cache = CacheConfig.parse("type=local,ref=.buildcache,mode=min")
+    assert cache.target_ref("base-cpu") == str(Path(".buildcache") / "base-cpu")
+    assert cache.cache_to("base-cpu") == [f"type=local,dest={Path('.buildcache') / 'base-cpu'},mode=min"]
+    assert not CacheConfig.parse("type=inline,export=false").cache_to("base-cpu")
+
+    cache = CacheConfig(type="registry", ref="ghcr.io/org/cache")
+    assert cache.cache_from({"dev-cpu": ["agi:dev-cpu"], "base-cpu": ["agi:base-cpu"]}) == [
+        "type=registry,ref=ghcr.io/org/cache:dev-cpu",
+        "type=registry,ref=ghcr.io/org/cache:base-cpu",
+    ]
+    with pytest.raises(ValueError):
+        CacheConfig(type="local")
+    with pytest.raises(ValueError):
+        CacheConfig.parse("type=gha")
+    with pytest.raises(ValueError):
+        CacheConfig.parse("registry")
+
+    # The cache configuration is loaded and saved with the images
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-minimal.yaml")
+    assert config.cache is None
+    config.cache = cache
+    filename = tmp_path / "agibuild.yaml"
+    config.save_yaml(filename)
+    assert AGIPackConfig.load_yaml(filename).cache == cache
+
+
+def test_bootstrap_config(test_data_dir, tmp_path):
+    bootstrap = BootstrapConfig(installer="micromamba", version="1.5.8-0", sha256={"aarch64": "a" * 64})
+    assert bootstrap.is_pinned() and not BootstrapConfig().is_pinned()
+    assert bootstrap.url("aarch64").endswith("/releases/download/1.5.8-0/micromamba-linux-aarch64")
+    assert BootstrapConfig().url("x86_64") == "https://repo.anaconda.com/miniconda/Miniconda3-latest-Linux-x86_64.sh"
+    with pytest.raises(ValueError):
+        BootstrapConfig(installer="mambaforge")
+    with pytest.raises(ValueError):
+        BootstrapConfig(sha256={"x86_64": "not-a-checksum"})
+    with pytest.raises(ValueError):
+        BootstrapConfig(sha256={"ppc64le": "a" * 64})
+
+    # The bootstrap configuration is loaded and saved with the images
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-minimal.yaml")
+    config.bootstrap = bootstrap
+    filename = tmp_path / "agibuild.yaml"
+    config.save_yaml(filename)
+    assert AGIPackConfig.load_yaml(filename).bootstrap == bootstrap
+
+
+def test_config_cache(test_data_dir, tmp_path, monkeypatch):
+    os.chdir(tmp_path)
+    monkeypatch.setattr(config_module, "AGIPACK_CONFIG_CACHE_DIR", str(tmp_path / "cache"))
+    Path("entrypoint.sh").write_text("#!/bin/sh\n")
+    filename = Path("agibuild.yaml")
+    filename.write_text(
+        "images:\n"
+        "  base-cpu:\n"
+        "    base: debian:buster-slim\n"
+        "    add:\n"
+        "      - entrypoint.sh:/app/entrypoint.sh\n"
+        "  dev-cpu:\n"
+        "    base: base-cpu\n"
+    )
+    config = AGIPackConfig.load_yaml(filename, cache=True)
+    assert ConfigCache().filename(filename).exists()
+
+    # Warm loads skip parsing and validation entirely
+    with monkeypatch.context() as m:
+        m.setattr(yaml, "load", lambda *args, **kwargs: pytest.fail("YAML was parsed"))
+        cached = AGIPackConfig.load_yaml(filename, cache=True)
+    assert cached.images == config.images
+    assert cached.children("base-cpu") == ["dev-cpu"]
+    assert ConfigCache().filename(filename).parent == tmp_path / "cache"
+    assert json.loads(ConfigCache().filename(filename).read_text())["paths"] == ["entrypoint.sh"]
+
+    # The cache is invalidated when the YAML changes, or `add` paths go missing
+    filename.write_text(filename.read_text().replace("dev-cpu", "test-cpu"))
+    assert list(AGIPackConfig.load_yaml(filename, cache=True).images) == ["base-cpu", "test-cpu"]
+    Path("entrypoint.sh").unlink()
+    with pytest.raises(ValueError):
+        AGIPackConfig.load_yaml(filename, cache=True)
+
+    # Corrupt caches are ignored
+    Path("entrypoint.sh").write_text("#!/bin/sh\n")
+    ConfigCache().filename(filename).write_bytes(b"corrupt")
+    assert list(AGIPackConfig.load_yaml(filename, cache=True).images) == ["base-cpu", "test-cpu"]
+
+    # Matrix variants are re-built with their origins
+    matrix = AGIPackConfig.load_yaml(test_data_dir / "agibuild-matrix.yaml", cache=True)
+    cached = AGIPackConfig.load_yaml(test_data_dir / "agibuild-matrix.yaml", cache=True)
+    assert cached is not matrix and cached.images == matrix.images
+    assert cached.roots() == matrix.roots() and cached.origin("prod-cpu-py310") == "prod-cpu"
+
+
+def test_load_yaml_fast_path(test_data_dir, monkeypatch):
+    # Loading never formats the (YAML) repr of the images, e.g. for debug logs
+    monkeypatch.setattr(ImageConfig, "__repr__", lambda self: pytest.fail("ImageConfig repr was formatted"))
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-with-deps.yaml")
+    assert all(isinstance(image, ImageConfig) for image in config.images.values())
+
+    # The dictionary representation (used for rendering) does not copy the fields
+    image = next(iter(config.images.values()))
+    assert image.dict()["pip"] is image.pip
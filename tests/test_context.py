@@ -0,0 +1,107 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from agipack.builder import AGIPack
+from agipack.config import AGIPackConfig, CacheConfig, ImageConfig
+from agipack.context import context_paths, context_size, missing_excludes, render_dockerignore, stage_context
+
+
+@pytest.fixture
+def config(tmp_path):
+    os.chdir(tmp_path)
+    Path("src").mkdir()
+    Path("src/app.py").write_text("print('hello')\n")
+    Path("requirements.txt").write_text("numpy\n")
+    Path("data").mkdir()
+    Path("data/blob.bin").write_bytes(b"\0" * 4096)
+    yield AGIPackConfig(
+        images={
+            "base-cpu": ImageConfig(name="agipack", requirements=["requirements.txt"]),
+            "dev-cpu": ImageConfig(name="agipack", base="base-cpu", add=["./src:/app/src"]),
+        }
+    )
+
+
+def test_render_dockerignore():
+    lines = render_dockerignore([Path("requirements.txt"), Path("./src/app"), Path("requirements.txt")]).splitlines()
+    assert lines[0].startswith("# Auto-generated by agi-pack")
+    assert lines[1:] == ["*", "!requirements.txt", "!src/app"]
+
+    with pytest.raises(ValueError):
+        render_dockerignore([Path("/etc/passwd")])
+
+
+def test_context_paths(config):
+    assert context_paths(config, "base-cpu") == [Path("requirements.txt")]
+    assert context_paths(config, "dev-cpu") == [Path("requirements.txt"), Path("src")]
+    assert context_paths(config, "dev-cpu", ancestors=False) == [Path("src")]
+
+
+def test_context_size(config):
+    full = context_size()
+    assert full.files == 3
+    assert full.size == 4096 + len("numpy\n") + len("print('hello')\n")
+    minimal = context_size(context_paths(config, "dev-cpu"))
+    assert (minimal.files, minimal.size) == (2, len("numpy\n") + len("print('hello')\n"))
+    assert minimal.human() == f"{minimal.size} B (2 files)"
+    assert full.human().endswith("KB (3 files)")
+
+
+def test_stage_context(config):
+    size = stage_context(context_paths(config, "dev-cpu"), "staged")
+    assert size.files == 2
+    assert sorted(str(p.relative_to("staged")) for p in Path("staged").rglob("*") if p.is_file()) == [
+        "requirements.txt",
+        "src/app.py",
+    ]
+    # Files are hard-linked instead of copied
+    assert os.path.samefile("staged/src/app.py", "src/app.py")
+
+    with pytest.raises(ValueError):
+        stage_context(["missing.txt"], "staged-missing")
+
+
+def test_stage_context_dir(config):
+    # Staging `.` into a directory inside it does not copy the staged context into itself
+    size = stage_context([Path(".")], ".agipack-context-test")
+    assert size.files == 3
+    assert not Path(".agipack-context-test/.agipack-context-test").exists()
+    assert stage_context([Path(".")], "staged").files == 3
+
+
+def test_render_minimal_context(config):
+    builder = AGIPack(config)
+    dockerfiles = builder.render(filename="Dockerfile", minimal_context=True)
+    assert builder.contexts["dev-cpu"] == [Path("requirements.txt"), Path("src")]
+    lines = Path(f"{dockerfiles['dev-cpu']}.dockerignore").read_text().splitlines()
+    assert lines[1:] == ["*", "!requirements.txt", "!src"]
+
+    # Without the option, the build context is left as-is
+    os.remove("Dockerfile.dockerignore")
+    builder.render(filename="Dockerfile")
+    assert not Path("Dockerfile.dockerignore").exists()
+
+
+def test_local_cache_excluded(config):
+    Path(".buildcache/base-cpu").mkdir(parents=True)
+    Path(".buildcache/base-cpu/index.json").write_text("{}")
+    config.images["dev-cpu"].add.append(".:/app")
+    config.cache = CacheConfig(type="local", ref="./.buildcache")
+    assert CacheConfig(type="local", ref="/tmp/buildcache").context_excludes() == []
+
+    # The local cache is excluded from the build context (and the staged context), even when adding `.`
+    builder = AGIPack(config)
+    builder.render(filename="Dockerfile", minimal_context=True)
+    assert Path("Dockerfile.dockerignore").read_text().splitlines()[-2:] == ["!src", ".buildcache"]
+    stage_context(builder.contexts["dev-cpu"], "staged", excludes=[".buildcache"])
+    assert Path("staged/src/app.py").exists() and not Path("staged/.buildcache").exists()
+
+    # ... and the project's `.dockerignore` is only checked (not updated) otherwise
+    Path(".dockerignore").write_text("*.pyc")
+    builder.render(filename="Dockerfile")
+    assert Path(".dockerignore").read_text() == "*.pyc"
+    assert missing_excludes([".buildcache"]) == [".buildcache"]
+    Path(".dockerignore").write_text("*.pyc\n.buildcache/\n")
+    assert missing_excludes(["./.buildcache"]) == []
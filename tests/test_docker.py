@@ -0,0 +1,296 @@
+import base64
+import http.server
+import io
+import json
+import os
+import socketserver
+import sys
+import tarfile
+import threading
+from pathlib import Path
+
+import pytest
+
+from agipack.builder import AGIPack
+from agipack.config import AGIPackConfig, CacheConfig, ImageConfig
+from agipack.docker import (
+    BuildKitTraceDecoder,
+    DockerCLI,
+    DockerEngineAPI,
+    DockerError,
+    FakeDockerBackend,
+    get_backend,
+    split_tag,
+    write_context_tarball,
+)
+from agipack.pusher import AGIPackPusher
+
+
+def _varint(value):
+    data = b""
+    while True:
+        byte, value = value & 0x7F, value >> 7
+        data += bytes([byte | (0x80 if value else 0)])
+        if not value:
+            return data
+
+
+def _proto(*fields):
+    """Encode a protobuf message from (field number, int / bytes / str) pairs."""
+    data = b""
+    for number, value in fields:
+        if isinstance(value, int):
+            data += _varint(number << 3) + _varint(value)
+        else:
+            value = value.encode() if isinstance(value, str) else value
+            data += _varint(number << 3 | 2) + _varint(len(value)) + value
+    return data
+
+
+def _vertex(digest, name, started=None, completed=None, cached=False, error=None):
+    fields = [(1, digest), (3, name)]
+    if cached:
+        fields.append((4, 1))
+    if started is not None:
+        fields.append((5, _proto((1, int(started)), (2, int(started % 1 * 1e9)))))
+    if completed is not None:
+        fields.append((6, _proto((1, int(completed)), (2, int(completed % 1 * 1e9)))))
+    if error:
+        fields.append((7, error))
+    return _proto((1, _proto(*fields)))
+
+
+TRACE = [
+    _vertex("sha256:a", "[base-cpu 1/2] FROM docker.io/library/debian:buster-slim", started=10),
+    _vertex("sha256:b", "[base-cpu 2/2] RUN apt-get -y update", started=10.5),
+    _vertex("sha256:a", "[base-cpu 1/2] FROM docker.io/library/debian:buster-slim", started=10, cached=True),
+    _proto((3, _proto((1, "sha256:b"), (4, b"Get:1 http://deb.debian.org buster InRelease\n")))),
+    _vertex("sha256:b", "[base-cpu 2/2] RUN apt-get -y update", started=10.5, completed=13.0),
+]
+
+
+def test_split_tag():
+    assert split_tag("agi:base-cpu") == ("agi", "base-cpu")
+    assert split_tag("localhost:5000/agi") == ("localhost:5000/agi", "latest")
+    assert split_tag("localhost:5000/agi:dev") == ("localhost:5000/agi", "dev")
+
+
+def test_buildkit_trace_decoder():
+    decoder = BuildKitTraceDecoder()
+    lines = [line for payload in TRACE for line in decoder.decode(payload)]
+    assert lines == [
+        "#1 [base-cpu 1/2] FROM docker.io/library/debian:buster-slim",
+        "#2 [base-cpu 2/2] RUN apt-get -y update",
+        "#1 CACHED",
+        "#2 Get:1 http://deb.debian.org buster InRelease",
+        "#2 DONE 2.5s",
+    ]
+
+
+def test_context_tarball(tmp_path):
+    os.chdir(tmp_path)
+    for filename in ["requirements.txt", "src/app.py", "data/blob.bin", ".git/HEAD"]:
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+        Path(filename).write_text(filename)
+    Path("Dockerfile").write_text("FROM debian\n")
+    Path("Dockerfile.dockerignore").write_text("*\n!requirements.txt\n!src\n")
+
+    fileobj = io.BytesIO()
+    arcname = write_context_tarball(".", "Dockerfile", fileobj)
+    fileobj.seek(0)
+    with tarfile.open(fileobj=fileobj) as tar:
+        assert sorted(tar.getnames()) == sorted([arcname, "requirements.txt", "src/app.py"])
+        assert tar.extractfile(arcname).read() == b"FROM debian\n"
+
+
+class FakeDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Minimal Docker Engine API over a unix socket, recording the requests and connections."""
+
+    daemon_threads = True
+
+    def __init__(self, path):
+        self.requests, self.connections, self.contexts = [], 0, []
+        self.images = {"agi:base-cpu": {"Id": "sha256:1", "Size": 100}}
+        super().__init__(path, FakeDaemonHandler)
+
+
+class FakeDaemonHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def address_string(self):
+        return "docker.sock"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, chunks=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if chunks is None:
+            data = json.dumps(body).encode()
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            data = (json.dumps(chunk) + "\n").encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.path))
+        tag = self.path.split("/images/")[1].rsplit("/json", 1)[0].replace("%3A", ":").replace("%2F", "/")
+        if tag not in self.server.images:
+            return self._send(404, {"message": f"No such image: {tag}"})
+        self._send(200, self.server.images[tag])
+
+    def do_POST(self):
+        self.server.requests.append(("POST", self.path))
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.split("?")[0].endswith("/build"):
+            with tarfile.open(fileobj=io.BytesIO(body)) as tar:
+                self.server.contexts.append(sorted(tar.getnames()))
+            trace = [{"id": "moby.buildkit.trace", "aux": base64.b64encode(payload).decode()} for payload in TRACE]
+            if "target=dev-cpu" in self.path:
+                trace.append({"errorDetail": {"message": "process did not complete successfully"}, "error": "x"})
+            return self._send(200, None, chunks=trace)
+        if "/push" in self.path:
+            auth = json.loads(base64.urlsafe_b64decode(self.headers["X-Registry-Auth"]))
+            assert auth == {}
+            chunks = [{"status": "Pushing"}]
+            if "localhost:5000" in self.path:
+                chunks.append({"errorDetail": {"message": "connection refused"}, "error": "connection refused"})
+            return self._send(200, None, chunks=chunks)
+        self._send(404, {"message": "not found"})
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    path = str(tmp_path / "docker.sock")
+    server = FakeDaemon(path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"unix://{path}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_engine_api(daemon, tmp_path, monkeypatch):
+    server, base_url = daemon
+    monkeypatch.setenv("DOCKER_CONFIG", str(tmp_path / "docker-config"))
+    os.chdir(tmp_path)
+    Path("requirements.txt").write_text("numpy\n")
+    Path("Dockerfile").write_text("FROM debian\n")
+
+    backend = DockerEngineAPI(base_url)
+    assert backend.inspect("agi:base-cpu") == ("sha256:1", 100)
+    assert backend.inspect("agi:dev-cpu") == (None, 0)
+    assert not backend.exists("agi:dev-cpu")
+
+    # Builds stream the BuildKit progress as plain progress lines
+    lines = list(backend.build("Dockerfile", "base-cpu", ["agi:base-cpu", "agi:latest"]))
+    assert lines[-1] == "#2 DONE 2.5s"
+    assert "t=agi%3Abase-cpu&t=agi%3Alatest" in server.requests[-1][1]
+    assert "requirements.txt" in server.contexts[-1]
+    with pytest.raises(DockerError, match="process did not complete successfully"):
+        list(backend.build("Dockerfile", "dev-cpu", ["agi:dev-cpu"]))
+
+    backend.push("agi:base-cpu")
+    with pytest.raises(DockerError, match="connection refused"):
+        backend.push("localhost:5000/agi:base-cpu")
+
+    # All the requests re-use the same connection
+    assert server.connections == 1
+
+
+def test_cli_backend(tmp_path):
+    docker = tmp_path / "docker"
+    docker.write_text(
+        "#!/bin/sh\n"
+        'if [ "$1" = "build" ]; then echo "#1 [base-cpu 1/1] FROM debian"; echo "step failed" >&2; exit 3; fi\n'
+        'if [ "$1" = "push" ]; then echo "denied: access denied" >&2; exit 1; fi\n'
+        'echo "sha256:1 100"\n'
+    )
+    docker.chmod(0o755)
+    backend = DockerCLI(executable=str(docker))
+    assert backend.inspect("agi:base-cpu") == ("sha256:1", 100)
+
+    # Build output is streamed line by line (stderr included), and the tail is reported on failure
+    lines = []
+    with pytest.raises(DockerError) as e:
+        for line in backend.build("Dockerfile", "base-cpu", ["agi:base-cpu"]):
+            lines.append(line)
+    assert lines == ["#1 [base-cpu 1/1] FROM debian", "step failed"]
+    assert str(e.value).endswith("step failed")
+
+    with pytest.raises(DockerError, match="denied"):
+        backend.push("agi:base-cpu")
+    with pytest.raises(DockerError):
+        list(DockerCLI(executable=str(tmp_path / "missing")).build("Dockerfile", "base-cpu", []))
+
+
+def test_fake_backend(tmp_path):
+    os.chdir(tmp_path)
+    config = AGIPackConfig(images={"base-cpu": ImageConfig(name="agipack")})
+    backend = FakeDockerBackend(logs=["#1 [base-cpu 1/1] FROM debian"], failures={"agipack:latest": ["timeout"]})
+    builder = AGIPack(config, backend=backend)
+    dockerfiles = builder.render()
+    assert builder.build(dockerfiles["base-cpu"], "base-cpu", tags=["agipack:base-cpu", "agipack:latest"])
+    assert backend.builds[0]["tags"] == ["agipack:base-cpu", "agipack:latest"]
+    assert builder.image_exists("agipack:base-cpu")
+    assert builder.lint(dockerfiles["base-cpu"]) and backend.linted == ["Dockerfile"]
+
+    results = AGIPackPusher(backend=backend, sleep=lambda _: None).push(["agipack:base-cpu", "agipack:latest"])
+    assert all(result.ok() for result in results.values())
+    assert results["agipack:latest"].attempts == 2
+    assert results["agipack:base-cpu"].image_id == "sha256:base-cpu"
+
+    assert isinstance(get_backend("cli"), DockerCLI)
+    with pytest.raises(ValueError):
+        get_backend("podman")
+
+
+def test_local_cache(tmp_path):
+    """Builds import the caches of the target (and its ancestors) exported by previous builds."""
+    os.chdir(tmp_path)
+    docker = tmp_path / "docker"
+    docker.write_text(
+        f"#!{sys.executable}\n"
+        "import json, os, sys\n"
+        "with open('calls.jsonl', 'a') as f:\n"
+        "    f.write(json.dumps(sys.argv[1:]) + '\\n')\n"
+        "for i, arg in enumerate(sys.argv):\n"
+        "    if arg == '--cache-to':\n"
+        "        options = dict(option.split('=', 1) for option in sys.argv[i + 1].split(','))\n"
+        "        os.makedirs(options['dest'], exist_ok=True)\n"
+    )
+    docker.chmod(0o755)
+    config = AGIPackConfig(
+        images={"base-cpu": ImageConfig(name="agipack"), "dev-cpu": ImageConfig(name="agipack", base="base-cpu")},
+        cache=CacheConfig(type="local", ref=".buildcache"),
+    )
+    builder = AGIPack(config, backend=DockerCLI(executable=str(docker)))
+    dockerfiles = builder.render()
+    builder.build(dockerfiles["base-cpu"], "base-cpu")
+    builder.build(dockerfiles["dev-cpu"], "dev-cpu")
+
+    calls = [json.loads(line) for line in Path("calls.jsonl").read_text().splitlines()]
+    base, dev = [call for call in calls if call[0] != "image"]
+    assert "--cache-from" not in base
+    assert base[base.index("--cache-to") + 1] == "type=local,dest=.buildcache/base-cpu,mode=max"
+    assert "--load" in base
+    assert dev[dev.index("--cache-from") + 1] == "type=local,src=.buildcache/base-cpu"
+    assert dev[dev.index("--cache-to") + 1] == "type=local,dest=.buildcache/dev-cpu,mode=max"
+    assert Path(".buildcache/dev-cpu").is_dir()
+
+    # Engine API builds can only import registry caches, and export inline caches
+    params = DockerEngineAPI._cache_params(
+        ["type=registry,ref=agipack:base-cpu", "type=local,src=.buildcache/base-cpu"], ["type=inline"]
+    )
+    assert params == [("cachefrom", '["agipack:base-cpu"]'), ("buildargs", '{"BUILDKIT_INLINE_CACHE": "1"}')]
@@ -0,0 +1,22 @@
+from pathlib import Path
+
+from agipack.ignore import DockerIgnore, walk_files
+
+
+def test_dockerignore():
+    ignore = DockerIgnore(["# comment", "", "*.pyc", "/build/", "**/__pycache__", "docs", "!docs/README.md"])
+    assert ignore.ignored("app.pyc") and not ignore.ignored("src/app.pyc")
+    assert ignore.ignored("build/lib/app.py") and not ignore.ignored("src/build/app.py")
+    assert ignore.ignored("./src/pkg/__pycache__/app.cpython-38.pyc")
+    assert ignore.ignored("docs/index.md") and not ignore.ignored("docs/README.md")
+    assert not ignore.ignored("src/app.py")
+    assert not DockerIgnore().ignored("app.pyc")
+
+
+def test_walk_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for filename in ["src/app.py", "src/app.pyc", ".git/HEAD", ".agipack/manifest.json", ".agipack-context-x/a"]:
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+        Path(filename).write_text("")
+    assert walk_files(".", DockerIgnore(["*.pyc", "**/*.pyc"])) == [Path("src/app.py")]
+    assert walk_files("src", DockerIgnore()) == [Path("src/app.py"), Path("src/app.pyc")]
@@ -0,0 +1,64 @@
+import copy
+
+import pytest
+
+from agipack.config import AGIPackConfig, ImageConfig
+from agipack.layers import invalidated_layers, package_name, split_layers, stage_layers
+
+
+def test_package_name():
+    assert package_name("torch==2.0.1") == "torch"
+    assert package_name("pytorch::pytorch=2.0") == "pytorch"
+    assert package_name("Scikit_Learn>=1.0") == "scikit-learn"
+    assert package_name("uvicorn[standard]") == "uvicorn"
+
+
+def test_split_layers():
+    packages = ["loguru", "torch==2.0.1", "nvidia-cudnn-cu11", "typer", "torchvision"]
+    assert split_layers(packages) == [packages]
+    assert split_layers([]) == []
+    assert split_layers(packages, "heavy") == [
+        ["torch==2.0.1"],
+        ["nvidia-cudnn-cu11"],
+        ["torchvision"],
+        ["loguru", "typer"],
+    ]
+    groups = {"torch": ["torch", "torchvision"], "cli": ["typer"]}
+    assert split_layers(packages, "groups", groups) == [
+        ["torch==2.0.1", "torchvision"],
+        ["typer"],
+        ["loguru", "nvidia-cudnn-cu11"],
+    ]
+    with pytest.raises(ValueError):
+        split_layers(packages, "unknown")
+
+
+def test_layering_config():
+    config = ImageConfig(base="debian:buster-slim", pip=["loguru", "torch"], layering="heavy")
+    assert config.pip_layers() == [["torch"], ["loguru"]]
+    assert [label for label, _ in stage_layers(config)] == ["base", "pip: torch", "pip: loguru", "workdir"]
+    with pytest.raises(ValueError):
+        ImageConfig(base="debian:buster-slim", layering="unknown")
+
+
+def test_invalidated_layers(test_data_dir):
+    old = AGIPackConfig.load_yaml(test_data_dir / "agibuild-wide.yaml")
+    for image_config in old.images.values():
+        image_config.layering = "heavy"
+    old.images["base-cpu"].pip = ["torch", "scikit-learn"]
+    assert all(not layers for layers in invalidated_layers(old, old).values())
+
+    # Adding a light package only invalidates the light layer (and the descendants)
+    new = copy.deepcopy(old)
+    new.images["base-cpu"].pip.append("loguru")
+    invalidated = invalidated_layers(old, new)
+    assert "pip: torch" not in invalidated["base-cpu"]
+    assert invalidated["base-cpu"][0] == "pip: scikit-learn loguru"
+    assert invalidated["dev-tools"] == [label for label, _ in stage_layers(new.images["dev-tools"])]
+
+    # Changing a leaf target only invalidates its own layers
+    new = copy.deepcopy(old)
+    new.images["test-cpu"].pip.append("pytest-xdist")
+    invalidated = invalidated_layers(old, new)
+    assert invalidated["test-cpu"] == ["pip: pytest pytest-xdist", "workdir"]
+    assert not invalidated["base-cpu"] and not invalidated["dev-cpu"] and not invalidated["dev-tools"]
@@ -0,0 +1,163 @@
+import base64
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import zipfile
+
+import pytest
+
+from agipack.builder import AGIPack
+from agipack.config import AGIPackConfig, MirrorConfig
+from agipack.lock import AGIPackLocker, lockfile_entries, lockfiles
+from agipack.manifest import compute_fingerprints, referenced_files
+
+CONFIG = """
+images:
+  base-cpu:
+    base: debian:buster-slim
+    python: "3.8.10"
+    pip:
+      - lock-a
+  dev-cpu:
+    base: base-cpu
+    pip:
+      - lock-c
+  test-cpu:
+    base: base-cpu
+    pip:
+      - lock-b==1.0
+  prod-cpu:
+    base: base-cpu
+"""
+
+
+def build_wheel(wheel_dir, name, version, requires=()):
+    """Build a minimal pure-python wheel (without any build backend)."""
+    dist_info = f"{name}-{version}.dist-info"
+    metadata = f"Metadata-Version: 2.1\nName: {name.replace('_', '-')}\nVersion: {version}\n"
+    metadata += "".join(f"Requires-Dist: {requirement}\n" for requirement in requires)
+    files = {
+        f"{name}/__init__.py": "",
+        f"{dist_info}/METADATA": metadata,
+        f"{dist_info}/WHEEL": "Wheel-Version: 1.0\nGenerator: test\nRoot-Is-Purelib: true\nTag: py3-none-any\n",
+    }
+    filename = wheel_dir / f"{name}-{version}-py3-none-any.whl"
+    with zipfile.ZipFile(filename, "w") as f:
+        records = []
+        for path, content in files.items():
+            f.writestr(path, content)
+            digest = base64.urlsafe_b64encode(hashlib.sha256(content.encode()).digest()).rstrip(b"=").decode()
+            records.append(f"{path},sha256={digest},{len(content)}")
+        records.append(f"{dist_info}/RECORD,,")
+        f.writestr(f"{dist_info}/RECORD", "\n".join(records) + "\n")
+    return filename
+
+
+@pytest.fixture
+def wheel_dir(tmp_path):
+    wheel_dir = tmp_path / "wheels"
+    wheel_dir.mkdir()
+    build_wheel(wheel_dir, "lock_a", "1.0", requires=["lock-b>=1.0"])
+    build_wheel(wheel_dir, "lock_b", "1.0")
+    build_wheel(wheel_dir, "lock_b", "2.0")
+    build_wheel(wheel_dir, "lock_c", "1.0")
+    return wheel_dir
+
+
+@pytest.fixture
+def config(tmp_path):
+    os.chdir(tmp_path)
+    (tmp_path / "agibuild.yaml").write_text(CONFIG)
+    return AGIPackConfig.load_yaml("agibuild.yaml")
+
+
+def test_lock_pip(config, wheel_dir):
+    locker = AGIPackLocker(config, no_index=True, find_links=[str(wheel_dir)])
+    results = locker.lock()
+    assert list(results.keys()) == ["base-cpu", "dev-cpu", "test-cpu", "prod-cpu"]
+
+    # Targets only lock the packages they add (or change) on top of their parent
+    assert [(p.name, p.version) for p in results["base-cpu"].pip] == [("lock-a", "1.0"), ("lock-b", "2.0")]
+    assert [(p.name, p.version) for p in results["dev-cpu"].pip] == [("lock-c", "1.0")]
+    assert [(p.name, p.version) for p in results["test-cpu"].pip] == [("lock-b", "1.0")]
+    assert results["prod-cpu"].lockfiles == {}
+    assert lockfiles("prod-cpu") == {}
+
+    # Packages are pinned with the hashes of their distributions
+    lockfile = lockfiles("base-cpu")["pip"]
+    digest = hashlib.sha256((wheel_dir / "lock_b-2.0-py3-none-any.whl").read_bytes()).hexdigest()
+    assert f"--hash=sha256:{digest}" in lockfile.read_text()
+    assert lockfile_entries(lockfile) == ["lock-a==1.0 \\", "lock-b==2.0 \\"]
+
+    # The lockfile installs offline, without dependency resolution
+    subprocess.run(
+        [sys.executable, "-m", "pip", "install", "--quiet", "--no-index", "--find-links", str(wheel_dir)]
+        + ["--no-deps", "--require-hashes", "-r", str(lockfile), "--target", "site-packages"],
+        check=True,
+        stderr=subprocess.DEVNULL,
+    )
+    assert os.path.exists("site-packages/lock_b-2.0.dist-info")
+
+    # Only the selected targets are written
+    os.remove(lockfiles("dev-cpu")["pip"])
+    assert list(locker.lock(targets=["dev-cpu"]).keys()) == ["dev-cpu"]
+    assert "pip" in lockfiles("dev-cpu")
+
+    with pytest.raises(ValueError):
+        AGIPackLocker(config, no_index=True).lock()
+
+
+def test_lock_render(config, wheel_dir):
+    AGIPackLocker(config, no_index=True, find_links=[str(wheel_dir)]).lock()
+
+    # Unlocked renders are unchanged, locked renders install from the lockfiles
+    AGIPack(config).render(filename="Dockerfile")
+    content = open("Dockerfile").read()
+    assert '"lock-a"' in content
+    assert "--require-hashes" not in content
+    os.remove("Dockerfile")
+    AGIPack(config).render(filename="Dockerfile", locked=True)
+    content = open("Dockerfile").read()
+    assert '"lock-a"' not in content
+    assert "COPY agibuild.lock/base-cpu.pip.txt /tmp/locks/agibuild.lock/base-cpu.pip.txt" in content
+    assert "--no-deps --require-hashes -r /tmp/locks/agibuild.lock/dev-cpu.pip.txt" in content
+    assert "prod-cpu.pip.txt" not in content
+
+    # The lockfiles of locked images are part of the build context, and the cache key of the targets
+    assert lockfiles("base-cpu")["pip"] in referenced_files(config, "base-cpu", locked=True)
+    assert lockfiles("base-cpu")["pip"] not in referenced_files(config, "base-cpu")
+    fingerprints = compute_fingerprints(config, {}, locked=True)
+    unlocked = compute_fingerprints(config, {})
+    lockfiles("dev-cpu")["pip"].write_text("lock-c==1.0\n")
+    updated = compute_fingerprints(config, {}, locked=True)
+    assert [t for t in fingerprints if fingerprints[t] != updated[t]] == ["dev-cpu"]
+    assert compute_fingerprints(config, {}) == unlocked
+
+
+def test_lock_conda(tmp_path):
+    os.chdir(tmp_path)
+    (tmp_path / "agibuild.yaml").write_text(
+        CONFIG.replace("pip:\n      - lock-a", "conda:\n      - numpy -c conda-forge").replace("lock-c", "pandas")
+    )
+    config = AGIPackConfig.load_yaml("agibuild.yaml")
+    commands = []
+
+    def runner(cmd):
+        commands.append(cmd)
+        fetch = [{"url": "https://conda.anaconda.org/conda-forge/linux-64/numpy-1.24.0.conda", "md5": "abc"}]
+        return subprocess.CompletedProcess(cmd, 0, stdout=json.dumps({"actions": {"FETCH": fetch}}), stderr="")
+
+    results = AGIPackLocker(config, conda_exe="mamba", runner=runner).lock(targets=["base-cpu"])
+    assert results["base-cpu"].conda == ["https://conda.anaconda.org/conda-forge/linux-64/numpy-1.24.0.conda#abc"]
+    assert commands[0][2:7] == ["mamba", "create", "--dry-run", "--json", "-n"]
+    assert commands[0][-3:] == ["numpy", "-c", "conda-forge"]
+    content = lockfiles("base-cpu")["conda"].read_text().splitlines()
+    assert content[2:] == ["@EXPLICIT", "https://conda.anaconda.org/conda-forge/linux-64/numpy-1.24.0.conda#abc"]
+    assert commands[0][8:10] == ["-c", "conda-forge"]
+
+    # Packages are resolved against the conda mirror of the images, if any
+    config.mirrors = MirrorConfig(conda="https://mirror.example.com/conda-forge")
+    AGIPackLocker(config, conda_exe="mamba", runner=runner).lock(targets=["base-cpu"])
+    assert commands[-1][8:11] == ["--override-channels", "-c", "https://mirror.example.com/conda-forge"]
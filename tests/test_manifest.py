@@ -0,0 +1,105 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from agipack.builder import AGIPack
+from agipack.config import AGIPackConfig
+from agipack.manifest import BuildManifest, compute_fingerprints
+
+
+@pytest.fixture
+def config(test_data_dir):
+    return AGIPackConfig.load_yaml(test_data_dir / "agibuild-wide.yaml")
+
+
+def test_fingerprints(config):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        builder = AGIPack(config)
+        builder.render(filename=str(Path(tmp_dir) / "Dockerfile"))
+        fingerprints = builder.fingerprints()
+        assert set(fingerprints.keys()) == set(config.images.keys())
+        assert len(set(fingerprints.values())) == len(fingerprints)
+        assert compute_fingerprints(config, builder.stages) == fingerprints
+
+        # Changing a child only invalidates the child and its descendants
+        config.images["dev-cpu"].system.append("vim")
+        updated = compute_fingerprints(config, builder.stages)
+        assert updated["base-cpu"] == fingerprints["base-cpu"]
+        assert updated["test-cpu"] == fingerprints["test-cpu"]
+        assert updated["dev-cpu"] != fingerprints["dev-cpu"]
+        assert updated["dev-tools"] != fingerprints["dev-tools"]
+
+        # Changing the parent invalidates all the targets
+        config.images["base-cpu"].pip.append("numpy")
+        updated = compute_fingerprints(config, builder.stages)
+        assert all(updated[target] != fingerprints[target] for target in fingerprints)
+
+        # The fingerprints are cached until the next render
+        assert builder.fingerprints() is fingerprints
+        builder.render(filename=str(Path(tmp_dir) / "Dockerfile"))
+        assert builder.fingerprints() == compute_fingerprints(config, builder.stages) != fingerprints
+
+
+def test_fingerprints_referenced_files(config):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        Path("requirements.txt").write_text("numpy\n")
+        config.images["test-cpu"].requirements.append("requirements.txt")
+        fingerprints = compute_fingerprints(config, {})
+
+        Path("requirements.txt").write_text("numpy==1.24.0\n")
+        updated = compute_fingerprints(config, {})
+        assert updated["test-cpu"] != fingerprints["test-cpu"]
+        assert updated["dev-cpu"] == fingerprints["dev-cpu"]
+
+
+def test_fingerprints_build_context(config, tmp_path):
+    os.chdir(tmp_path)
+    Path("src").mkdir()
+    Path("src/app.py").write_text("print('hello')\n")
+    Path(".dockerignore").write_text("*.log\n")
+    config.images["dev-cpu"].add.append(".:/app")
+    fingerprints = compute_fingerprints(config, {})
+
+    # The build manifest, VCS state and ignored files of a `.` add source are not part of the fingerprint
+    BuildManifest(".agipack/manifest.json").update("dev-cpu", fingerprints["dev-cpu"], ["agipack:dev-cpu"])
+    Path(".git").mkdir()
+    Path(".git/HEAD").write_text("ref: refs/heads/main\n")
+    Path("build.log").write_text("...")
+    assert compute_fingerprints(config, {}) == fingerprints
+
+    Path("src/app.py").write_text("print('hello world')\n")
+    updated = compute_fingerprints(config, {})
+    assert updated["base-cpu"] == fingerprints["base-cpu"]
+    assert updated["dev-cpu"] != fingerprints["dev-cpu"]
+
+
+def test_manifest(config):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = Path(tmp_dir) / ".agipack" / "manifest.json"
+        manifest = BuildManifest(filename)
+        assert not manifest.is_fresh("abc", ["agipack:base-cpu"], exists=lambda tag: True)
+
+        manifest.update("base-cpu", "abc", ["agipack:base-cpu"])
+        assert filename.exists()
+
+        # Reload the manifest from disk
+        manifest = BuildManifest(filename)
+        assert manifest.get("agipack:base-cpu")["target"] == "base-cpu"
+        assert manifest.is_fresh("abc", ["agipack:base-cpu"], exists=lambda tag: True)
+        assert not manifest.is_fresh("abc", ["agipack:base-cpu"], exists=lambda tag: False)
+        assert not manifest.is_fresh("def", ["agipack:base-cpu"], exists=lambda tag: True)
+        assert not manifest.is_fresh("abc", ["agipack:base-cpu", "agipack:latest"], exists=lambda tag: True)
+
+
+def test_build_skips_unchanged(config, monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        builder = AGIPack(config)
+        filename = str(Path(tmp_dir) / "Dockerfile")
+        builder.render(filename=filename)
+        manifest = BuildManifest(Path(tmp_dir) / "manifest.json")
+        manifest.update("base-cpu", builder.fingerprints()["base-cpu"], ["agipack:base-cpu"])
+        monkeypatch.setattr(builder, "image_exists", lambda tag: True)
+        assert builder.build(filename, "base-cpu", tags=["agipack:base-cpu"], manifest=manifest) is False
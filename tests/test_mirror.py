@@ -0,0 +1,133 @@
+import hashlib
+import os
+import subprocess
+
+import pytest
+
+from agipack.builder import AGIPack
+from agipack.config import AGIPackConfig, BootstrapConfig, MirrorConfig
+from agipack.context import context_paths
+from agipack.lock import lockfile_path
+from agipack.mirror import AGIPackMirror
+
+CONFIG = """
+images:
+  base-cpu:
+    base: debian:buster-slim
+    python: "3.8.10"
+    system:
+      - wget
+    conda:
+      - numpy
+    pip:
+      - mirror-a
+  dev-cpu:
+    base: base-cpu
+    pip:
+      - mirror-b
+    requirements:
+      - requirements.txt
+"""
+
+
+@pytest.fixture
+def config(tmp_path):
+    os.chdir(tmp_path)
+    (tmp_path / "agibuild.yaml").write_text(CONFIG)
+    (tmp_path / "requirements.txt").write_text("mirror-c\n")
+    return AGIPackConfig.load_yaml("agibuild.yaml")
+
+
+def test_mirror_config():
+    mirrors = MirrorConfig.parse("apt=http://apt-cacher:3142,pip=http://devpi/simple,wheels=wheels,offline=true")
+    assert mirrors.apt_options() == " -o Acquire::http::Proxy=http://apt-cacher:3142"
+    assert mirrors.pip_options() == " --index-url http://devpi/simple --find-links /tmp/mirror/wheels --no-index"
+    assert mirrors.wheels_mount() == "--mount=type=bind,source=wheels,target=/tmp/mirror/wheels"
+    assert mirrors.local_paths() == ["wheels"]
+    assert MirrorConfig(wheels="http://wheels.lan/").pip_options() == " --find-links http://wheels.lan/"
+    assert MirrorConfig().pip_options() == "" and MirrorConfig().installer_mount() is None
+
+    with pytest.raises(ValueError):
+        MirrorConfig(apt="apt-cacher:3142")
+    with pytest.raises(ValueError):
+        MirrorConfig(offline=True)
+
+
+def test_mirror_render(config):
+    config.mirrors = MirrorConfig(
+        apt="http://apt-cacher:3142", conda="http://conda.lan/conda-forge", wheels="mirror/wheels", offline=True
+    )
+    AGIPack(config).render(filename="Dockerfile", minimal_context=True)
+    content = open("Dockerfile").read()
+    assert "apt-get -o Acquire::http::Proxy=http://apt-cacher:3142 -y update" in content
+    assert "mamba install -yv --override-channels -c http://conda.lan/conda-forge" in content
+    assert content.count("--mount=type=bind,source=mirror/wheels,target=/tmp/mirror/wheels") == 4
+    assert "pip install --find-links /tmp/mirror/wheels --no-index -r /tmp/reqs/requirements.txt" in content
+    assert 'curl -fsSLo "${installer}.$$" "${url}"' in content
+
+    # The local mirrors are part of the (minimal) build context
+    assert "!mirror/wheels" in open("Dockerfile.dockerignore").read().splitlines()
+    assert context_paths(config, "base-cpu")[-1].as_posix() == "mirror/wheels"
+
+    # A local installer is bind-mounted instead of downloaded
+    config.mirrors = MirrorConfig(installer="mirror/miniconda.sh")
+    AGIPack(config).render(filename="Dockerfile")
+    content = open("Dockerfile").read()
+    assert "--mount=type=bind,source=mirror/miniconda.sh,target=/tmp/mirror/installer" in content
+    assert '&& installer="/tmp/mirror/installer"' in content
+    assert "curl -fsSLo" not in content
+
+
+def test_mirror(config, tmp_path):
+    installer = tmp_path / "Miniconda3.sh"
+    installer.write_text("#!/bin/sh\n")
+    commands = []
+
+    def runner(cmd):
+        commands.append(cmd)
+        dest = cmd[cmd.index("--dest") + 1]
+        for package in cmd[cmd.index("--only-binary=:all:") + 1 :]:
+            if package.startswith("mirror-") or package == "pip":
+                open(os.path.join(dest, f"{package.replace('-', '_')}-1.0-py3-none-any.whl"), "w").close()
+        return subprocess.CompletedProcess(cmd, 0, stdout="", stderr="")
+
+    mirror = AGIPackMirror(config, mirror_dir="mirror", installer_url=installer.as_uri(), runner=runner)
+    result = mirror.mirror()
+    assert result.installer == "mirror/Miniconda3-latest-Linux-x86_64.sh"
+    assert open(result.installer).read() == "#!/bin/sh\n"
+    assert result.wheels == [f"{name}-1.0-py3-none-any.whl" for name in ["mirror_a", "mirror_b", "pip"]]
+    assert result.mirrors == MirrorConfig(wheels="mirror/wheels", installer=result.installer)
+
+    # Wheels are downloaded for the image's python version / platform, with the packages of the ancestors
+    assert commands[0][-5:] == ["--python-version", "3.8", "--platform", "manylinux2014_x86_64", "pip"]
+    assert commands[1][-1] == "mirror-a"
+    assert commands[2][-4:] == ["-r", "requirements.txt", "mirror-a", "mirror-b"]
+
+    # Locked mirrors download the pinned packages of the lineage (without dependencies)
+    lockfile_path("base-cpu", "pip").parent.mkdir()
+    lockfile_path("base-cpu", "pip").write_text("mirror-a==1.0\n")
+    commands.clear()
+    AGIPackMirror(config, mirror_dir="mirror", locked=True, runner=runner).mirror(targets=["dev-cpu"])
+    assert commands[-1][-3:] == ["--no-deps", "-r", "agibuild.lock/base-cpu.pip.txt"]
+
+    with pytest.raises(ValueError):
+        mirror.mirror(targets=["unknown"])
+
+
+def test_mirror_installer_checksum(config, tmp_path):
+    installer = tmp_path / "micromamba"
+    installer.write_bytes(b"micromamba")
+    digest = hashlib.sha256(b"micromamba").hexdigest()
+
+    # The installer is only downloaded once, and verified against its pinned checksum
+    config.bootstrap = BootstrapConfig(installer="micromamba", version="1.5.8-0", sha256={"x86_64": digest})
+    mirror = AGIPackMirror(config, mirror_dir="mirror", installer_url=installer.as_uri())
+    assert mirror.fetch_installer() == "mirror/micromamba-1.5.8-0-linux-x86_64"
+    installer.write_bytes(b"tampered")
+    assert mirror.fetch_installer() == "mirror/micromamba-1.5.8-0-linux-x86_64"
+
+    config.bootstrap = BootstrapConfig(installer="micromamba", version="1.5.9-0", sha256={"x86_64": digest})
+    mirror = AGIPackMirror(config, mirror_dir="mirror", installer_url=installer.as_uri())
+    with pytest.raises(ValueError, match="checksum mismatch"):
+        mirror.fetch_installer()
+    assert not os.path.exists("mirror/micromamba-1.5.9-0-linux-x86_64")
@@ -0,0 +1,43 @@
+import os
+
+from rich.console import Console
+from typer.testing import CliRunner
+
+from agipack.builder import AGIPack
+from agipack.cli import app
+from agipack.config import AGIPackConfig
+from agipack.constants import AGIPACK_SAMPLE_FILENAME
+from agipack.docker import FakeDockerBackend
+from agipack.progress import BuildProgressDisplay
+
+
+def test_progress_display(test_data_dir):
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-with-deps.yaml")
+    logs = (test_data_dir / "buildkit-progress.txt").read_text().splitlines()
+    builder = AGIPack(config, backend=FakeDockerBackend(logs=logs, failures={"dev-cpu": ["exit code: 1"]}))
+    display = BuildProgressDisplay(list(config.images.keys()))
+    assert builder.build("Dockerfile", "base-cpu", on_event=display.update)
+    try:
+        builder.build("Dockerfile", "dev-cpu", on_event=display.update)
+    except Exception:
+        pass
+
+    base, dev = display.targets["base-cpu"], display.targets["dev-cpu"]
+    steps = builder.reports["base-cpu"].steps
+    assert base.status == "done" and base.finished == len([step for step in steps if step.status != "error"])
+    assert base.cached == 2 and sum(base.transferred.values()) == 3120
+    assert dev.status == "failed" and dev.step == "exit code: 1"
+
+    console = Console(record=True, width=200)
+    console.print(display)
+    output = console.export_text()
+    assert "base-cpu" in output and "done" in output and "failed" in output
+
+
+def test_cli_progress(tmp_path):
+    os.chdir(tmp_path)
+    result = CliRunner().invoke(
+        app, ["build", "-c", str(AGIPACK_SAMPLE_FILENAME), "--backend", "fake", "--progress", "live", "--force"]
+    )
+    assert result.exit_code == 0, result.output
+    assert "Successfully built image" in result.output
@@ -0,0 +1,118 @@
+import subprocess
+import threading
+
+import pytest
+
+from agipack.pusher import AGIPackPusher, PushResult, push_wall_time
+
+
+class FakeRegistry:
+    """Local stand-in for `docker image inspect` / `docker push` against a registry."""
+
+    def __init__(self, images, failures=None):
+        self.images = images
+        self.failures = dict(failures or {})
+        self.pushed, self.lock = [], threading.Lock()
+
+    def __call__(self, cmd):
+        if cmd[:3] == ["docker", "image", "inspect"]:
+            tag = cmd[-1]
+            if tag not in self.images:
+                return subprocess.CompletedProcess(cmd, 1, stdout="", stderr=f"No such image: {tag}")
+            image_id, size = self.images[tag]
+            return subprocess.CompletedProcess(cmd, 0, stdout=f"{image_id} {size}\n", stderr="")
+        if cmd[:2] == ["docker", "push"]:
+            tag = cmd[-1]
+            with self.lock:
+                errors = self.failures.get(tag, [])
+                if errors:
+                    return subprocess.CompletedProcess(cmd, 1, stdout="", stderr=errors.pop(0))
+                self.pushed.append(tag)
+            return subprocess.CompletedProcess(cmd, 0, stdout="", stderr="")
+        raise ValueError(f"Unexpected command {cmd}")
+
+
+def test_repository():
+    assert AGIPackPusher.repository("agi:base-cpu") == "agi"
+    assert AGIPackPusher.repository("localhost:5000/agi:base-cpu") == "localhost:5000/agi"
+    assert AGIPackPusher.repository("localhost:5000/agi") == "localhost:5000/agi"
+    assert AGIPackPusher.repository("agi@sha256:abc") == "agi"
+
+
+def test_push_dedupe():
+    registry = FakeRegistry(
+        {
+            "localhost:5000/agi:base-cpu": ("sha256:1", 100),
+            "localhost:5000/agi:latest": ("sha256:1", 100),
+            "localhost:5001/agi:latest": ("sha256:1", 100),
+            "localhost:5000/agi:dev-cpu": ("sha256:2", 200),
+        }
+    )
+    tags = list(registry.images.keys())
+    results = AGIPackPusher(jobs=4, runner=registry).push(tags + tags[:1])
+    assert list(results.keys()) == tags
+    assert all(result.ok() for result in results.values())
+    assert sorted(registry.pushed) == sorted(tags)
+
+    # Tags for the same image and repository are pushed in order
+    assert registry.pushed.index("localhost:5000/agi:base-cpu") < registry.pushed.index("localhost:5000/agi:latest")
+    assert results["localhost:5000/agi:dev-cpu"].size == 200
+    assert results["localhost:5000/agi:dev-cpu"].image_id == "sha256:2"
+
+
+def test_push_wall_time():
+    results = [
+        PushResult(tag="agi:a", started=0.0, duration=2.0),
+        PushResult(tag="agi:b", started=1.0, duration=2.0),
+        PushResult(tag="agi:c", started=5.0, duration=1.0),
+        PushResult(tag="agi:d", started=5.2, duration=0.5),
+    ]
+    # Concurrent pushes are only counted once
+    assert push_wall_time(results) == pytest.approx(4.0)
+    assert push_wall_time([]) == 0.0
+
+
+def test_push_retries():
+    registry = FakeRegistry(
+        {"agi:base-cpu": ("sha256:1", 100), "agi:dev-cpu": ("sha256:2", 200)},
+        failures={
+            "agi:base-cpu": ["net/http: TLS handshake timeout", "503 Service Unavailable"],
+            "agi:dev-cpu": ["denied: requested access to the resource is denied"],
+        },
+    )
+    delays = []
+    results = AGIPackPusher(jobs=2, retries=3, backoff=0.5, runner=registry, sleep=delays.append).push(
+        ["agi:base-cpu", "agi:dev-cpu"]
+    )
+    assert results["agi:base-cpu"].ok()
+    assert results["agi:base-cpu"].attempts == 3
+    assert delays == [0.5, 1.0]
+
+    # Non-transient errors are not retried
+    assert not results["agi:dev-cpu"].ok()
+    assert results["agi:dev-cpu"].attempts == 1
+    assert "denied" in results["agi:dev-cpu"].error
+
+
+def test_push_retries_exhausted():
+    registry = FakeRegistry({"agi:base-cpu": ("sha256:1", 100)}, failures={"agi:base-cpu": ["i/o timeout"] * 5})
+    results = AGIPackPusher(retries=2, runner=registry, sleep=lambda _: None).push(["agi:base-cpu"])
+    assert not results["agi:base-cpu"].ok()
+    assert results["agi:base-cpu"].attempts == 3
+
+    with pytest.raises(ValueError):
+        AGIPackPusher(jobs=0)
+
+
+@pytest.mark.docker
+def test_push_local_registry():
+    name, tag = "agipack-test-registry", "localhost:5000/agipack-test:latest"
+    subprocess.run(["docker", "run", "-d", "--rm", "-p", "5000:5000", "--name", name, "registry:2"], check=True)
+    try:
+        subprocess.run(["docker", "pull", "busybox:latest"], check=True)
+        subprocess.run(["docker", "tag", "busybox:latest", tag], check=True)
+        results = AGIPackPusher(jobs=2).push([tag])
+        assert results[tag].ok()
+        assert results[tag].size > 0
+    finally:
+        subprocess.run(["docker", "rm", "-f", name])
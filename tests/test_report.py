@@ -0,0 +1,133 @@
+import json
+import os
+
+import pytest
+
+from agipack.builder import AGIPack
+from agipack.config import AGIPackConfig, BootstrapConfig, CacheConfig, MirrorConfig
+from agipack.docker import DockerError, FakeDockerBackend
+from agipack.report import BuildProgressParser, BuildReport, attribute_step, format_size
+
+
+def test_attribute_step():
+    assert attribute_step("FROM docker.io/library/debian:buster-slim") == "base"
+    assert attribute_step("RUN apt-get -y update && apt-get -y install wget") == "system"
+    assert attribute_step("RUN mamba install -yv numpy") == "conda"
+    assert attribute_step('RUN pip install --cache-dir /var/cache/pip "torch"') == "pip"
+    assert attribute_step("COPY requirements.txt /tmp/reqs/requirements.txt") == "requirements"
+    assert attribute_step("ADD ./src /app/src") == "add"
+    assert attribute_step("WORKDIR /app") == "workdir"
+
+
+def test_attribute_step_markers(test_data_dir, tmp_path):
+    # The rendered steps are attributed by their markers, whatever the installer and mirrors
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-with-deps.yaml")
+    config.bootstrap = BootstrapConfig(installer="micromamba")
+    config.mirrors = MirrorConfig(pip="https://pypi.example.com/simple")
+    AGIPack(config).render(filename=str(tmp_path / "Dockerfile"))
+    content = (tmp_path / "Dockerfile").read_text().replace("\\\n", "")
+    steps = {line.split(" && echo ")[-1]: line for line in content.splitlines() if line.startswith("RUN")}
+    assert attribute_step(steps['"python install complete"']) == "python"
+    assert "micromamba create" in steps['"python install complete"']
+    assert attribute_step(steps['"pip upgrade complete"']) == "python"
+    assert "--index-url https://pypi.example.com/simple --upgrade pip" in steps['"pip upgrade complete"']
+    assert attribute_step(steps['"base system install complete"']) == "system"
+
+    # Steps without markers fall back to matching the commands
+    assert attribute_step("RUN pip install --index-url https://pypi.example.com/simple --upgrade pip") == "python"
+    assert attribute_step("RUN install -D -m 755 micromamba /opt/conda/bin/micromamba") == "python"
+
+
+def test_parse_progress(test_data_dir):
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-with-deps.yaml")
+    with open(test_data_dir / "buildkit-progress.txt") as f:
+        steps = BuildProgressParser(config.images).parse(f)
+
+    steps = {step.id: step for step in steps}
+    assert steps[1].stage is None
+    assert steps[3].stage == "base-cpu" and steps[3].cached
+    assert steps[5].config_field == "system" and steps[5].duration == 4.5 and not steps[5].cached
+    assert steps[6].config_field == "python"
+    assert steps[7].config_field == "conda" and steps[7].duration == 70.0
+    assert steps[8].config_field == "pip"
+    assert steps[10].config_field == "run"
+    assert steps[11].stage == "dev-cpu" and steps[11].status == "error"
+
+
+def test_build_report(test_data_dir):
+    with open(test_data_dir / "buildkit-progress.txt") as f:
+        steps = BuildProgressParser().parse(f)
+    report = BuildReport.from_steps("dev-cpu", steps, wall_time=125.0)
+    assert len(report.steps) == 9
+    assert report.total_duration == 120.3
+
+    summary = report.summary()
+    assert list(summary.keys())[0] == "conda"
+    assert round(summary["conda"]["percent"]) == 58
+    assert summary["system"]["cached"] == 1 and summary["system"]["steps"] == 3
+
+    data = json.loads(report.to_json())
+    assert data["target"] == "dev-cpu"
+    assert len(data["steps"]) == 9
+    assert "| conda | 70.0 | 58% | 1 | 0 |" in report.to_markdown()
+
+
+def test_builder_report(test_data_dir, tmp_path):
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-with-deps.yaml")
+    # Stand-in for `docker build --progress=plain` that replays a recorded build
+    logs = (test_data_dir / "buildkit-progress.txt").read_text().splitlines()
+    backend = FakeDockerBackend(logs=logs, failures={"dev-cpu": ["failed", "failed"]})
+    builder = AGIPack(config, backend=backend)
+    events = list(builder.build_events("Dockerfile", "base-cpu", report_dir=tmp_path))
+    assert backend.builds[0]["tags"] == ["agipack:base-cpu"]
+    assert events[0].type == "build_started" and events[-1].type == "build_finished"
+    assert builder.reports["base-cpu"].summary()["conda"]["duration"] == 70.0
+    assert (tmp_path / "base-cpu.json").exists()
+    assert (tmp_path / "base-cpu.md").exists()
+
+    # Each step is reported as started, then cached / finished (with its duration)
+    by_type = {}
+    for event in events:
+        by_type.setdefault(event.type, []).append(event)
+    assert by_type["step_cached"][0].step.name == "base-cpu  1/10"
+    conda = [event for event in by_type["step_finished"] if event.step.config_field == "conda"]
+    assert conda[0].duration == 70.0
+    assert by_type["step_progress"][0].current == 3120
+    assert len(by_type["step_started"]) == len(builder.reports["base-cpu"].steps) + 2
+
+    # Failures are reported with the tail of the build output
+    events = list(builder.build_events("Dockerfile", "dev-cpu"))
+    assert events[-1].type == "error" and events[-1].message == "failed"
+    assert events[-1].tail[-1] == logs[-1]
+    with pytest.raises(Exception, match="failed"):
+        builder.build("Dockerfile", "dev-cpu", on_event=lambda event: None)
+
+
+def test_image_sizes(test_data_dir, tmp_path):
+    os.chdir(tmp_path)
+    assert format_size(512) == "512 B"
+    assert format_size(3 * 1024**3) == "3.0 GB"
+
+    config = AGIPackConfig.load_yaml(test_data_dir / "agibuild-with-deps.yaml")
+    config.cache = CacheConfig(type="local", ref=".buildcache")
+    logs = ["#1 [base-cpu-build 1/1] FROM debian", "#1 DONE 1.0s"]
+    backend = FakeDockerBackend(logs=logs, sizes={"base-cpu": 400 * 1024**2, "base-cpu-build": 1600 * 1024**2})
+    builder = AGIPack(config, backend=backend)
+    builder.render(env="prod", slim=True, filename="Dockerfile")
+    assert builder.build("Dockerfile", "base-cpu")
+
+    # The build stage is built (and tagged) first, and the runtime stage from its cache, with the same cache options
+    assert [build["tags"] for build in backend.builds] == [["agipack:base-cpu-build"], ["agipack:base-cpu"]]
+    assert backend.builds[0]["cache_to"] == backend.builds[1]["cache_to"] != []
+    report = builder.reports["base-cpu"]
+    assert report.size_summary() == "400.0 MB (build stage: 1.6 GB, -75%)"
+    assert json.loads(report.to_json())["image_size"] == 400 * 1024**2
+    assert [step.name for step in report.steps] == ["base-cpu-build 1/1"]
+
+    # Failing to measure the sizes does not fail the build
+    def inspect(tag):
+        raise DockerError("inspect failed")
+
+    backend.inspect = inspect
+    assert builder.build("Dockerfile", "base-cpu")
+    assert builder.reports["base-cpu"].image_size == 0
@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from agipack.config import AGIPackConfig
+from agipack.scheduler import AGIPackScheduler
+
+
+@pytest.fixture
+def config(test_data_dir):
+    return AGIPackConfig.load_yaml(test_data_dir / "agibuild-wide.yaml")
+
+
+def test_scheduler_builds_parents_first(config):
+    order, lock = [], threading.Lock()
+
+    def build_fn(target):
+        time.sleep(0.01)
+        with lock:
+            order.append(target)
+
+    results = AGIPackScheduler(config, jobs=4).run(build_fn)
+    assert set(results.keys()) == set(config.images.keys())
+    assert all(result.ok() for result in results.values())
+    assert order[0] == "base-cpu"
+    assert order.index("dev-cpu") < order.index("dev-tools")
+
+
+def test_scheduler_builds_siblings_concurrently(config):
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def build_fn(target):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+
+    AGIPackScheduler(config, jobs=3).run(build_fn)
+    assert peak[0] == 3
+
+    active[0], peak[0] = 0, 0
+    AGIPackScheduler(config, jobs=1).run(build_fn)
+    assert peak[0] == 1
+
+
+def test_scheduler_selected_targets(config):
+    built = []
+    results = AGIPackScheduler(config, jobs=2).run(built.append, targets=["dev-tools", "prod-cpu"])
+    assert sorted(built) == ["dev-tools", "prod-cpu"]
+    assert sorted(results.keys()) == ["dev-tools", "prod-cpu"]
+
+    with pytest.raises(ValueError):
+        AGIPackScheduler(config).run(built.append, targets=["unknown"])
+
+
+def test_scheduler_failures(config):
+    def build_fn(target):
+        if target == "dev-cpu":
+            raise Exception("build failed")
+        time.sleep(0.01)
+
+    # Keep going: independent siblings are still built, descendants are skipped
+    results = AGIPackScheduler(config, jobs=1, fail_fast=False).run(build_fn)
+    assert results["dev-cpu"].status == "failed"
+    assert results["dev-cpu"].error == "build failed"
+    assert results["dev-tools"].status == "skipped"
+    assert results["test-cpu"].ok() and results["prod-cpu"].ok()
+
+    # Fail fast: no new builds are scheduled after the failure
+    results = AGIPackScheduler(config, jobs=1, fail_fast=True).run(build_fn)
+    assert results["dev-cpu"].status == "failed"
+    assert results["dev-tools"].status == "skipped"
+    assert {results["test-cpu"].status, results["prod-cpu"].status} == {"cancelled"}
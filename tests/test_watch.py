@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+
+import pytest
+
+from agipack import docker
+from agipack.cli import _watch
+from agipack.docker import FakeDockerBackend
+from agipack.watch import AGIPackWatcher, snapshot
+
+CONFIG = """
+images:
+  base-cpu:
+    base: debian:buster-slim
+    python: "3.8.10"
+    requirements:
+      - requirements.txt
+  dev-cpu:
+    base: base-cpu
+    pip:
+      - pytest
+  prod-cpu:
+    base: base-cpu
+"""
+
+
+def _touch(path, content):
+    path.write_text(content)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    os.chdir(tmp_path)
+    (tmp_path / "agibuild.yaml").write_text(CONFIG)
+    (tmp_path / "requirements.txt").write_text("numpy\n")
+    return AGIPackWatcher("agibuild.yaml", interval=0.01, debounce=0.05, output_dir="docker")
+
+
+def test_snapshot(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "b.txt").write_text("b")
+    (tmp_path / "c.txt").write_text("c")
+    state = snapshot([tmp_path / "a", tmp_path / "c.txt", tmp_path / "missing"])
+    assert sorted(state.keys()) == [str(tmp_path / "a" / "b.txt"), str(tmp_path / "c.txt")]
+
+
+def test_watcher_affected_targets(watcher, tmp_path):
+    event = watcher.render()
+    assert event.error is None
+    assert event.affected == ["base-cpu", "dev-cpu", "prod-cpu"]
+    assert str(tmp_path / "requirements.txt") not in watcher.changed_files()
+
+    # No changes
+    assert watcher.wait(timeout=0.05) == []
+    assert watcher.render().affected == []
+
+    # Changing a child only affects the child
+    _touch(tmp_path / "agibuild.yaml", CONFIG.replace("- pytest", "- pytest-cov"))
+    assert watcher.wait(timeout=1.0) == ["agibuild.yaml"]
+    assert watcher.render().affected == ["dev-cpu"]
+
+    # Changing a requirements file of the base affects all its descendants
+    _touch(tmp_path / "requirements.txt", "numpy\nscipy\n")
+    assert watcher.wait(timeout=1.0) == ["requirements.txt"]
+    event = watcher.render()
+    assert event.affected == ["base-cpu", "dev-cpu", "prod-cpu"]
+    assert event.latency > 0
+
+
+def test_watcher_invalid_config(watcher, tmp_path):
+    watcher.render()
+    _touch(tmp_path / "agibuild.yaml", CONFIG.replace('"3.8.10"', "3.10"))
+    assert watcher.wait(timeout=1.0) == ["agibuild.yaml"]
+    event = watcher.render()
+    assert event.error is not None
+    assert event.affected == []
+    assert watcher.wait(timeout=0.05) == []
+
+
+def test_watcher_debounce(watcher, tmp_path):
+    events = []
+    thread = threading.Thread(target=watcher.run, args=(events.append,), kwargs={"max_events": 1}, daemon=True)
+    thread.start()
+    time.sleep(0.1)
+
+    # A burst of edits triggers a single re-render
+    for idx in range(5):
+        _touch(tmp_path / "requirements.txt", f"numpy\nscipy=={idx}\n")
+        time.sleep(0.01)
+    thread.join(timeout=2.0)
+    assert not thread.is_alive()
+    assert len(events) == 2
+    assert events[1].changed == ["requirements.txt"]
+    assert "scipy==4" in (tmp_path / "requirements.txt").read_text()
+
+
+def test_watch_rebuild_manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "agibuild.yaml").write_text(CONFIG)
+    (tmp_path / "requirements.txt").write_text("numpy\n")
+    backend = FakeDockerBackend()
+    monkeypatch.setattr(docker, "get_backend", lambda name: backend)
+
+    def stop(self, timeout=None):
+        raise KeyboardInterrupt
+
+    # Rebuild the (initially affected) targets, then stop watching
+    monkeypatch.setattr(AGIPackWatcher, "wait", stop)
+    kwargs = {"rebuild": True, "manifest_filename": "manifest.json", "output_dir": "docker", "tag": "{name}:{target}"}
+    _watch("agibuild.yaml", **kwargs)
+    assert sorted(build["target"] for build in backend.builds) == ["base-cpu", "dev-cpu", "prod-cpu"]
+    assert (tmp_path / "manifest.json").exists()
+
+    # Unchanged targets are skipped with the manifest
+    _watch("agibuild.yaml", **kwargs)
+    assert len(backend.builds) == 3